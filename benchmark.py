@@ -0,0 +1,598 @@
+#!/usr/bin/env python3
+"""
+HexaScan benchmark - compares scan engines against a local listener farm.
+Run:
+  python3 benchmark.py --ports 2000 --open-every 50 --filtered 20
+  sudo python3 benchmark.py --suite syn --ports 5000 --sr1-ports 300
+  python3 benchmark.py --suite plugins --plugins 48 --records 20000
+  python3 benchmark.py --suite scaling --ports 12000 --filtered 0 --max-procs 4
+  python3 benchmark.py --suite services --modes fast normal full --protos tcp udp --json bench.json
+Everything listens on loopback, nothing leaves the machine.
+"""
+from __future__ import annotations
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import multiprocessing
+import os
+import random
+import resource
+import selectors
+import shutil
+import socket
+import socketserver
+import ssl
+import struct
+import subprocess
+import tempfile
+import threading
+import time
+from typing import List, Dict, Optional
+
+import cluster
+import hexascan
+
+# ---------- listener farm ----------
+class ListenerFarm:
+    """Open listeners that send a banner, plus blackholed ones that drop SYNs (filtered ports)."""
+
+    def __init__(self, host: str, base: int, count: int, open_every: int, filtered: int, banner: bytes = b"SSH-2.0-bench\r\n"):
+        self.host = host
+        self.banner = banner
+        self.sel = selectors.DefaultSelector()
+        self.socks: List[socket.socket] = []
+        self.open_ports: List[int] = []
+        self.filtered_ports: List[int] = []
+        self._stop = threading.Event()
+        self._thread = None
+        closed = []
+        for port in range(base, base + count):
+            if open_every and (port - base) % open_every == 0:
+                self._listen(port)
+            else:
+                closed.append(port)
+        # spread filtered ports over the closed ones only, so none collide with an open port
+        if filtered and closed:
+            step = max(1, len(closed) // filtered)
+            for port in closed[step // 2::step][:filtered]:
+                self._blackhole(port)
+        self._fill_blackholes()
+
+    def _bind(self, port: int, backlog: int) -> socket.socket:
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        s.bind((self.host, port))
+        s.listen(backlog)
+        self.socks.append(s)
+        return s
+
+    def _listen(self, port: int):
+        s = self._bind(port, 1024)
+        s.setblocking(False)
+        self.sel.register(s, selectors.EVENT_READ)
+        self.open_ports.append(port)
+
+    def _blackhole(self, port: int):
+        # a listener that never accepts: once its accept queue is full the kernel silently
+        # drops further SYNs, which is exactly what a firewalled port looks like to a scanner
+        self._bind(port, 0)
+        self.filtered_ports.append(port)
+
+    def _fill_blackholes(self):
+        # filler clients get ephemeral ports, so only connect them once every farm port is bound
+        for port in self.filtered_ports:
+            for _ in range(3):
+                c = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                c.setblocking(False)
+                c.connect_ex((self.host, port))
+                self.socks.append(c)
+
+    def _serve(self):
+        while not self._stop.is_set():
+            for key, _ in self.sel.select(timeout=0.2):
+                try:
+                    conn, _ = key.fileobj.accept()
+                    conn.sendall(self.banner)
+                    conn.close()
+                except Exception:
+                    pass
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+        time.sleep(0.2)
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        for s in self.socks:
+            try:
+                s.close()
+            except Exception:
+                pass
+        self.sel.close()
+
+# ---------- runs ----------
+def timed_scan(ip: str, ports: List[int], engine: str, timeout: float, workers: int, concurrency: int) -> Dict:
+    hexascan.STATS.clear()
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        rows = hexascan.run_scan([(ip, ip)], ports, "tcp", timeout, workers, engine=engine, concurrency=concurrency)
+    elapsed = time.perf_counter() - t0
+    return {"engine": engine, "seconds": elapsed, "open": len(rows), "pps": len(ports) / elapsed if elapsed else 0.0,
+            "handshakes": hexascan.STATS["handshakes"]}
+
+def bench_engines(args) -> List[Dict]:
+    out = []
+    with ListenerFarm(args.host, args.base, args.ports, args.open_every, args.filtered) as farm:
+        ports = list(range(args.base, args.base + args.ports))
+        print(f"Farm: {len(farm.open_ports)} open, {len(farm.filtered_ports)} filtered, {args.ports} ports total on {args.host}")
+        for engine in args.engines:
+            r = timed_scan(args.host, ports, engine, args.timeout, args.workers, args.concurrency)
+            ok = "ok" if r["open"] == len(farm.open_ports) else f"MISSED {len(farm.open_ports) - r['open']}"
+            per_open = r["handshakes"] / r["open"] if r["open"] else 0.0
+            print(f"  {engine:<7} {r['seconds']:8.2f}s  {r['pps']:10.1f} ports/s  open={r['open']} ({ok})  handshakes/open={per_open:.2f}")
+            out.append(r)
+    return out
+
+def bench_syn(args) -> List[Dict]:
+    # batch raw-socket engine vs the old one-sr1-per-port loop; needs root
+    if not hexascan.raw_syn_available():
+        print("SYN benchmark needs raw sockets (run as root).")
+        return []
+    out = []
+    with ListenerFarm(args.host, args.base, args.ports, args.open_every, args.filtered) as farm:
+        ports = list(range(args.base, args.base + args.ports))
+        print(f"Farm: {len(farm.open_ports)} open, {len(farm.filtered_ports)} filtered, {args.ports} ports total on {args.host}")
+        hexascan.STATS.clear()
+        t0 = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            rows = hexascan.run_scan([(args.host, args.host)], ports, "syn", args.timeout, args.workers)
+        elapsed = time.perf_counter() - t0
+        out.append({"engine": "syn-batch", "seconds": elapsed, "open": len(rows), "pps": len(ports) / elapsed})
+        print(f"  syn-batch {elapsed:8.2f}s  {len(ports) / elapsed:10.1f} ports/s  open={len(rows)}/{len(farm.open_ports)}")
+        if hexascan.SCAPY and args.sr1_ports:
+            if args.host.startswith("127."):
+                # scapy cannot sniff its own loopback traffic with the default L3 socket
+                from scapy.all import conf, L3RawSocket
+                conf.L3socket = L3RawSocket
+            sample = ports[:args.sr1_ports]
+            t0 = time.perf_counter()
+            found = sum(1 for p in sample if hexascan.syn_scan(args.host, p, args.timeout))
+            elapsed = time.perf_counter() - t0
+            out.append({"engine": "syn-sr1", "seconds": elapsed, "open": found, "pps": len(sample) / elapsed})
+            print(f"  syn-sr1   {elapsed:8.2f}s  {len(sample) / elapsed:10.1f} ports/s  open={found} (first {len(sample)} ports)")
+    return out
+
+PLUGIN_TEMPLATE = """PORTS = ({port},)
+PROTOCOLS = ("tcp",)
+
+def run(ip, port, banner):
+    if port != {port}:
+        return None
+    return {{"plugin": "bench-{idx}"}}
+"""
+
+def bench_plugins(args) -> List[Dict]:
+    # per-open-port dispatch: every plugin's run() (old loop) vs the registry's port index
+    out = []
+    with tempfile.TemporaryDirectory() as d:
+        for i in range(args.plugins):
+            with open(os.path.join(d, f"bench_{i}.py"), "w") as f:
+                f.write(PLUGIN_TEMPLATE.format(port=10000 + i, idx=i))
+        rng = random.Random(1)
+        # half the open ports match some plugin, half match none
+        records = [rng.randrange(10000, 10000 + 2 * args.plugins) for _ in range(args.records)]
+
+        t0 = time.perf_counter()
+        mods = []
+        for fname in sorted(os.listdir(d)):
+            spec = importlib.util.spec_from_file_location(f"bench.{fname[:-3]}", os.path.join(d, fname))
+            mod = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(mod)
+            mods.append(mod)
+        load_all = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        for port in records:
+            for mod in mods:
+                mod.run("127.0.0.1", port, "")
+        loop_all = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        registry = hexascan.PluginRegistry(d)
+        load_index = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        for port in records:
+            for plugin in registry.match(port, "tcp", ""):
+                plugin.run("127.0.0.1", port, "")
+        loop_index = time.perf_counter() - t0
+
+    print(f"{args.plugins} plugins, {args.records} open ports")
+    for name, load, loop in (("run-all", load_all, loop_all), ("indexed", load_index, loop_index)):
+        per_port = loop / len(records) * 1e6
+        print(f"  {name:<8} load {load * 1e3:8.2f} ms   dispatch {per_port:8.2f} us/open port")
+        out.append({"dispatch": name, "load_ms": load * 1e3, "us_per_port": per_port})
+    print("  (run-all reloaded every plugin once per target; the registry loads once per process, lazily)")
+    return out
+
+class CountSink(hexascan.ResultSink):
+    def __init__(self):
+        self.count = 0
+
+    def write(self, record: Dict):
+        self.count += 1
+
+def bench_scaling(args) -> List[Dict]:
+    # the same sweep in one process, then through run_processes with 1..N worker processes
+    out = []
+    with ListenerFarm(args.host, args.base, args.ports, args.open_every, args.filtered) as farm:
+        ports = list(range(args.base, args.base + args.ports))
+        hosts = [(args.host, args.host)]
+        print(f"Farm: {len(farm.open_ports)} open, {len(farm.filtered_ports)} filtered, {args.ports} ports total on {args.host}")
+        options = {"scan_type": "tcp", "timeout": args.timeout, "workers": args.workers, "engine": args.engine,
+                   "concurrency": args.concurrency}
+        r = timed_scan(args.host, ports, args.engine, args.timeout, args.workers, args.concurrency)
+        print(f"  in-process {r['seconds']:8.2f}s  {r['pps']:10.1f} ports/s  open={r['open']}")
+        out.append({"processes": 0, "seconds": r["seconds"], "pps": r["pps"], "open": r["open"]})
+        base = None
+        for n in range(1, args.max_procs + 1):
+            sink = CountSink()
+            t0 = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                cluster.run_processes(hosts, ports, options, n, sink, chunk_ports=args.chunk_ports)
+            elapsed = time.perf_counter() - t0
+            pps = len(ports) / elapsed
+            base = base or pps
+            ok = "ok" if sink.count == len(farm.open_ports) else f"MISSED {len(farm.open_ports) - sink.count}"
+            print(f"  {n:>2} procs   {elapsed:8.2f}s  {pps:10.1f} ports/s  x{pps / base:.2f}  open={sink.count} ({ok})")
+            out.append({"processes": n, "seconds": elapsed, "pps": pps, "open": sink.count})
+    return out
+
+# ---------- stand-in services ----------
+SERVICE_HOST = "127.66.0.1"
+SCAN_DEADLINE = 1800.0  # seconds one services-suite scan may take before it is killed
+HTTP_PAGE = b"<html><head><title>HexaScan bench</title></head><body>ok</body></html>"
+RDP_CONFIRM = b"\x03\x00\x00\x13\x0e\xd0\x00\x00\x12\x34\x00\x02\x00\x08\x00\x00\x00\x00\x00"
+
+def mysql_handshake() -> bytes:
+    # protocol 10 greeting, as a MySQL 8 server sends it on connect
+    payload = (b"\x0a" + b"8.0.36-bench\x00" + struct.pack("<I", 7) + b"abcdefgh\x00" + struct.pack("<H", 0xf7ff)
+               + b"\xff" + struct.pack("<H", 2) + struct.pack("<H", 0x81ff) + b"\x15" + b"\x00" * 10
+               + b"ijklmnopqrst\x00" + b"mysql_native_password\x00")
+    return struct.pack("<I", len(payload))[:3] + b"\x00" + payload
+
+# port -> (kind, banner, delay before the service speaks)
+TCP_SERVICES = {
+    21: ("ftp", b"220 HexaScan bench FTP\r\n", 0.0),
+    22: ("banner", b"SSH-2.0-OpenSSH_9.6 bench\r\n", 0.0),
+    25: ("banner", b"220 bench ESMTP\r\n", 0.2),
+    80: ("http", b"", 0.0),
+    110: ("banner", b"+OK bench POP3\r\n", 0.05),
+    443: ("https", b"", 0.0),
+    1723: ("silent", b"", 0.0),
+    3306: ("banner", mysql_handshake(), 0.0),
+    3389: ("rdp", b"", 0.0),
+    5900: ("banner", b"RFB 003.008\n", 0.0),
+    8000: ("http", b"", 0.0),
+    8888: ("http", b"", 0.0),
+}
+# blackholed TCP ports, and UDP ports that are bound but never answer
+FILTERED_TCP = [139, 445, 993, 8080]
+UDP_SERVICES = {53: "dns", 123: "ntp", 161: "snmp"}
+SILENT_UDP = [69]
+# plugin names each open port should come back with
+EXPECTED_PLUGINS = {21: {"ftp-anon"}, 80: {"http-title"}, 443: {"ssl-info", "http-title"}, 3306: {"mysql-check"},
+                    3389: {"rdp-check"}, 8000: {"http-title"}, 8888: {"http-title"}}
+
+class ServiceHandler(socketserver.BaseRequestHandler):
+    """Speaks just enough of each protocol for the scanner's banner read and the matching plugin."""
+
+    def handle(self):
+        kind, banner, delay = self.server.service
+        sock = self.request
+        sock.settimeout(5)
+        try:
+            if delay:
+                time.sleep(delay)
+            if kind == "https":
+                sock = self.server.tls.wrap_socket(sock, server_side=True)
+                kind = "http"
+            if kind == "banner":
+                sock.sendall(banner)
+            elif kind == "ftp":
+                self.ftp(sock, banner)
+            elif kind == "http":
+                self.http(sock)
+            elif kind == "rdp":
+                if sock.recv(1024):
+                    sock.sendall(RDP_CONFIRM)
+            elif kind == "silent":
+                # accepts and says nothing, like a service waiting for the client to speak first
+                sock.recv(1024)
+        except (OSError, ssl.SSLError):
+            pass
+        finally:
+            sock.close()
+
+    def http(self, sock):
+        # keep-alive for HTTP/1.1 clients, one response then close otherwise
+        buf = b""
+        while True:
+            while b"\r\n\r\n" not in buf:
+                data = sock.recv(4096)
+                if not data or len(buf) > 65536:
+                    return
+                buf += data
+            head, _, buf = buf.partition(b"\r\n\r\n")
+            request = head.split(b"\r\n")[0].split()
+            keep = (len(request) > 2 and request[2] == b"HTTP/1.1" and b"connection: close" not in head.lower())
+            body = b"" if request[:1] == [b"HEAD"] else HTTP_PAGE
+            sock.sendall(b"HTTP/1.1 200 OK\r\nServer: bench\r\nContent-Type: text/html\r\nContent-Length: %d\r\n"
+                         b"Connection: %s\r\n\r\n%s" % (len(HTTP_PAGE), b"keep-alive" if keep else b"close", body))
+            if not keep:
+                return
+
+    def ftp(self, sock, banner):
+        sock.sendall(banner)
+        passive = None
+        for line in sock.makefile("rb"):
+            cmd = line.decode(errors="ignore").strip().split(" ", 1)[0].upper()
+            if cmd == "USER":
+                reply = b"331 Password required"
+            elif cmd == "PASS":
+                reply = b"230 Login successful"
+            elif cmd == "PASV":
+                passive = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                passive.bind((self.server.server_address[0], 0))
+                passive.listen(1)
+                host, port = passive.getsockname()
+                reply = b"227 Entering Passive Mode (%s,%d,%d)" % (host.replace(".", ",").encode(), port >> 8, port & 255)
+            elif cmd in ("NLST", "LIST") and passive:
+                sock.sendall(b"150 Here comes the listing\r\n")
+                conn, _ = passive.accept()
+                conn.sendall(b"pub\r\nreadme.txt\r\n")
+                conn.close()
+                passive.close()
+                passive = None
+                reply = b"226 Transfer complete"
+            elif cmd == "TYPE":
+                reply = b"200 Type set"
+            elif cmd == "QUIT":
+                sock.sendall(b"221 Goodbye\r\n")
+                break
+            else:
+                reply = b"502 Not implemented"
+            sock.sendall(reply + b"\r\n")
+        if passive:
+            passive.close()
+
+class ServiceServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+    # a connect sweep arrives in bursts; the default backlog of 5 would drop SYNs and look filtered
+    request_queue_size = 256
+
+def self_signed_context(tmpdir: str) -> Optional[ssl.SSLContext]:
+    # the openssl CLI is the only offline way to mint a certificate with the standard library
+    if not shutil.which("openssl"):
+        return None
+    cert, key = os.path.join(tmpdir, "cert.pem"), os.path.join(tmpdir, "key.pem")
+    try:
+        subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1", "-subj",
+                        "/CN=hexascan-bench", "-keyout", key, "-out", cert], check=True, capture_output=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    ctx.load_cert_chain(cert, key)
+    return ctx
+
+class ServiceFarm(ListenerFarm):
+    """Mock FTP, HTTP(S), MySQL, RDP and banner services, blackholed ports and UDP responders on one address.
+
+    Every TCP service gets its own threaded server, so a delayed banner or a plugin's dialogue never
+    holds up the scanner's other connects; UDP replies are served from the farm's selector thread.
+    delay is added to each service's own delay. Ports below 1024 need root; services that cannot
+    bind are skipped and left out of expected().
+    """
+
+    def __init__(self, host: str = SERVICE_HOST, delay: float = 0.0):
+        self.host = host
+        self.sel = selectors.DefaultSelector()
+        self.socks: List[socket.socket] = []
+        self.open_ports: List[int] = []
+        self.filtered_ports: List[int] = []
+        self.udp_ports: List[int] = []
+        self.skipped: List[str] = []
+        self.servers: List[ServiceServer] = []
+        self._stop = threading.Event()
+        self._thread = None
+        self.tmpdir = tempfile.mkdtemp(prefix="hexascan-bench-")
+        tls = self_signed_context(self.tmpdir)
+        for port, (kind, banner, wait) in TCP_SERVICES.items():
+            if kind == "https" and not tls:
+                self.skipped.append(f"{port}/tcp (no openssl for a certificate)")
+                continue
+            try:
+                server = ServiceServer((host, port), ServiceHandler)
+            except OSError as e:
+                self.skipped.append(f"{port}/tcp ({e.strerror})")
+                continue
+            server.service = (kind, banner, wait + delay)
+            server.tls = tls
+            self.servers.append(server)
+            self.open_ports.append(port)
+        for port in FILTERED_TCP:
+            try:
+                self._blackhole(port)
+            except OSError as e:
+                self.skipped.append(f"{port}/tcp ({e.strerror})")
+        self._fill_blackholes()
+        for port in list(UDP_SERVICES) + SILENT_UDP:
+            u = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            try:
+                u.bind((host, port))
+            except OSError as e:
+                self.skipped.append(f"{port}/udp ({e.strerror})")
+                u.close()
+                continue
+            self.socks.append(u)
+            if port in UDP_SERVICES:
+                u.setblocking(False)
+                self.sel.register(u, selectors.EVENT_READ, port)
+                self.udp_ports.append(port)
+
+    def _serve(self):
+        while not self._stop.is_set():
+            for key, _ in self.sel.select(timeout=0.2):
+                try:
+                    data, addr = key.fileobj.recvfrom(4096)
+                    key.fileobj.sendto(self.udp_reply(key.data, data), addr)
+                except OSError:
+                    pass
+
+    @staticmethod
+    def udp_reply(port: int, data: bytes) -> bytes:
+        kind = UDP_SERVICES[port]
+        if kind == "dns" and len(data) >= 12:
+            # same id and question, "no error" with no answers
+            return data[:2] + b"\x81\x80" + data[4:6] + b"\x00\x00\x00\x00\x00\x00" + data[12:]
+        if kind == "ntp":
+            return b"\x24\x02\x06\xe9" + b"\x00" * 44
+        # snmp and anything else: echo, which is all the scanner needs to call it open
+        return data
+
+    def expected(self) -> Dict:
+        return {"tcp": sorted(self.open_ports), "filtered": sorted(self.filtered_ports), "udp": sorted(self.udp_ports),
+                "plugins": {p: sorted(EXPECTED_PLUGINS.get(p, ())) for p in self.open_ports}, "skipped": self.skipped}
+
+    def __enter__(self):
+        for server in self.servers:
+            threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.2}, daemon=True).start()
+        return super().__enter__()
+
+    def __exit__(self, *exc):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+        return super().__exit__(*exc)
+
+def serve_farm(conn, host: str, delay: float):
+    # child process: the farm's threads stay out of the scanning process and its memory peak
+    with ServiceFarm(host, delay) as farm:
+        conn.send(farm.expected())
+        conn.recv()
+
+def scan_child(conn, host: str, ports: List[int], scan_type: str, args):
+    hexascan.PROFILE = hexascan.Profiler()
+    t0 = time.perf_counter()
+    # plugins print and warn (unverified TLS to the self-signed cert); keep the report readable
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        rows = hexascan.run_scan([(host, host)], ports, scan_type, args.timeout, args.workers, engine=args.engine,
+                                 concurrency=args.concurrency, rtt_timeouts=True)
+    elapsed = time.perf_counter() - t0
+    report = hexascan.PROFILE.report()
+    conn.send({"seconds": elapsed, "timers": report["timers"], "counters": report["counters"],
+               "rows": [{"port": r["port"], "proto": r["proto"], "plugins": [p.get("plugin") for p in r.get("plugins", [])
+                                                                              if isinstance(p, dict)]} for r in rows],
+               # ru_maxrss is in KiB on Linux; a fresh child per run keeps each peak its own
+               "peak_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024})
+
+def bench_services(args) -> List[Dict]:
+    # every scan mode and protocol against the stand-in services, each scan in a fresh process
+    ctx = multiprocessing.get_context("fork")
+    parent, child = ctx.Pipe()
+    farm = ctx.Process(target=serve_farm, args=(child, args.service_host, args.delay), daemon=True)
+    farm.start()
+    child.close()
+    out = []
+    try:
+        if not parent.poll(15):
+            print("Service farm did not start.")
+            return out
+        expected = parent.recv()
+        print(f"Services on {args.service_host}: tcp {expected['tcp']}, filtered {expected['filtered']}, udp {expected['udp']}")
+        for item in expected["skipped"]:
+            print(f"  skipped {item}")
+        for mode in args.modes:
+            ports = hexascan.mode_ports(mode)
+            for proto in args.protos:
+                want = {p for p in expected["tcp" if proto == "tcp" else "udp"] if p in ports}
+                rx, tx = ctx.Pipe()
+                proc = ctx.Process(target=scan_child, args=(tx, args.service_host, ports, proto, args))
+                proc.start()
+                # only the child holds the sending end now, so a crash shows up as EOF instead of a hang
+                tx.close()
+                try:
+                    r = rx.recv() if rx.poll(SCAN_DEADLINE) else None
+                except EOFError:
+                    r = None
+                if r is None:
+                    proc.terminate()
+                proc.join()
+                rx.close()
+                if r is None:
+                    print(f"  {mode:<6} {proto:<3} scan failed (exit code {proc.exitcode})")
+                    continue
+                found = {row["port"] for row in r["rows"]}
+                plugins_want = sum(len(expected["plugins"].get(p, ())) for p in want) if proto == "tcp" else 0
+                plugins_got = sum(len(set(row["plugins"]) & set(expected["plugins"].get(row["port"], ())))
+                                  for row in r["rows"] if row["port"] in want)
+                probe = r["timers"].get(f"probe.{proto}", {})
+                row = {"mode": mode, "proto": proto, "engine": args.engine if proto == "tcp" else "udp",
+                       "ports": len(ports), "seconds": round(r["seconds"], 3), "pps": round(len(ports) / r["seconds"], 1),
+                       "p50_ms": probe.get("p50_ms"), "p99_ms": probe.get("p99_ms"), "peak_mb": round(r["peak_mb"], 1),
+                       "open": len(found & want), "expected": len(want), "missed": sorted(want - found),
+                       "false_open": sorted(found - want), "plugins": plugins_got, "plugins_expected": plugins_want}
+                ok = "ok" if not row["missed"] and not row["false_open"] else f"missed {row['missed']} unexpected {row['false_open']}"
+                print(f"  {mode:<6} {proto:<3} {len(ports):>6} ports {r['seconds']:7.2f}s {row['pps']:10.1f} ports/s  "
+                      f"p50 {row['p50_ms']}ms p99 {row['p99_ms']}ms  peak {row['peak_mb']:.1f}MB  "
+                      f"open {row['open']}/{row['expected']} ({ok})  plugins {plugins_got}/{plugins_want}")
+                out.append(row)
+    finally:
+        parent.send("stop")
+        farm.join(timeout=5)
+        if farm.is_alive():
+            farm.terminate()
+    return out
+
+def parse_args():
+    p = argparse.ArgumentParser(description="HexaScan benchmark")
+    p.add_argument("--suite", choices=["engines","syn","plugins","scaling","services"], default="engines")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--base", type=int, default=20000, help="first port of the farm (keep below the ephemeral range)")
+    p.add_argument("--ports", type=int, default=2000, help="number of ports to scan")
+    p.add_argument("--open-every", type=int, default=50, help="every Nth port has a listener")
+    p.add_argument("--filtered", type=int, default=20, help="number of blackholed (filtered) ports")
+    p.add_argument("--timeout", type=float, default=1.0)
+    p.add_argument("--workers", type=int, default=200)
+    p.add_argument("--concurrency", type=int, default=hexascan.DEFAULT_CONCURRENCY)
+    p.add_argument("--engines", nargs="+", choices=["thread","async"], default=["thread","async"])
+    p.add_argument("--sr1-ports", type=int, default=200, help="ports to probe with the per-port scapy loop (syn suite)")
+    p.add_argument("--plugins", type=int, default=48, help="synthetic plugins to install (plugins suite)")
+    p.add_argument("--records", type=int, default=20000, help="open-port records to dispatch (plugins suite)")
+    p.add_argument("--max-procs", type=int, default=os.cpu_count() or 2, help="largest process count (scaling suite)")
+    p.add_argument("--engine", choices=["thread","async"], default="async", help="engine per process (scaling suite)")
+    p.add_argument("--chunk-ports", type=int,
+                   help="ports per work unit (scaling suite; default: what --processes derives from the scan)")
+    p.add_argument("--service-host", default=SERVICE_HOST, help="loopback address for the stand-in services (services suite)")
+    p.add_argument("--modes", nargs="+", choices=["fast","normal","full"], default=["fast","normal"],
+                   help="scan modes to run (services suite)")
+    p.add_argument("--protos", nargs="+", choices=["tcp","udp"], default=["tcp","udp"], help="protocols to run (services suite)")
+    p.add_argument("--delay", type=float, default=0.0, help="extra seconds every stand-in service waits before answering")
+    p.add_argument("--json", help="also write the suite's results to this file")
+    return p.parse_args()
+
+SUITES = {"engines": bench_engines, "syn": bench_syn, "plugins": bench_plugins, "scaling": bench_scaling,
+          "services": bench_services}
+
+if __name__ == "__main__":
+    args = parse_args()
+    results = SUITES[args.suite](args)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"suite": args.suite, "args": vars(args), "results": results}, f, indent=2)
@@ -0,0 +1,501 @@
+#!/usr/bin/env python3
+"""
+HexaScan distributed mode - one coordinator shards a scan into chunks, workers scan them.
+A coordinator on TCP and one worker per node (a non-loopback --listen needs a shared --token):
+  python3 hexascan.py 10.0.0.0/16 --mode full --listen 0.0.0.0:7000 --token s3cret
+  python3 hexascan.py --worker 10.0.0.5:7000 --token s3cret
+Or every core of this machine, over a private Unix socket:
+  python3 hexascan.py 10.0.0.0/16 --mode full --processes 8 --rate 20000
+"""
+from __future__ import annotations
+import hmac
+import ipaddress
+import json
+import os
+import shutil
+import signal
+import socket
+import socketserver
+import stat
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from colorama import Fore, Style
+
+from hexascan import (CLUSTER_CHUNK_HOSTS, CLUSTER_CHUNK_PORTS, CLUSTER_CHUNKS_PER_WORKER, CLUSTER_LEASE,
+                      CLUSTER_MAX_LEASES, CLUSTER_MIN_CHUNK_PORTS, SOURCE_POLL, STATS, AdaptiveRate,
+                      EventBus, ResultSink, SharedTokenBucket, TokenBucket, event_record, parse_endpoint,
+                      plugin_event, process_context, report_open, run_scan)
+
+def is_loopback(address: Tuple[str, int]) -> bool:
+    host = address[0]
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        pass
+    try:
+        return all(ipaddress.ip_address(info[4][0]).is_loopback
+                   for info in socket.getaddrinfo(host, None, socket.AF_INET, socket.SOCK_STREAM))
+    except (OSError, ValueError):
+        return False
+
+def listen_problem(endpoint: str, token: Optional[str]) -> Optional[str]:
+    # why the coordinator must not bind endpoint, or None; the protocol itself carries no secret but the
+    # token, so anything reachable off this machine needs one
+    family, address = parse_endpoint(endpoint)
+    if family == socket.AF_UNIX:
+        try:
+            mode = os.lstat(address).st_mode
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            return f"cannot check {address}: {e}"
+        if not stat.S_ISSOCK(mode):
+            return f"{address} exists and is not a socket; refusing to replace it"
+        return None
+    if not token and not is_loopback(address):
+        return f"{endpoint} is reachable from other hosts; set a shared --token (or HEXASCAN_TOKEN) for the workers"
+    return None
+
+def send_msg(wfile, lock: threading.Lock, msg: Dict):
+    data = (json.dumps(msg, separators=(",", ":")) + "\n").encode()
+    with lock:
+        wfile.write(data)
+        wfile.flush()
+
+def recv_msg(rfile) -> Optional[Dict]:
+    line = rfile.readline()
+    return json.loads(line) if line else None
+
+class Lease:
+    __slots__ = ("chunk", "worker", "deadline")
+
+    def __init__(self, chunk: Dict, worker: str, deadline: float):
+        self.chunk = chunk
+        self.worker = worker
+        self.deadline = deadline
+
+class Coordinator:
+    """Shards a scan into (hosts, ports) chunks and serves them to workers over NDJSON.
+
+    Chunks are cut lazily from the host stream: chunk_hosts hosts by chunk_ports ports at a time,
+    or, when spread is set, with the ports split so a batch makes about spread chunks, and a short
+    batch (a short target list is one) split by host as well.
+    A worker leases one chunk, renews the lease while it scans, streams every finished record back
+    and then reports the chunk done. A lease that expires, or whose worker disconnects, goes back
+    to the front of the queue, up to CLUSTER_MAX_LEASES leases per chunk; a chunk that outlives them
+    is recorded as failed. With no worker left (alive() says so, or every worker has been gone for
+    a lease period) the run stops with error set. Records are de-duplicated on (ip, port, proto), so a chunk scanned
+    twice after a lost lease is only written once, to the same sink a local scan uses.
+    """
+
+    def __init__(self, hosts: Iterable[Optional[Tuple[str, str]]], ports: List[int], options: Dict,
+                 sink: ResultSink, chunk_hosts: int = CLUSTER_CHUNK_HOSTS, chunk_ports: int = CLUSTER_CHUNK_PORTS,
+                 lease: float = CLUSTER_LEASE, verbose: bool = True, bus: Optional[EventBus] = None,
+                 token: Optional[str] = None, spread: int = 0):
+        self.source = iter(hosts)
+        self.source_done = False
+        self.ports = ports
+        self.options = options
+        self.sink = sink
+        self.chunk_hosts = max(1, chunk_hosts)
+        self.chunk_ports = max(1, chunk_ports)
+        self.spread = spread
+        self.lease_time = lease
+        self.queue = deque()
+        self.leases: Dict[int, Lease] = {}
+        self.seen: set = set()
+        self.next_id = 0
+        self.lock = threading.Lock()
+        self.finished = threading.Event()
+        self.stats = Counter()
+        self.leased: Counter = Counter()
+        self.failed: List[Dict] = []
+        self.error: Optional[str] = None
+        self.idle_since: Optional[float] = None
+        self.workers: set = set()
+        self.verbose = verbose
+        self.bus = bus
+        self.token = token
+        self.started = time.monotonic()
+        self.server = None
+        self.unix_path = None
+        # run_processes' AdaptiveRate over the shared bucket, for the summary
+        self.controller: Optional[AdaptiveRate] = None
+
+    def _generate(self):
+        # caller holds self.lock; cuts the next host batch into chunks
+        batch = []
+        while len(batch) < self.chunk_hosts:
+            try:
+                item = next(self.source)
+            except StopIteration:
+                self.source_done = True
+                break
+            if item is None:
+                break
+            batch.append(list(item))
+        if not batch:
+            return
+        host_step, port_step = len(batch), self.chunk_ports
+        if self.spread:
+            # ports first, down to CLUSTER_MIN_CHUNK_PORTS; hosts only in a short batch (the end of the
+            # targets, or a resolver stall), as full batches keep coming while the stream lasts. Every chunk
+            # ends on its slowest (filtered) probe, so more chunks than spread only add timeout tails
+            port_step = max(CLUSTER_MIN_CHUNK_PORTS, -(-len(self.ports) // self.spread))
+            if len(batch) < self.chunk_hosts:
+                host_step = max(1, len(batch) * -(-len(self.ports) // port_step) // self.spread)
+        for h in range(0, len(batch), host_step):
+            for i in range(0, len(self.ports), port_step):
+                self.queue.append({"id": self.next_id, "hosts": batch[h:h + host_step],
+                                   "ports": self.ports[i:i + port_step]})
+                self.next_id += 1
+                self.stats["chunks"] += 1
+
+    def _check_finished(self):
+        if self.source_done and not self.queue and not self.leases:
+            self.finished.set()
+
+    def lease(self, worker: str) -> Dict:
+        with self.lock:
+            self._reap()
+            if not self.queue and not self.source_done:
+                self._generate()
+            if self.queue:
+                chunk = self.queue.popleft()
+                self.leased[chunk["id"]] += 1
+                self.leases[chunk["id"]] = Lease(chunk, worker, time.monotonic() + self.lease_time)
+                return {"op": "chunk", "lease": self.lease_time, **chunk}
+            self._check_finished()
+            if self.finished.is_set():
+                return {"op": "bye"}
+            # hosts still resolving, or the remaining chunks are leased out and may come back
+            return {"op": "wait", "seconds": SOURCE_POLL * 4}
+
+    def renew(self, worker: str, cid: int):
+        with self.lock:
+            lease = self.leases.get(cid)
+            if lease and lease.worker == worker:
+                lease.deadline = time.monotonic() + self.lease_time
+
+    def record(self, rec: Dict):
+        key = (rec.get("ip"), rec.get("port"), rec.get("proto"))
+        with self.lock:
+            if key in self.seen:
+                self.stats["duplicates"] += 1
+                return
+            self.seen.add(key)
+            self.sink.write(rec)
+            self.stats["open"] += 1
+        report_open(rec)
+        if self.bus:
+            self.bus.publish("port_open", **event_record(rec))
+            if rec.get("plugins"):
+                self.bus.publish("plugin_result", **plugin_event(rec))
+
+    def complete(self, worker: str, cid: int, probes: int):
+        with self.lock:
+            lease = self.leases.get(cid)
+            if lease and lease.worker == worker:
+                del self.leases[cid]
+                self.stats["done"] += 1
+                self.stats["probes"] += probes
+            else:
+                # a re-queued chunk finished late by its first worker; the records were kept anyway
+                self.stats["late"] += 1
+            self._check_finished()
+            if self.bus:
+                self.progress()
+
+    def progress(self):
+        # caller holds self.lock; chunk-level progress, with an ETA once every chunk has been cut
+        st, elapsed = self.stats, time.monotonic() - self.started
+        eta = None
+        if self.source_done and st["done"]:
+            eta = round(elapsed / st["done"] * (st["chunks"] - st["done"]), 1)
+        self.bus.publish("progress", probes=st["probes"], rate=round(st["probes"] / max(1e-6, elapsed), 1),
+                         chunks=st["chunks"], chunks_done=st["done"], eta=eta, open=st["open"],
+                         workers=len(self.workers), elapsed=round(elapsed, 1))
+
+    def drop(self, worker: str):
+        # the worker's connection went away: hand its chunks to someone else
+        with self.lock:
+            self.workers.discard(worker)
+            for cid in [cid for cid, lease in self.leases.items() if lease.worker == worker]:
+                self._requeue(cid)
+            self._check_finished()
+
+    def _reap(self):
+        # caller holds self.lock
+        now = time.monotonic()
+        for cid in [cid for cid, lease in self.leases.items() if lease.deadline <= now]:
+            self._requeue(cid)
+        self._check_finished()
+
+    def _requeue(self, cid: int):
+        # caller holds self.lock; a chunk that has lost every worker it was given is dropped, not retried
+        chunk = self.leases.pop(cid).chunk
+        if self.leased[cid] >= CLUSTER_MAX_LEASES:
+            self.failed.append(chunk)
+            self.stats["failed"] += 1
+            self.say(f"chunk {cid} failed after {self.leased[cid]} leases "
+                     f"({len(chunk['hosts'])} hosts x {len(chunk['ports'])} ports not scanned)")
+            return
+        self.queue.appendleft(chunk)
+        self.stats["requeued"] += 1
+
+    def _stalled(self, alive) -> Optional[str]:
+        # why the run cannot finish, or None
+        if alive is not None and not alive() and not self.finished.is_set():
+            return "every worker process exited"
+        with self.lock:
+            if not self.stats["workers"] or self.workers:
+                self.idle_since = None
+                return None
+            now = time.monotonic()
+            self.idle_since = self.idle_since or now
+            if now - self.idle_since >= self.lease_time:
+                return f"every worker left and none joined for {self.lease_time:g}s"
+        return None
+
+    def _reaper(self):
+        while not self.finished.wait(1.0):
+            with self.lock:
+                self._reap()
+
+    def handle(self, rfile, wfile):
+        wlock = threading.Lock()
+        hello = recv_msg(rfile)
+        if not hello or hello.get("op") != "hello":
+            return
+        worker = str(hello.get("worker"))
+        if self.token and not hmac.compare_digest(str(hello.get("token") or "").encode(), self.token.encode()):
+            with self.lock:
+                self.stats["rejected"] += 1
+            self.say(f"worker {worker} rejected: wrong token")
+            try:
+                send_msg(wfile, wlock, {"op": "error", "message": "wrong token"})
+            except OSError:
+                pass
+            return
+        with self.lock:
+            self.workers.add(worker)
+            self.stats["workers"] += 1
+        self.say(f"worker {worker} joined")
+        try:
+            send_msg(wfile, wlock, {"op": "config", "options": self.options})
+            while True:
+                msg = recv_msg(rfile)
+                if msg is None:
+                    break
+                op = msg.get("op")
+                if op == "lease":
+                    send_msg(wfile, wlock, self.lease(worker))
+                elif op == "result":
+                    self.record(msg["record"])
+                elif op == "renew":
+                    self.renew(worker, msg["chunk"])
+                elif op == "done":
+                    self.complete(worker, msg["chunk"], msg.get("probes", 0))
+        except (OSError, ValueError):
+            pass
+        finally:
+            self.drop(worker)
+            self.say(f"worker {worker} left")
+
+    def listen(self, endpoint: str):
+        # binds right away; nothing is served until run(), so workers may be forked in between
+        problem = listen_problem(endpoint, self.token)
+        if problem:
+            raise ValueError(problem)
+        family, address = parse_endpoint(endpoint)
+        coordinator = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                coordinator.handle(self.rfile, self.wfile)
+
+        if family == socket.AF_UNIX:
+            if os.path.lexists(address):
+                # only a stale socket from an earlier run; listen_problem refused anything else
+                os.remove(address)
+            self.server = socketserver.ThreadingUnixStreamServer(address, Handler)
+        else:
+            socketserver.ThreadingTCPServer.allow_reuse_address = True
+            self.server = socketserver.ThreadingTCPServer(address, Handler)
+        self.server.daemon_threads = True
+        self.unix_path = address if family == socket.AF_UNIX else None
+        self.say(f"coordinator listening on {endpoint}")
+
+    def run(self, alive=None):
+        # alive: reports whether any worker can still show up (run_processes' children)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        threading.Thread(target=self._reaper, daemon=True).start()
+        try:
+            while not self.finished.wait(0.5):
+                self.error = self._stalled(alive)
+                if self.error:
+                    self.say(f"giving up: {self.error}")
+                    break
+            if self.failed and not self.error:
+                self.error = f"{len(self.failed)} chunks failed after {CLUSTER_MAX_LEASES} leases each"
+            if self.bus:
+                with self.lock:
+                    self.progress()
+                self.bus.publish("scan_done", probes=self.stats["probes"], open=self.stats["open"],
+                                 elapsed=round(time.monotonic() - self.started, 2))
+        finally:
+            # also tells any worker still asking for work to leave
+            self.finished.set()
+            self.server.shutdown()
+            self.server.server_close()
+            if self.unix_path and os.path.exists(self.unix_path):
+                os.remove(self.unix_path)
+
+    def serve(self, endpoint: str):
+        self.listen(endpoint)
+        self.run()
+
+    def say(self, text: str):
+        if self.verbose:
+            print(Fore.CYAN + f"[cluster] {text}")
+
+    def summary(self) -> str:
+        st = self.stats
+        line = (f"Cluster: {st['done']}/{st['chunks']} chunks from {st['workers']} workers, {st['probes']} probes, "
+                f"{st['requeued']} leases re-queued, {st['duplicates']} duplicate findings dropped")
+        if st["failed"]:
+            line += f", {st['failed']} chunks failed"
+        if st["rejected"]:
+            line += f", {st['rejected']} workers rejected"
+        if self.controller:
+            line += (f", adaptive rate now {self.controller.bucket.rate:.1f}/s after "
+                     f"{self.controller.backoffs} back-offs")
+        return line
+
+class ClusterSink(ResultSink):
+    """Worker side: every finished record goes straight back to the coordinator."""
+
+    def __init__(self, wfile, lock: threading.Lock, chunk: int):
+        self.wfile = wfile
+        self.lock = lock
+        self.chunk = chunk
+
+    def write(self, record: Dict):
+        send_msg(self.wfile, self.lock, {"op": "result", "chunk": self.chunk, "record": record})
+
+def run_worker(endpoint: str, bucket: Optional[TokenBucket] = None, token: Optional[str] = None) -> int:
+    # bucket: a rate budget shared with sibling processes (see run_processes); token: the coordinator's --token
+    family, address = parse_endpoint(endpoint)
+    conn = socket.socket(family, socket.SOCK_STREAM)
+    try:
+        conn.connect(address)
+    except OSError as e:
+        print(Fore.RED + f"Cannot reach coordinator at {endpoint}: {e}")
+        return 1
+    rfile, wfile = conn.makefile("rb"), conn.makefile("wb")
+    wlock = threading.Lock()
+    name = f"{socket.gethostname()}:{os.getpid()}"
+    try:
+        send_msg(wfile, wlock, {"op": "hello", "worker": name, "token": token})
+        config = recv_msg(rfile)
+        if not config:
+            print(Fore.RED + "Coordinator closed the connection.")
+            return 1
+        if config["op"] == "error":
+            print(Fore.RED + f"Coordinator refused this worker: {config.get('message')}")
+            return 1
+        options = config["options"]
+        while True:
+            send_msg(wfile, wlock, {"op": "lease"})
+            msg = recv_msg(rfile)
+            if msg is None or msg["op"] == "bye":
+                break
+            if msg["op"] == "wait":
+                time.sleep(msg.get("seconds", SOURCE_POLL))
+                continue
+            cid = msg["id"]
+            stop = threading.Event()
+
+            def renew(cid=cid, stop=stop, every=max(1.0, msg.get("lease", CLUSTER_LEASE) / 3)):
+                while not stop.wait(every):
+                    send_msg(wfile, wlock, {"op": "renew", "chunk": cid})
+
+            threading.Thread(target=renew, daemon=True).start()
+            before = STATS["probes"]
+            try:
+                run_scan([tuple(h) for h in msg["hosts"]], msg["ports"], sink=ClusterSink(wfile, wlock, cid),
+                         keep_results=False, bucket=bucket, **options)
+            finally:
+                stop.set()
+            send_msg(wfile, wlock, {"op": "done", "chunk": cid, "probes": STATS["probes"] - before})
+    except (OSError, ValueError) as e:
+        print(Fore.RED + f"Lost the coordinator: {e}")
+        return 1
+    finally:
+        conn.close()
+    print(Style.BRIGHT + Fore.GREEN + "\nWorker finished.")
+    return 0
+
+def _process_worker(endpoint: str, bucket: Optional[TokenBucket], counters=None, slot: int = 0):
+    # child of run_processes: the parent reports findings, owns Ctrl-C and, with --adaptive, the rate
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    sys.stdout = open(os.devnull, "w")
+    if counters is not None:
+        def publish():
+            # this process's totals in its own slot; only the parent's controller reads them
+            while True:
+                counters[slot * 3:slot * 3 + 3] = [STATS["probes"], STATS["timeout"], STATS["refused"]]
+                time.sleep(0.1)
+
+        threading.Thread(target=publish, daemon=True).start()
+    sys.exit(run_worker(endpoint, bucket))
+
+def run_processes(hosts: Iterable[Optional[Tuple[str, str]]], ports: List[int], options: Dict, processes: int,
+                  sink: ResultSink, chunk_hosts: Optional[int] = None,
+                  chunk_ports: Optional[int] = None, bus: Optional[EventBus] = None,
+                  bucket: Optional[SharedTokenBucket] = None) -> Coordinator:
+    # a private coordinator on a Unix socket, fed by `processes` local workers with one rate budget
+    # (bucket, when the caller already shares it with discovery). Without explicit chunk sizes every
+    # host batch is cut into CLUSTER_CHUNKS_PER_WORKER chunks per process, so small scans spread too
+    ctx = process_context()
+    processes = max(1, processes)
+    if bucket is None and options.get("rate"):
+        bucket = SharedTokenBucket(options["rate"], options.get("burst", 0.0), ctx)
+    counters = controller = None
+    if bucket and options.get("adaptive"):
+        # one AIMD controller here over every worker's counters; a controller per worker would each
+        # halve the shared rate on the same congestion event
+        counters = ctx.Array("d", 3 * processes, lock=False)
+        controller = AdaptiveRate(bucket, source=lambda: [sum(counters[i::3]) for i in range(3)])
+        options = dict(options, adaptive=False)
+    tmpdir = tempfile.mkdtemp(prefix="hexascan-")
+    spread = 0 if chunk_hosts or chunk_ports else processes * CLUSTER_CHUNKS_PER_WORKER
+    coordinator = Coordinator(hosts, ports, options, sink, chunk_hosts or CLUSTER_CHUNK_HOSTS,
+                              chunk_ports or CLUSTER_CHUNK_PORTS, verbose=False, bus=bus, spread=spread)
+    coordinator.controller = controller
+    coordinator.listen("unix:" + os.path.join(tmpdir, "coordinator.sock"))
+    procs = [ctx.Process(target=_process_worker, args=("unix:" + os.path.join(tmpdir, "coordinator.sock"), bucket,
+                                                       counters, i), daemon=True) for i in range(processes)]
+    for proc in procs:
+        proc.start()
+    if controller:
+        def control():
+            while not coordinator.finished.wait(0.25):
+                controller.observe()
+
+        threading.Thread(target=control, daemon=True).start()
+    try:
+        coordinator.run(alive=lambda: any(proc.is_alive() for proc in procs))
+    finally:
+        for proc in procs:
+            proc.join(timeout=2.0)
+            if proc.is_alive():
+                proc.terminate()
+        shutil.rmtree(tmpdir, ignore_errors=True)
+    return coordinator
+
@@ -1,17 +1,206 @@
 #!/usr/bin/env python3
 """
-Simple Flask dashboard to view results.json produced by skan.py
+Simple Flask dashboard to view results produced by skan.py
 Run:
   export FLASK_ENV=development
   python3 dashboard.py
 Open http://127.0.0.1:5000
+Live progress: run the scanner with --events 127.0.0.1:5001
+Scan history (hexascan.py --db scans.db): /api/runs, /api/runs/<id>/results, /api/diff?a=<id>&b=<id>
 """
-from flask import Flask, render_template_string, jsonify, request
-import json, os, time
+from flask import Flask, Response, render_template_string, jsonify, request, stream_with_context
+from collections import deque
+import bisect, json, os, socket, threading, time
+from scandb import ScanDB
+
 
 RESULTS_FILE = "results.json"
+# scan history written by hexascan.py --db
+DB_FILE = "scans.db"
+# appended to while a scan runs; preferred over RESULTS_FILE when present
+STREAM_FILE = "results.ndjson"
+PAGE_LIMIT = 500
+MAX_LIMIT = 5000
+# where hexascan --events sends its datagrams, and how many recent events a reconnecting browser can catch up on
+EVENTS_ADDR = ("127.0.0.1", 5001)
+EVENT_BACKLOG = 1000
+SSE_KEEPALIVE = 15.0
 app = Flask(__name__)
 
+class ResultStore:
+    """Findings indexed by ip, port, proto and plugin, refreshed only when the file on disk changes.
+
+    The NDJSON stream is read incrementally from the last offset (a torn last line waits for the
+    next refresh); a shorter file or a new inode means a new scan, so the store starts over and
+    bumps `generation`. results.json has no offsets, so it is re-read whenever its mtime or size
+    changes. Every record gets an increasing id, which doubles as the "since" cursor.
+    """
+
+    def __init__(self, stream_file: str, results_file: str):
+        self.stream_file = stream_file
+        self.results_file = results_file
+        self.lock = threading.Lock()
+        self.generation = 0
+        self._reset(None)
+
+    def _reset(self, source):
+        self.source = source
+        self.sig = None
+        self.head = b""
+        self.offset = 0
+        self.rows = []
+        self.index = {"ip": {}, "port": {}, "proto": {}, "plugin": {}}
+
+    def _add(self, rec: dict):
+        rid = len(self.rows) + 1
+        rec["id"] = rid
+        self.rows.append(rec)
+        keys = {"ip": [rec.get("ip")], "port": [str(rec.get("port"))], "proto": [rec.get("proto")],
+                "plugin": {p.get("plugin", p.get("name")) for p in rec.get("plugins") or [] if isinstance(p, dict)}}
+        for field, values in keys.items():
+            for v in values:
+                if v is not None:
+                    self.index[field].setdefault(str(v), []).append(rid)
+
+    def refresh(self):
+        with self.lock:
+            source = self.stream_file if os.path.exists(self.stream_file) else self.results_file
+            try:
+                st = os.stat(source)
+            except OSError:
+                if self.rows or self.source:
+                    self.generation += 1
+                    self._reset(None)
+                return
+            sig = (st.st_ino, st.st_size, st.st_mtime_ns)
+            if source == self.source and sig == self.sig:
+                return
+            head = self._head(source)
+            # a new scan truncates the stream; the first record tells a rewrite from an append
+            if source != self.source or source == self.results_file or st.st_ino != self.sig[0] \
+                    or st.st_size < self.offset or head[:len(self.head)] != self.head:
+                self.generation += 1
+                self._reset(source)
+            self.head = head
+            if source == self.stream_file:
+                self._read_stream()
+            else:
+                self._read_results()
+            self.sig = sig
+
+    def _head(self, path: str) -> bytes:
+        with open(path, "rb") as f:
+            line = f.readline(4096)
+        return line if line.endswith(b"\n") else b""
+
+    def _read_stream(self):
+        with open(self.stream_file, "rb") as f:
+            f.seek(self.offset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            if not line.strip():
+                continue
+            try:
+                self._add(json.loads(line))
+            except ValueError:
+                continue
+        self.offset += end
+
+    def _read_results(self):
+        try:
+            with open(self.results_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            # mid-rewrite or hand-edited; keep nothing and retry on the next change
+            self.sig = None
+            return
+        for rec in data if isinstance(data, list) else []:
+            if isinstance(rec, dict):
+                self._add(rec)
+
+    def _match(self, rec: dict, filters: dict) -> bool:
+        for field, value in filters.items():
+            if field == "plugin":
+                if not any(isinstance(p, dict) and p.get("plugin", p.get("name")) == value for p in rec.get("plugins") or []):
+                    return False
+            elif str(rec.get(field)) != value:
+                return False
+        return True
+
+    def query(self, filters: dict, since: int = 0, offset: int = 0, limit: int = PAGE_LIMIT) -> dict:
+        self.refresh()
+        with self.lock:
+            if filters:
+                # walk the shortest index list past the cursor, checking the other filters per row
+                ids = min((self.index[f].get(v, []) for f, v in filters.items()), key=len)
+                ids = ids[bisect.bisect_right(ids, since):]
+                if len(filters) > 1:
+                    ids = [i for i in ids if self._match(self.rows[i - 1], filters)]
+            else:
+                ids = range(since + 1, len(self.rows) + 1)
+            items = [self.rows[i - 1] for i in ids[offset:offset + limit]]
+            return {"generation": self.generation, "cursor": len(self.rows), "total": len(ids), "items": items}
+
+    def clear(self):
+        with self.lock:
+            for path in (self.stream_file, self.results_file):
+                if os.path.exists(path):
+                    os.remove(path)
+            self.generation += 1
+            self._reset(None)
+
+store = ResultStore(STREAM_FILE, RESULTS_FILE)
+
+class EventFeed:
+    """Live scanner events received over UDP, fanned out to every Server-Sent Events client.
+
+    Events go into a ring buffer with increasing ids; each client waits for ids past its own, so a
+    browser that falls behind skips whatever scrolled out of the ring instead of slowing the feed.
+    """
+
+    def __init__(self, address, backlog: int = EVENT_BACKLOG):
+        self.address = address
+        self.events = deque(maxlen=backlog)
+        self.last_id = 0
+        self.progress = None
+        self.cond = threading.Condition()
+
+    def start(self) -> bool:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            sock.bind(self.address)
+        except OSError as e:
+            print(f"Live events disabled, cannot bind {self.address[0]}:{self.address[1]}: {e}")
+            return False
+        threading.Thread(target=self._recv, args=(sock,), daemon=True).start()
+        return True
+
+    def _recv(self, sock):
+        while True:
+            data, _ = sock.recvfrom(65535)
+            try:
+                event = json.loads(data)
+            except ValueError:
+                continue
+            if not isinstance(event, dict):
+                continue
+            with self.cond:
+                self.last_id += 1
+                self.events.append((self.last_id, event))
+                if event.get("event") in ("progress", "scan_done"):
+                    self.progress = (self.last_id, event)
+                self.cond.notify_all()
+
+    def wait(self, after: int, timeout: float):
+        # events with ids past `after`, waiting up to timeout for the first one
+        with self.cond:
+            if self.last_id <= after:
+                self.cond.wait(timeout)
+            return [(i, e) for i, e in self.events if i > after]
+
+feed = EventFeed(EVENTS_ADDR)
+
 TEMPLATE = """
 <!doctype html>
 <html>
@@ -22,32 +211,110 @@ TEMPLATE = """
 <style>pre{white-space:pre-wrap;word-wrap:break-word}</style>
 </head>
 <body>
-<nav><a href="/">Home</a> <a href="/api/results">API (JSON)</a></nav>
-<header><h1>Skan Dashboard</h1><p>Auto-refresh every 6s</p></header>
+<nav><a href="/">Home</a> <a href="/api/results">API (JSON)</a> <a href="/api/runs">Scan history</a></nav>
+<header><h1>Skan Dashboard</h1><p id="progress">Waiting for live events (scan with --events 127.0.0.1:5001)</p></header>
 <main>
-<button onclick="location.reload()">Refresh Now</button>
-<button onclick="clearResults()">Clear results.json</button>
+<form id="filters" onsubmit="event.preventDefault(); restart();">
+<input name="ip" placeholder="ip"> <input name="port" placeholder="port" size="6">
+<input name="proto" placeholder="proto" size="8"> <input name="plugin" placeholder="plugin">
+<button type="submit">Filter</button>
+<button type="button" onclick="clearResults()">Clear results</button>
+</form>
+<p id="status"></p>
+<ul id="live"></ul>
 <table>
 <thead><tr><th>Target</th><th>IP</th><th>Port</th><th>Proto</th><th>Banner (preview)</th><th>Plugins</th></tr></thead>
 <tbody id="rows"></tbody>
 </table>
+<button id="more" onclick="loadMore()" style="display:none">Load more</button>
 <script>
-async function load(){
-  const res = await fetch('/api/results');
-  const json = await res.json();
-  const tbody = document.getElementById('rows');
-  tbody.innerHTML = '';
-  for(const r of json){
-    const plugins = (r.plugins || []).map(p => JSON.stringify(p)).join('<br>');
-    const banner = (r.banner||'').slice(0,300).replace(/</g,'&lt;');
-    tbody.innerHTML += `<tr><td>${r.target||''}</td><td>${r.ip||''}</td><td>${r.port}</td><td>${r.proto||''}</td><td><pre>${banner}</pre></td><td>${plugins}</td></tr>`;
-  }
+const PAGE = {{ page }};
+let generation = null, cursor = 0, shown = 0, total = 0;
+function esc(s){ return String(s).replace(/&/g,'&amp;').replace(/</g,'&lt;'); }
+function params(extra){
+  const q = new URLSearchParams();
+  for(const [k, v] of new FormData(document.getElementById('filters'))) if(v) q.set(k, v);
+  for(const k in extra) q.set(k, extra[k]);
+  return q;
+}
+function render(items){
+  const html = items.map(r => {
+    const plugins = (r.plugins || []).map(p => esc(JSON.stringify(p))).join('<br>');
+    const banner = esc((r.banner||'').slice(0,300));
+    return `<tr><td>${esc(r.target||'')}</td><td>${esc(r.ip||'')}</td><td>${r.port}</td><td>${esc(r.proto||'')}</td><td><pre>${banner}</pre></td><td>${plugins}</td></tr>`;
+  }).join('');
+  document.getElementById('rows').insertAdjacentHTML('beforeend', html);
+  shown += items.length;
+}
+function status(){
+  document.getElementById('status').textContent = `${shown} of ${total} findings shown`;
+  document.getElementById('more').style.display = shown < total ? '' : 'none';
+}
+async function fetchPage(extra){
+  const res = await fetch('/api/results?' + params(extra));
+  return res.json();
+}
+async function restart(){
+  document.getElementById('rows').innerHTML = '';
+  shown = 0;
+  const json = await fetchPage({offset: 0, limit: PAGE});
+  generation = json.generation; cursor = json.cursor; total = json.total;
+  render(json.items); status();
+}
+async function loadMore(){
+  const json = await fetchPage({offset: shown, limit: PAGE});
+  if(json.generation !== generation) return restart();
+  cursor = Math.max(cursor, json.cursor); total = json.total;
+  render(json.items); status();
+}
+let polling = false, lastEvent = 0, lastFinding = 0;
+async function poll(){
+  // only what arrived after the cursor; rows past the loaded pages wait for "Load more"
+  if(polling) return;
+  polling = true;
+  try { await pollOnce(); } finally { polling = false; }
+}
+async function pollOnce(){
+  const atEnd = shown >= total;
+  const json = await fetchPage({since: cursor, limit: PAGE});
+  if(json.generation !== generation) return restart();
+  cursor = json.cursor; total += json.total;
+  if(atEnd) render(json.items);
+  status();
 }
 function clearResults(){
-  fetch('/api/clear',{method:'POST'}).then(()=>load());
+  fetch('/api/clear',{method:'POST'}).then(()=>restart());
+}
+function secs(t){ return t == null ? '?' : t < 90 ? `${Math.round(t)}s` : `${Math.floor(t/60)}m${Math.round(t%60)}s`; }
+function showProgress(p){
+  const parts = [`${p.probes} probes`, `${p.rate} probes/s`, `${p.open} open`];
+  if(p.total) parts.push(`${Math.min(100, 100*p.probes/p.total).toFixed(1)}% of ${p.hosts} hosts`);
+  if(p.chunks) parts.push(`${p.chunks_done}/${p.chunks} chunks`);
+  parts.push(p.event === 'scan_done' ? `done in ${secs(p.elapsed)}` : `ETA ${secs(p.eta)}`);
+  document.getElementById('progress').textContent = parts.join(' | ');
 }
-load();
-setInterval(load, 6000);
+function live(text){
+  const ul = document.getElementById('live');
+  ul.insertAdjacentHTML('afterbegin', `<li>${esc(text)}</li>`);
+  while(ul.children.length > 10) ul.lastChild.remove();
+}
+function listen(kind, fn){
+  source.addEventListener(kind, e => { lastEvent = Date.now(); fn(JSON.parse(e.data)); });
+}
+const source = new EventSource('/api/events');
+listen('progress', p => {
+  showProgress(p);
+  // records reach the stream file when the scanner flushes it; keep fetching while findings arrive
+  if(Date.now() - lastFinding < 10000) poll();
+});
+listen('host_start', e => live(`scanning ${e.target} (${e.ip})`));
+listen('host_done', e => live(`finished ${e.target} (${e.ip}): ${e.open} open`));
+listen('port_open', e => { lastFinding = Date.now(); live(`open ${e.ip}:${e.port}/${e.proto}`); });
+listen('plugin_result', e => { lastFinding = Date.now(); live(`${e.ip}:${e.port} ${e.plugins.join(', ')}${e.errors ? ` (${e.errors} errors)` : ''}`); });
+listen('scan_done', p => { showProgress(p); setTimeout(poll, 1000); });
+restart();
+// without a scanner publishing events, fall back to polling
+setInterval(() => { if(Date.now() - lastEvent > 10000) poll(); }, 3000);
 </script>
 </main>
 <footer><p>Generated: {{ ts }}</p></footer>
@@ -58,27 +325,110 @@ setInterval(load, 6000);
 @app.route("/")
 def index():
     ts = time.strftime("%Y-%m-%d %H:%M:%S")
-    return render_template_string(TEMPLATE, ts=ts)
+    return render_template_string(TEMPLATE, ts=ts, page=PAGE_LIMIT)
+
+def page_args():
+    filters = {k: request.args[k] for k in ("ip", "port", "proto", "plugin") if request.args.get(k)}
+    offset = max(0, int(request.args.get("offset", 0)))
+    limit = min(MAX_LIMIT, max(1, int(request.args.get("limit", PAGE_LIMIT))))
+    return filters, offset, limit
 
 @app.route("/api/results")
 def api_results():
-    if not os.path.exists(RESULTS_FILE):
-        return jsonify([])
+    # ?ip=&port=&proto=&plugin= filter, ?since=<cursor> returns only newer records, ?offset=&limit= pages
     try:
-        with open(RESULTS_FILE, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            return jsonify(data)
-    except Exception:
-        return jsonify([])
+        filters, offset, limit = page_args()
+        since = max(0, int(request.args.get("since", 0)))
+    except ValueError:
+        return jsonify({"error": "since, offset and limit must be integers"}), 400
+    return jsonify(store.query(filters, since, offset, limit))
+
+def open_history():
+    # a connection per request; WAL lets these read while a scan is writing
+    return ScanDB(DB_FILE) if os.path.exists(DB_FILE) else None
+
+@app.route("/api/runs")
+def api_runs():
+    db = open_history()
+    if not db:
+        return jsonify({"error": f"no scan history in {DB_FILE}"}), 404
+    try:
+        # a negative LIMIT means "no limit" to SQLite
+        return jsonify(db.runs(min(MAX_LIMIT, max(1, request.args.get("limit", 50, type=int)))))
+    finally:
+        db.close()
+
+@app.route("/api/runs/<int:run_id>/results")
+def api_run_results(run_id):
+    db = open_history()
+    if not db:
+        return jsonify({"error": f"no scan history in {DB_FILE}"}), 404
+    try:
+        filters, offset, limit = page_args()
+    except ValueError:
+        return jsonify({"error": "offset and limit must be integers"}), 400
+    try:
+        return jsonify(db.results(run_id, filters, offset, limit))
+    finally:
+        db.close()
+
+@app.route("/api/diff")
+def api_diff():
+    # ?a=&b= run ids (or prev/last); ports opened, closed and with a changed banner from a to b
+    db = open_history()
+    if not db:
+        return jsonify({"error": f"no scan history in {DB_FILE}"}), 404
+    try:
+        a, b = db.run_id(request.args.get("a", "prev")), db.run_id(request.args.get("b", "last"))
+        d = db.diff(a, b)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    finally:
+        db.close()
+    keys = ("ip", "port", "proto", "banner")
+    return jsonify({"a": a, "b": b, "opened": [dict(zip(keys, r)) for r in d["opened"]],
+                    "closed": [dict(zip(keys, r)) for r in d["closed"]],
+                    "changed": [dict(zip(("ip", "port", "proto", "before", "after"), r)) for r in d["changed"]]})
+
+@app.route("/api/events")
+def api_events():
+    # Server-Sent Events; a reconnecting EventSource resumes from Last-Event-ID
+    try:
+        after = int(request.headers.get("Last-Event-ID", 0))
+    except ValueError:
+        after = 0
+    if after > feed.last_id:
+        # the dashboard restarted since the browser last heard from it
+        after = 0
+
+    def stream():
+        last = after
+        if not last:
+            # a new client starts at the present, with the latest progress line
+            last = feed.last_id
+            if feed.progress:
+                _, e = feed.progress
+                yield f"id: {last}\nevent: {e.get('event', 'message')}\ndata: {json.dumps(e)}\n\n"
+        while True:
+            batch = feed.wait(last, SSE_KEEPALIVE)
+            if not batch:
+                yield ": keepalive\n\n"
+                continue
+            for i, e in batch:
+                yield f"id: {i}\nevent: {e.get('event', 'message')}\ndata: {json.dumps(e)}\n\n"
+            last = batch[-1][0]
+
+    return Response(stream_with_context(stream()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 @app.route("/api/clear", methods=["POST"])
 def api_clear():
     try:
-        if os.path.exists(RESULTS_FILE):
-            os.remove(RESULTS_FILE)
+        store.clear()
         return ("", 204)
     except Exception:
         return ("", 500)
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000)
+    feed.start()
+    app.run(host="0.0.0.0", port=5000, threaded=True)
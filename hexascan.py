@@ -4,19 +4,38 @@ Skan - CLI scanner with plugin support.
 Usage examples:
   python3 skan.py scanme.nmap.org --mode fast --output json --out-file results.json
   sudo python3 skan.py 192.168.1.10 --scan syn --mode fast
+  python3 skan.py 10.0.0.0/24 --mode full --engine async --concurrency 4000
 """
 from __future__ import annotations
 import argparse
+import ast
+import asyncio
+import base64
+import bisect
 import socket
 import ipaddress
 import importlib.util
 import os
 import json
+import math
+import multiprocessing
+import queue
 import time
 import csv
+import errno
+import hashlib
+import heapq
+import random
+import re
+import selectors
+import struct
 import sys
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import List, Dict, Optional, Tuple
+import textwrap
+import threading
+from collections import Counter, OrderedDict, deque
+from itertools import chain
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator, List, Dict, Optional, Tuple
 
 # third-party
 try:
@@ -26,9 +45,19 @@ except Exception:
     print("Install dependencies: pip3 install colorama prettytable")
     sys.exit(1)
 
+# dnspython optional (record TTLs for the resolver cache)
+try:
+    import dns.resolver
+    import dns.exception
+    DNSPY = True
+except Exception:
+    DNSPY = False
+
 # scapy optional
 try:
-    from scapy.all import IP, TCP, sr1, ICMP, conf as scapy_conf
+    import logging
+    logging.getLogger("scapy.runtime").setLevel(logging.ERROR)
+    from scapy.all import IP, TCP, sr1, sr, ICMP, conf as scapy_conf
     SCAPY = True
 except Exception:
     SCAPY = False
@@ -37,151 +66,763 @@ colorama_init(autoreset=True)
 
 PLUGIN_DIR = "plugins"
 RESULTS_FILE_DEFAULT = "results.json"
+STREAM_FILE_DEFAULT = "results.ndjson"
+FSYNC_INTERVAL = 5.0
+CHECKPOINT_FILE_DEFAULT = "hexascan.ckpt"
+CHECKPOINT_INTERVAL = 10.0
+# ports per checkpoint chunk (one bit per chunk per host)
+CHECKPOINT_CHUNK = 256
+# distributed mode: a work unit is CLUSTER_CHUNK_HOSTS hosts x CLUSTER_CHUNK_PORTS ports
+CLUSTER_CHUNK_HOSTS = 8
+CLUSTER_CHUNK_PORTS = 1024
+CLUSTER_LEASE = 30.0
+# leases a chunk gets before it is given up on (its workers all died or went quiet)
+CLUSTER_MAX_LEASES = 3
+# --processes without --chunk-*: chunks per process in every host batch, and the fewest ports a chunk is cut to
+# (one per process: each chunk waits out its own slowest probe, so extra chunks add timeout tails)
+CLUSTER_CHUNKS_PER_WORKER = 1
+CLUSTER_MIN_CHUNK_PORTS = 64
+PROFILE_FILE_DEFAULT = "hexascan-profile.json"
+# live events: queued datagrams before new ones are dropped, largest datagram, seconds between progress events
+EVENT_QUEUE = 1024
+EVENT_MAX_BYTES = 8192
+EVENT_PROGRESS_INTERVAL = 1.0
 
 COMMON_SERVICES = {
     21: "FTP", 22: "SSH", 23: "Telnet", 25: "SMTP", 53: "DNS", 80: "HTTP",
     110: "POP3", 143: "IMAP", 443: "HTTPS", 3306: "MySQL", 3389: "RDP", 445: "SMB"
 }
 
+HTTP_PORTS = (80,8080,8000,8888,8443)
+DEFAULT_CONCURRENCY = 1000
+DEFAULT_MAX_HOSTS = 256
+PLUGIN_WORKERS = 16
+PLUGIN_TIMEOUT = 10.0
+PLUGIN_CONCURRENCY = 4
+SOURCE_POLL = 0.05
+# liveness pre-pass: a handful of the most commonly open ports from TOP_100
+DISCOVERY_PORTS = [80, 443, 22, 445, 3389]
+DNS_DEFAULT_TTL = 300
+DNS_NEGATIVE_TTL = 60
+# fingerprint cache: seconds an enumeration stays reusable, and entries kept (least recently used dropped first)
+FINGERPRINT_TTL = 86400.0
+FINGERPRINT_MAX = 100000
+# adaptive timeouts: never wait less than this for a probe, nor less than BANNER_MIN_TIMEOUT for a banner
+RTT_MIN_TIMEOUT = 0.03
+BANNER_MIN_TIMEOUT = 0.3
+
 TOP_100 = [80,443,22,21,25,23,53,110,445,139,3389,8080,3306,143,993,995,1723,5900,1025,587,8443,123,161,69]
 
+# scan-wide counters (handshakes, open ports, ...), shared by every worker
+STATS = Counter()
+_stats_lock = threading.Lock()
+
+TIMEOUT_ERRNOS = (errno.EAGAIN, errno.EWOULDBLOCK, errno.ETIMEDOUT, errno.EINPROGRESS)
+
 # ---------- utilities ----------
-def expand_targets(items: List[str]) -> List[str]:
-    out = []
-    for it in items:
-        it = it.strip()
-        if not it:
-            continue
-        if "/" in it:
+def mode_ports(mode: str, start: int = 1, end: int = 1024) -> List[int]:
+    if mode == "fast":
+        return TOP_100
+    if mode == "normal":
+        return list(range(1,1025))
+    if mode == "full":
+        return list(range(1,65536))
+    return list(range(max(1,start), min(65535,end)+1))
+
+def bump(key: str, n: int = 1):
+    with _stats_lock:
+        STATS[key] += n
+
+def count_failure(rc: int):
+    # closed ports answer with RST (refused); filtered ones just time out
+    if rc == errno.ECONNREFUSED:
+        bump("refused")
+    elif rc in TIMEOUT_ERRNOS:
+        bump("timeout")
+    else:
+        bump("error")
+
+# ---------- instrumentation ----------
+class Histogram:
+    """Latency distribution in quarter-octave microsecond buckets: O(1) to record, percentiles within ~19%."""
+
+    __slots__ = ("count", "total", "min", "max", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+        self.buckets: Dict[int, int] = {}
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+        us = seconds * 1e6
+        b = int(math.log2(us) * 4) + 1 if us >= 1 else 0
+        self.buckets[b] = self.buckets.get(b, 0) + 1
+
+    def percentile(self, q: float) -> float:
+        # upper edge of the bucket holding the q-th sample, clamped to what was actually seen
+        rank, seen = q * self.count, 0
+        for b in sorted(self.buckets):
+            seen += self.buckets[b]
+            if seen >= rank:
+                return min(self.max, max(self.min, 2 ** (b / 4) / 1e6))
+        return self.max
+
+    def to_dict(self) -> Dict:
+        return {"count": self.count, "total_s": round(self.total, 6), "mean_ms": round(self.total / self.count * 1000, 3),
+                "min_ms": round(self.min * 1000, 3), "p50_ms": round(self.percentile(0.5) * 1000, 3),
+                "p90_ms": round(self.percentile(0.9) * 1000, 3), "p99_ms": round(self.percentile(0.99) * 1000, 3),
+                "max_ms": round(self.max * 1000, 3)}
+
+class Profiler:
+    """Timings for --profile: one histogram per phase or probe type, plus event counters.
+
+    Instrumented code checks the module-level PROFILE first, so with profiling off a probe pays one
+    global lookup and nothing else. Names: resolve, discovery (per batch), probe.<type> (whole
+    probe, retries included; for the batch SYN and UDP engines the reply latency), banner,
+    plugin.<name> (run time), plugin.queue (wait for a slot), output (sink writes) and phase.*
+    (wall clock of the top-level steps).
+    """
+
+    def __init__(self):
+        self.timers: Dict[str, Histogram] = {}
+        self.counters = Counter()
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+
+    def record(self, name: str, seconds: float):
+        with self.lock:
+            h = self.timers.get(name)
+            if h is None:
+                h = self.timers[name] = Histogram()
+            h.add(seconds)
+
+    def since(self, name: str, t0: float):
+        self.record(name, time.monotonic() - t0)
+
+    def count(self, name: str, n: int = 1):
+        with self.lock:
+            self.counters[name] += n
+
+    def report(self, counters: Optional[Dict] = None) -> Dict:
+        with self.lock:
+            timers = {name: h.to_dict() for name, h in sorted(self.timers.items())}
+            extra = dict(self.counters)
+        return {"version": 1, "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "argv": sys.argv[1:],
+                "wall_s": round(time.monotonic() - self.started, 3), "timers": timers,
+                "counters": {**dict(STATS), **extra, **(counters or {})}}
+
+    def print_summary(self, report: Dict):
+        table = PrettyTable([Fore.CYAN + h for h in ("Timer", "Count", "Total s", "Mean ms", "p50 ms", "p90 ms", "p99 ms", "Max ms")])
+        for name, t in report["timers"].items():
+            table.add_row([name, t["count"], f"{t['total_s']:.3f}", t["mean_ms"], t["p50_ms"], t["p90_ms"], t["p99_ms"], t["max_ms"]])
+        table.align = "r"
+        table.align[Fore.CYAN + "Timer"] = "l"
+        print(Style.BRIGHT + Fore.YELLOW + f"\nProfile ({report['wall_s']:.2f}s wall)")
+        print(table)
+        print(Fore.CYAN + "Counters: " + ", ".join(f"{k}={v}" for k, v in sorted(report["counters"].items())))
+
+# set by --profile; everything instrumented checks it before taking a timestamp
+PROFILE: Optional[Profiler] = None
+
+def parse_network(item: str) -> Optional[Tuple[int, int, int]]:
+    # (version, first, last) as integers for an IP or CIDR; None for hostnames
+    try:
+        net = ipaddress.ip_network(item, strict=False)
+    except ValueError:
+        return None
+    first, last = int(net.network_address), int(net.broadcast_address)
+    # same addresses as net.hosts(): no network/broadcast on IPv4, no subnet-router anycast on IPv6
+    if net.version == 4 and net.prefixlen < 31:
+        first, last = first + 1, last - 1
+    elif net.version == 6 and net.prefixlen < 127:
+        first += 1
+    return net.version, first, last
+
+def int_to_ip(version: int, value: int) -> str:
+    return str(ipaddress.IPv4Address(value) if version == 4 else ipaddress.IPv6Address(value))
+
+class ExcludeList:
+    """Sorted, merged integer intervals per IP version, plus literal hostnames."""
+
+    def __init__(self, items: Iterable[str] = ()):
+        spans = {4: [], 6: []}
+        self.names = set()
+        for it in items:
+            it = it.strip()
+            if not it or it.startswith("#"):
+                continue
             try:
                 net = ipaddress.ip_network(it, strict=False)
-                out.extend([str(ip) for ip in net.hosts()])
+            except ValueError:
+                self.names.add(it.lower())
                 continue
-            except Exception:
-                pass
-        out.append(it)
-    return out
+            spans[net.version].append((int(net.network_address), int(net.broadcast_address)))
+        self.spans = {}
+        for version, items_ in spans.items():
+            merged = []
+            for first, last in sorted(items_):
+                if merged and first <= merged[-1][1] + 1:
+                    merged[-1] = (merged[-1][0], max(merged[-1][1], last))
+                else:
+                    merged.append((first, last))
+            self.spans[version] = ([a for a, _ in merged], [b for _, b in merged])
 
-def resolve_host(label: str) -> Tuple[str, str]:
-    try:
-        ip = socket.gethostbyname(label)
-        return label, ip
-    except Exception:
-        return label, "<unresolved>"
-
-def load_plugins() -> List[object]:
-    plugins = []
-    if not os.path.isdir(PLUGIN_DIR):
-        return plugins
-    for fname in os.listdir(PLUGIN_DIR):
-        if not fname.endswith(".py"):
-            continue
-        if fname == "__init__.py":
-            continue
-        path = os.path.join(PLUGIN_DIR, fname)
-        name = fname[:-3]
+    def __bool__(self) -> bool:
+        return bool(self.names) or any(starts for starts, _ in self.spans.values())
+
+    def has_ip(self, version: int, value: int) -> bool:
+        starts, ends = self.spans[version]
+        i = bisect.bisect_right(starts, value) - 1
+        return i >= 0 and value <= ends[i]
+
+    def has(self, label: str) -> bool:
+        if label.lower() in self.names:
+            return True
         try:
-            spec = importlib.util.spec_from_file_location(f"{PLUGIN_DIR}.{name}", path)
-            mod = importlib.util.module_from_spec(spec)
-            spec.loader.exec_module(mod)  # type: ignore
-            if hasattr(mod, "run"):
-                plugins.append(mod)
+            ip = ipaddress.ip_address(label)
+        except ValueError:
+            return False
+        return self.has_ip(ip.version, int(ip))
+
+def permuted_range(n: int, rng: random.Random) -> Iterator[int]:
+    # full-period LCG over the next power of two, skipping values >= n: a random-looking
+    # permutation of range(n) in O(1) memory, however large n is
+    if n <= 1:
+        yield from range(n)
+        return
+    bits = (n - 1).bit_length()
+    m, mask = 1 << bits, (1 << bits) - 1
+    a = rng.randrange(m // 4) * 4 + 1 if m >= 4 else 1
+    c = rng.randrange(m) | 1
+    k = rng.randrange(m) | 1
+    shift = max(1, bits // 2)
+    x = rng.randrange(m)
+    for _ in range(m):
+        x = (a * x + c) & mask
+        # odd multiply + xorshift are both bijections on [0, m); they hide the LCG's stride
+        y = (x * k) & mask
+        y ^= y >> shift
+        if y < n:
+            yield y
+
+def iter_targets(items: Iterable[str], exclude: Optional[ExcludeList] = None, randomize: bool = False,
+                 seed: Optional[int] = None) -> Iterator[str]:
+    """Stream target labels; CIDRs and ranges are walked as integers and never materialized.
+
+    With randomize, the (compact) list of specs is read up front and a single permutation is
+    walked over the combined address space, so hosts from different inputs are interleaved too.
+    """
+    exclude = exclude or ExcludeList()
+
+    def specs():
+        for it in items:
+            it = it.strip()
+            if not it or it.startswith("#"):
+                continue
+            net = parse_network(it)
+            if net is None:
+                if not exclude.has(it):
+                    yield it, None
+            else:
+                yield it, net
+
+    def address(net: Tuple[int, int, int], offset: int) -> Optional[str]:
+        version, first, _ = net
+        value = first + offset
+        if exclude and exclude.has_ip(version, value):
+            return None
+        return int_to_ip(version, value)
+
+    if not randomize:
+        for label, net in specs():
+            if net is None:
+                yield label
+                continue
+            for offset in range(net[2] - net[1] + 1):
+                ip = address(net, offset)
+                if ip:
+                    yield ip
+        return
+
+    table = list(specs())
+    bounds, total = [], 0
+    for _, net in table:
+        total += 1 if net is None else net[2] - net[1] + 1
+        bounds.append(total)
+    for idx in permuted_range(total, random.Random(seed)):
+        i = bisect.bisect_right(bounds, idx)
+        label, net = table[i]
+        if net is None:
+            yield label
+        else:
+            ip = address(net, idx - (bounds[i - 1] if i else 0))
+            if ip:
+                yield ip
+
+def iter_lines(path: str) -> Iterator[str]:
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield line
+
+class Resolver:
+    """Thread-safe name -> addresses cache with TTLs.
+
+    Records keep the TTL DNS gave them when dnspython is available (otherwise DNS_DEFAULT_TTL);
+    NXDOMAIN is cached for DNS_NEGATIVE_TTL. With cache_file, unexpired entries survive between runs.
+    """
+
+    def __init__(self, ipv6: bool = False, cache_file: Optional[str] = None):
+        self.ipv6 = ipv6
+        self.cache_file = cache_file
+        self.cache: Dict[str, Tuple[float, List[str]]] = {}
+        self.lock = threading.Lock()
+        self.stats = Counter()
+        if cache_file and os.path.isfile(cache_file):
+            try:
+                with open(cache_file, "r", encoding="utf-8") as f:
+                    now = time.time()
+                    self.cache = {k: (exp, ips) for k, (exp, ips) in json.load(f).items() if exp > now}
+            except Exception as e:
+                print(Fore.YELLOW + f"[!] Ignoring DNS cache {cache_file}: {e}")
+
+    def save(self):
+        if not self.cache_file:
+            return
+        now = time.time()
+        with self.lock:
+            live = {k: v for k, v in self.cache.items() if v[0] > now}
+        try:
+            with open(self.cache_file + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(live, f)
+            os.replace(self.cache_file + ".tmp", self.cache_file)
         except Exception as e:
-            print(Fore.YELLOW + f"[!] Failed to load plugin {name}: {e}")
-    return plugins
+            print(Fore.YELLOW + f"[!] Could not save DNS cache: {e}")
 
-# ---------- banner grabbing / probes ----------
-def grab_banner_tcp(ip: str, port: int, timeout: float = 1.0) -> str:
-    s = None
-    try:
-        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        s.settimeout(timeout)
-        s.connect((ip, port))
-        # try initial recv
+    def _query_dns(self, name: str) -> Tuple[List[str], float]:
+        ips, ttl, nxdomain = [], None, False
+        for rdtype in (("A", "AAAA") if self.ipv6 else ("A",)):
+            try:
+                answer = dns.resolver.resolve(name, rdtype, lifetime=5)
+                ips.extend(r.to_text() for r in answer)
+                ttl = answer.rrset.ttl if ttl is None else min(ttl, answer.rrset.ttl)
+            except dns.resolver.NXDOMAIN:
+                nxdomain = True
+                break
+            except (dns.resolver.NoAnswer, dns.resolver.NoNameservers, dns.exception.Timeout):
+                continue
+        if not ips and not nxdomain:
+            raise LookupError(name)
+        return ips, float(ttl if ttl is not None else DNS_NEGATIVE_TTL)
+
+    def _query_system(self, name: str) -> Tuple[List[str], float]:
+        family = socket.AF_UNSPEC if self.ipv6 else socket.AF_INET
         try:
-            data = s.recv(4096)
-            if data:
-                return data.decode(errors="ignore").strip()
-        except Exception:
-            pass
-        # HTTP HEAD nudge
+            infos = socket.getaddrinfo(name, None, family, socket.SOCK_STREAM)
+        except socket.gaierror as e:
+            if e.errno in (socket.EAI_NONAME, getattr(socket, "EAI_NODATA", socket.EAI_NONAME)):
+                return [], float(DNS_NEGATIVE_TTL)
+            raise
+        ips = []
+        for info in infos:
+            if info[4][0] not in ips:
+                ips.append(info[4][0])
+        # IPv4 first, matching what gethostbyname used to return
+        ips.sort(key=lambda ip: ":" in ip)
+        return ips, float(DNS_DEFAULT_TTL)
+
+    def lookup(self, name: str) -> List[str]:
+        key = name.lower().rstrip(".")
+        now = time.time()
+        with self.lock:
+            hit = self.cache.get(key)
+            if hit and hit[0] > now:
+                self.stats["hit"] += 1
+                return hit[1]
+            self.stats["miss"] += 1
+        ips, ttl = [], 0.0
+        started = time.monotonic() if PROFILE else 0.0
         try:
-            if port in (80,8080,8000,8888,8443):
-                s.sendall(b"HEAD / HTTP/1.0\r\nHost: %b\r\n\r\n" % ip.encode())
-                resp = s.recv(4096)
-                if resp:
-                    return resp.decode(errors="ignore").splitlines()[0]
+            if DNSPY:
+                try:
+                    ips, ttl = self._query_dns(key)
+                except LookupError:
+                    pass
+            if not ips:
+                # /etc/hosts, mDNS, search domains ... only the system resolver knows those
+                ips, ttl = self._query_system(key)
         except Exception:
-            pass
-        return ""
-    except Exception:
-        return ""
-    finally:
-        if s:
-            try:
-                s.close()
-            except:
-                pass
+            with self.lock:
+                self.stats["error"] += 1
+            return []
+        finally:
+            if PROFILE:
+                PROFILE.since("resolve", started)
+        with self.lock:
+            # lookups run on the resolve_stream pool, so the counters share the cache lock
+            if not ips:
+                self.stats["negative"] += 1
+            self.cache[key] = (now + ttl, ips)
+        return ips
+
+def resolve_stream(labels: Iterable[str], resolver: Resolver, workers: int = 32, all_records: bool = False,
+                   exclude: Optional[ExcludeList] = None) -> Iterator[Optional[Tuple[str, str]]]:
+    """Resolve targets on a thread pool while scanning runs.
+
+    Yields (label, ip) pairs as lookups finish, or None when nothing is ready yet, so the
+    scheduler never blocks on DNS. IP literals skip the pool. At most `workers` lookups and a few
+    thousand finished targets are held at once, keeping memory flat for huge inputs.
+    """
+    out = queue.Queue(maxsize=4096)
+    done = object()
+    slots = threading.Semaphore(workers * 2)
 
-def tcp_connect_scan(ip: str, port: int, timeout: float = 1.0) -> Optional[Dict]:
+    def lookup(label: str):
+        try:
+            out.put((label, resolver.lookup(label)))
+        finally:
+            slots.release()
+
+    def feed():
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for label in labels:
+                if parse_network(label) is not None:
+                    out.put((label, [label]))
+                    continue
+                slots.acquire()
+                pool.submit(lookup, label)
+        out.put(done)
+
+    threading.Thread(target=feed, daemon=True).start()
+    while True:
+        try:
+            item = out.get_nowait()
+        except queue.Empty:
+            yield None
+            continue
+        if item is done:
+            return
+        label, ips = item
+        if not ips:
+            print(Fore.RED + f"Skipping unresolved target: {label}")
+            continue
+        if len(ips) > 1 and not all_records:
+            print(Fore.CYAN + f"{label} has {len(ips)} addresses, scanning {ips[0]} (--all-records for all)")
+        for ip in (ips if all_records else ips[:1]):
+            if ip != label and exclude and exclude.has(ip):
+                print(Fore.YELLOW + f"Skipping excluded target: {label} ({ip})")
+            else:
+                yield label, ip
+
+def plugin_name(plugin) -> str:
+    return getattr(plugin, "name", None) or getattr(plugin, "__name__", "unknown").rsplit(".", 1)[-1]
+
+PLUGIN_METADATA = ("PORTS", "PROTOCOLS", "BANNER_PATTERNS", "TIMEOUT", "CONCURRENCY")
+
+class PluginInfo:
+    """A plugin's declared metadata; the module itself is imported on first use.
+
+    Plugins declare module-level literals: PORTS (ports to run on), PROTOCOLS ("tcp", "udp"),
+    BANNER_PATTERNS (regexes that also trigger the plugin on any port), TIMEOUT and CONCURRENCY.
+    A plugin declaring neither PORTS nor BANNER_PATTERNS is offered every open port.
+    """
+
+    def __init__(self, name: str, path: str, meta: Dict):
+        self.name = name
+        self.path = path
+        self.ports = frozenset(int(p) for p in meta.get("PORTS") or ())
+        self.protocols = tuple(meta.get("PROTOCOLS") or ())
+        self.patterns = [re.compile(p) for p in meta.get("BANNER_PATTERNS") or ()]
+        self.timeout = meta.get("TIMEOUT")
+        self.concurrency = meta.get("CONCURRENCY")
+        self.module = None
+        self.failed = False
+        self.lock = threading.Lock()
+
+    @property
+    def wildcard(self) -> bool:
+        return not self.ports and not self.patterns
+
+    def load(self):
+        if self.module is not None or self.failed:
+            return self.module
+        with self.lock:
+            if self.module is None and not self.failed:
+                try:
+                    spec = importlib.util.spec_from_file_location(f"{PLUGIN_DIR}.{self.name}", self.path)
+                    mod = importlib.util.module_from_spec(spec)
+                    spec.loader.exec_module(mod)  # type: ignore
+                    if not hasattr(mod, "run"):
+                        raise AttributeError("no run() function")
+                    self.module = mod
+                except Exception as e:
+                    self.failed = True
+                    print(Fore.YELLOW + f"[!] Failed to load plugin {self.name}: {e}")
+        return self.module
+
+    def run(self, ip: str, port: int, banner: str):
+        mod = self.load()
+        return mod.run(ip, port, banner) if mod else None
+
+def read_plugin_metadata(path: str) -> Optional[Dict]:
+    # literal module-level assignments only, so nothing in the plugin is executed here
     try:
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(timeout)
-        # connect_ex returns 0 on success
-        rc = sock.connect_ex((ip, port))
-        if rc == 0:
-            banner = grab_banner_tcp(ip, port, timeout)
-            return {"ip": ip, "port": port, "proto": "tcp", "banner": banner or "", "status": "open"}
+        with open(path, "r", encoding="utf-8") as f:
+            tree = ast.parse(f.read(), filename=path)
+    except Exception as e:
+        print(Fore.YELLOW + f"[!] Failed to read plugin {os.path.basename(path)}: {e}")
         return None
+    meta, has_run = {}, False
+    for node in tree.body:
+        if isinstance(node, ast.FunctionDef) and node.name == "run":
+            has_run = True
+        elif isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+            key = node.targets[0].id
+            if key in PLUGIN_METADATA:
+                try:
+                    meta[key] = ast.literal_eval(node.value)
+                except ValueError:
+                    print(Fore.YELLOW + f"[!] {os.path.basename(path)}: {key} must be a literal")
+    return meta if has_run else None
+
+class PluginRegistry:
+    """Plugins indexed by port, read once per process (see get_registry)."""
+
+    def __init__(self, plugin_dir: str = PLUGIN_DIR):
+        self.plugins: List[PluginInfo] = []
+        self.by_port: Dict[int, List[PluginInfo]] = {}
+        self.by_banner: List[PluginInfo] = []
+        self.wildcard: List[PluginInfo] = []
+        if not os.path.isdir(plugin_dir):
+            return
+        for fname in sorted(os.listdir(plugin_dir)):
+            # _helpers.py and __init__.py are support modules, not plugins
+            if not fname.endswith(".py") or fname.startswith("_"):
+                continue
+            path = os.path.join(plugin_dir, fname)
+            meta = read_plugin_metadata(path)
+            if meta is None:
+                continue
+            info = PluginInfo(fname[:-3], path, meta)
+            self.plugins.append(info)
+            for port in info.ports:
+                self.by_port.setdefault(port, []).append(info)
+            if info.patterns:
+                self.by_banner.append(info)
+            if info.wildcard:
+                self.wildcard.append(info)
+
+    def match(self, port: int, proto: str = "tcp", banner: str = "") -> List[PluginInfo]:
+        found = self.by_port.get(port, [])
+        extra = [p for p in self.by_banner if p not in found and banner and any(r.search(banner) for r in p.patterns)]
+        if extra or self.wildcard:
+            found = found + extra + self.wildcard
+        proto = proto.split("-", 1)[0]
+        return [p for p in found if not p.protocols or proto in p.protocols]
+
+_registry: Optional[PluginRegistry] = None
+_registry_lock = threading.Lock()
+
+def get_registry() -> PluginRegistry:
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = PluginRegistry(PLUGIN_DIR)
+        return _registry
+
+# ---------- RTT estimation ----------
+class RttEstimator:
+    """Per-host probe timeout from measured round trips, RFC 6298 style.
+
+    srtt and rttvar are smoothed from every definitive answer (connect, RST, SYN-ACK, ICMP echo)
+    and the timeout is srtt + 4*rttvar clamped to [floor, ceiling]; ceiling is --timeout, which is
+    also used until the first sample. A probe that times out below the ceiling is ambiguous (a
+    filtered port, or a late answer), so waits() allows one retry at twice the timeout.
+    """
+
+    def __init__(self, ceiling: float, floor: float = RTT_MIN_TIMEOUT):
+        self.ceiling = ceiling
+        self.floor = min(floor, ceiling)
+        self.srtt: Optional[float] = None
+        self.rttvar = 0.0
+        self.lock = threading.Lock()
+        self.stats = Counter()
+        self.used_min = self.used_max = 0.0
+        self.saved = 0.0
+
+    def sample(self, rtt: float):
+        if rtt <= 0:
+            return
+        with self.lock:
+            if self.srtt is None:
+                self.srtt, self.rttvar = rtt, rtt / 2
+            else:
+                self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+                self.srtt = 0.875 * self.srtt + 0.125 * rtt
+            self.stats["samples"] += 1
+
+    def peek(self) -> float:
+        if self.srtt is None:
+            return self.ceiling
+        return min(self.ceiling, max(self.floor, self.srtt + 4 * self.rttvar))
+
+    def charge(self, t: float, n: int = 1):
+        # n probes waited up to t each; recorded for the per-host report
+        with self.lock:
+            self.used_min = t if not self.stats["probes"] else min(self.used_min, t)
+            self.used_max = max(self.used_max, t)
+            self.stats["probes"] += n
+            self.stats["used_ms"] += int(t * 1000) * n
+
+    def take(self) -> float:
+        t = self.peek()
+        self.charge(t)
+        return t
+
+    def waits(self) -> Iterator[float]:
+        first = self.take()
+        yield first
+        if first < self.ceiling:
+            with self.lock:
+                self.stats["retries"] += 1
+            yield min(self.ceiling, first * 2)
+
+    def banner_timeout(self) -> float:
+        return min(self.ceiling, max(BANNER_MIN_TIMEOUT, 2 * self.peek()))
+
+    def expired(self, waited: float, n: int = 1):
+        # probes that got no answer at all; what they cost compared to a fixed --timeout
+        with self.lock:
+            self.stats["timeouts"] += n
+            self.saved += (self.ceiling - waited) * n
+
+    def late(self):
+        # answered only on the retry: the first timeout was too short
+        with self.lock:
+            self.stats["late"] += 1
+
+    def summary(self) -> str:
+        st = self.stats
+        srtt = f"{self.srtt * 1000:.2f}ms" if self.srtt is not None else "n/a"
+        return (f"Timeouts: srtt {srtt}, {self.used_min * 1000:.0f}-{self.used_max * 1000:.0f}ms "
+                f"(avg {st['used_ms'] / max(1, st['probes']):.0f}ms) over {st['probes']} probes, "
+                f"{st['retries']} retries ({st['late']} answered late), {self.saved:.1f} probe-s saved")
+
+# ---------- banner grabbing / probes ----------
+def read_banner(s: socket.socket, ip: str, port: int, timeout: float = 1.0) -> str:
+    # passive read first, then an HTTP HEAD nudge, both on an already connected socket
+    s.settimeout(timeout)
+    try:
+        data = s.recv(4096)
+        if data:
+            return data.decode(errors="ignore").strip()
     except Exception:
-        return None
-    finally:
-        try:
-            sock.close()
-        except:
-            pass
+        pass
+    try:
+        if port in HTTP_PORTS:
+            s.sendall(b"HEAD / HTTP/1.0\r\nHost: %b\r\n\r\n" % ip.encode())
+            resp = s.recv(4096)
+            if resp:
+                return resp.decode(errors="ignore").splitlines()[0]
+    except Exception:
+        pass
+    return ""
 
-def udp_probe(ip: str, port: int, timeout: float = 1.0) -> Optional[Dict]:
+def tcp_connect_scan(ip: str, port: int, timeout: float = 1.0, banner_timeout: Optional[float] = None,
+                     rtt: Optional[RttEstimator] = None) -> Optional[Dict]:
+    sock = None
+    started = time.monotonic() if PROFILE else 0.0
     try:
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        s.settimeout(timeout)
-        if port == 53:
-            # small DNS query
-            query = bytes.fromhex("12340100000100000000000000")
-            s.sendto(query, (ip, 53))
-            data, _ = s.recvfrom(1024)
-            if data:
-                return {"ip": ip, "port": port, "proto": "udp", "banner": "DNS response", "status": "open"}
-        else:
-            s.sendto(b"\x00", (ip, port))
-            data, _ = s.recvfrom(1024)
-            if data:
-                return {"ip": ip, "port": port, "proto": "udp", "banner": "data", "status": "open"}
+        waited = 0.0
+        for attempt, wait in enumerate(rtt.waits() if rtt else (timeout,)):
+            if sock:
+                sock.close()
+            sock = socket.socket(socket.AF_INET6 if ":" in ip else socket.AF_INET, socket.SOCK_STREAM)
+            sock.settimeout(wait)
+            t0 = time.monotonic()
+            # connect_ex returns 0 on success
+            try:
+                rc = sock.connect_ex((ip, port))
+            except socket.timeout:
+                rc = errno.ETIMEDOUT
+            if rc not in TIMEOUT_ERRNOS:
+                break
+            waited += wait
+        if PROFILE:
+            PROFILE.since("probe.tcp", started)
+        if rtt:
+            if rc in TIMEOUT_ERRNOS:
+                rtt.expired(waited)
+            elif rc in (0, errno.ECONNREFUSED):
+                # SYN-ACK and RST both took exactly one round trip
+                rtt.sample(time.monotonic() - t0)
+                if attempt:
+                    rtt.late()
+        if rc == 0:
+            bump("handshakes")
+            bump("open_tcp")
+            if banner_timeout is None:
+                banner_timeout = rtt.banner_timeout() if rtt else timeout
+            t1 = time.monotonic() if PROFILE else 0.0
+            banner = read_banner(sock, ip, port, banner_timeout)
+            if PROFILE:
+                PROFILE.since("banner", t1)
+            return {"ip": ip, "port": port, "proto": "tcp", "banner": banner or "", "status": "open"}
+        count_failure(rc)
+        return None
     except Exception:
+        bump("error")
         return None
     finally:
-        try:
-            s.close()
-        except:
-            pass
-    return None
+        if sock:
+            try:
+                sock.close()
+            except:
+                pass
 
-def syn_scan(ip: str, port: int, timeout: float = 1.0) -> Optional[Dict]:
+def syn_scan(ip: str, port: int, timeout: float = 1.0, rtt: Optional[RttEstimator] = None) -> Optional[Dict]:
     if not SCAPY:
         return None
     try:
         scapy_conf.verb = 0
         pkt = IP(dst=ip)/TCP(dport=port, flags="S")
-        resp = sr1(pkt, timeout=timeout)
+        resp, waited = None, 0.0
+        started = time.monotonic() if PROFILE else 0.0
+        for attempt, wait in enumerate(rtt.waits() if rtt else (timeout,)):
+            resp = sr1(pkt, timeout=wait)
+            if resp:
+                break
+            waited += wait
+        if PROFILE:
+            PROFILE.since("probe.syn", started)
+        if rtt:
+            if resp:
+                if pkt.sent_time:
+                    rtt.sample(resp.time - pkt.sent_time)
+                if attempt:
+                    rtt.late()
+            else:
+                rtt.expired(waited)
         if resp and resp.haslayer(TCP):
             flags = resp.getlayer(TCP).flags
             if flags & 0x12 == 0x12:
                 return {"ip": ip, "port": port, "proto": "tcp-syn", "banner": "", "status": "open"}
+            if flags & 0x04:
+                bump("refused")
+        elif not resp:
+            bump("timeout")
     except Exception:
         return None
     return None
 
-def ttl_os_guess(ip: str, timeout: float = 1.0) -> str:
+def ttl_os_guess(ip: str, timeout: float = 1.0, rtt: Optional[RttEstimator] = None) -> str:
     if not SCAPY:
         return ""
     try:
@@ -190,6 +831,9 @@ def ttl_os_guess(ip: str, timeout: float = 1.0) -> str:
         resp = sr1(pkt, timeout=timeout)
         if not resp:
             return ""
+        if rtt and pkt.sent_time:
+            # the echo reply doubles as an RTT seed for the port probes
+            rtt.sample(resp.time - pkt.sent_time)
         ttl = int(resp.ttl)
         if ttl <= 64:
             return "Linux/Unix (probable)"
@@ -199,42 +843,1528 @@ def ttl_os_guess(ip: str, timeout: float = 1.0) -> str:
     except Exception:
         return ""
 
-# ---------- driver ----------
-def scan_ports(ip: str, ports: List[int], scan_type: str, timeout: float, workers: int, rate: float) -> List[Dict]:
-    results = []
-    plugins = load_plugins()
-    with ThreadPoolExecutor(max_workers=workers) as ex:
-        futures = {}
-        for p in ports:
-            if scan_type == "tcp":
-                fut = ex.submit(tcp_connect_scan, ip, p, timeout)
-            elif scan_type == "udp":
-                fut = ex.submit(udp_probe, ip, p, timeout)
-            elif scan_type == "syn":
-                fut = ex.submit(syn_scan, ip, p, timeout)
+# ---------- stateless SYN engine ----------
+def raw_syn_available() -> bool:
+    try:
+        socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_TCP).close()
+        return True
+    except Exception:
+        return False
+
+def source_ip_for(dst: str) -> str:
+    # let the routing table pick the outgoing address; a UDP connect sends nothing
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        s.connect((dst, 9))
+        return s.getsockname()[0]
+    finally:
+        s.close()
+
+def inet_checksum(data: bytes) -> int:
+    if len(data) % 2:
+        data += b"\0"
+    total = sum(struct.unpack("!%dH" % (len(data) // 2), data))
+    while total >> 16:
+        total = (total & 0xFFFF) + (total >> 16)
+    return ~total & 0xFFFF
+
+class SynScanner:
+    """Stateless SYN scan.
+
+    A sender thread walks (port, host) pairs and fires crafted SYNs from a raw socket; a receiver
+    thread reads every inbound TCP segment and keeps those whose ack-1 equals the cookie we put in
+    the SYN's sequence number (keyed hash of target ip/port and our source port). No per-probe state
+    is kept, so the send loop never waits on replies. The kernel answers stray SYN-ACKs with RST on
+    its own, which is what tears the half-open connections down. Hosts are pulled from the stream
+    `window` at a time and retired one linger period after their last SYN went out. With adaptive
+    timeouts the linger is the batch's slowest RTT timeout, and unanswered SYNs get one resend.
+    Cookies only depend on (ip, port), so a reply is credited to every live host with that address
+    (one IP scanned under several names). Every SYN takes a token from the host's own bucket
+    (host_rate), then from the global one, and feeds the AdaptiveRate controller. There is no per-host in-flight count to cap, so
+    --host-concurrency does not apply here.
+    """
+
+    def __init__(self, hosts: Iterable[Tuple[str, str]], ports: List[int], linger: float = 1.0,
+                 bucket: Optional["TokenBucket"] = None, window: int = DEFAULT_MAX_HOSTS,
+                 checkpoint: Optional["Checkpoint"] = None, rtt_for=None, host_rate: float = 0.0,
+                 controller: Optional["AdaptiveRate"] = None):
+        self.source = iter(hosts)
+        self.ports = ports
+        self.linger = linger
+        self.bucket = bucket
+        self.host_rate = host_rate
+        self.controller = controller
+        self.window = max(1, window)
+        self.checkpoint = checkpoint
+        self.rtt_for = rtt_for
+        # wall-clock seconds adaptive lingers saved against a fixed one
+        self.saved = 0.0
+        self.secret = os.urandom(16)
+        # above the default ephemeral range, so replies never hit a real local socket
+        self.sport = random.randint(61000, 65000)
+        self.lock = threading.Lock()
+        self.by_ip: Dict[bytes, List["HostState"]] = {}
+        self.seen: Dict["HostState", set] = {}
+        self.opened: Dict["HostState", set] = {}
+        self.clock: Dict["HostState", Dict[int, float]] = {}
+        self._stop = threading.Event()
+
+    def cookie(self, ip_raw: bytes, port: int) -> int:
+        digest = hashlib.blake2b(ip_raw + struct.pack("!HH", port, self.sport), key=self.secret, digest_size=4).digest()
+        return struct.unpack("!I", digest)[0]
+
+    def _segment(self, src_raw: bytes, dst_raw: bytes, port: int) -> bytes:
+        seq = self.cookie(dst_raw, port)
+        # 24-byte header: data offset 6 to carry an MSS option, SYN flag, window 1024
+        hdr = struct.pack("!HHIIBBHHH", self.sport, port, seq, 0, 6 << 4, 0x02, 1024, 0, 0) + b"\x02\x04\x05\xb4"
+        pseudo = src_raw + dst_raw + struct.pack("!BBH", 0, socket.IPPROTO_TCP, len(hdr))
+        csum = inet_checksum(pseudo + hdr)
+        return hdr[:16] + struct.pack("!H", csum) + hdr[18:]
+
+    def _next_batch(self) -> List["HostState"]:
+        batch = []
+        for item in self.source:
+            if item is None:
+                if batch:
+                    break
+                time.sleep(SOURCE_POLL)
+                continue
+            label, ip = item
+            if ":" in ip:
+                print(Fore.YELLOW + f"[!] SYN engine is IPv4 only; skipping {ip}")
+                continue
+            ports = self.checkpoint.pending_ports(ip, self.ports) if self.checkpoint else self.ports
+            if not ports:
+                continue
+            host = HostState(label, ip, ports, self.rtt_for(ip) if self.rtt_for else None)
+            if self.host_rate > 0:
+                host.bucket = TokenBucket(self.host_rate)
+            batch.append(host)
+            if len(batch) >= self.window:
+                break
+        return batch
+
+    def _fire(self, tx: socket.socket, host: "HostState", dst_raw: bytes, src_raw: bytes, port: int):
+        # port-major order interleaves the batch, so waiting on one host's bucket paces every host alike
+        if host.bucket:
+            host.bucket.acquire()
+        if self.bucket:
+            self.bucket.acquire()
+        if self.controller:
+            self.controller.observe()
+        try:
+            tx.sendto(self._segment(src_raw, dst_raw, port), (host.ip, 0))
+            bump("probes")
+        except OSError as e:
+            if e.errno in (errno.ENOBUFS, errno.EAGAIN):
+                time.sleep(0.001)
+            bump("error")
+
+    def _resend(self, tx: socket.socket, plan: list, sent: Dict[int, float]) -> Dict["HostState", int]:
+        # one retransmission of every unanswered SYN, for hosts whose linger was cut short by RTT
+        answered = {}
+        for host, dst_raw, src_raw, _ in plan:
+            with self.lock:
+                seen = set(self.seen.get(host, ()))
+            answered[host] = len(seen)
+            missing = [p for p in host.ports if p not in seen]
+            with host.rtt.lock:
+                host.rtt.stats["retries"] += len(missing)
+            for port in missing:
+                sent[port] = time.monotonic()
+                self._fire(tx, host, dst_raw, src_raw, port)
+        return answered
+
+    def _retire(self, retiring: deque, tx: socket.socket, emit, force: bool = False):
+        while retiring and (force or retiring[0][0] <= time.monotonic()):
+            deadline, plan, linger, waited, first = retiring.popleft()
+            if force:
+                time.sleep(max(0.0, deadline - time.monotonic()))
+            waited += linger
+            if first is None and linger < self.linger:
+                second = min(self.linger, 2 * linger)
+                first = self._resend(tx, plan, self.clock.get(plan[0][0], {}))
+                retiring.append((time.monotonic() + second, plan, second, waited, first))
+                continue
+            self.saved += max(0.0, self.linger - waited)
+            for host, raw, _, _ in plan:
+                with self.lock:
+                    hosts = self.by_ip.get(raw, [])
+                    if host in hosts:
+                        hosts.remove(host)
+                    if not hosts:
+                        self.by_ip.pop(raw, None)
+                    self.clock.pop(host, None)
+                    answered = len(self.seen.pop(host, ()))
+                    opened = self.opened.pop(host, set())
+                missing = max(0, len(host.ports) - answered)
+                bump("timeout", missing)
+                if host.rtt:
+                    host.rtt.charge(linger, len(host.ports))
+                    host.rtt.expired(waited, missing)
+                    if first:
+                        with host.rtt.lock:
+                            host.rtt.stats["late"] += answered - first.get(host, answered)
+                if self.checkpoint:
+                    for port in host.ports:
+                        if port not in opened:
+                            self.checkpoint.done(host.ip, port)
+                emit(("host_done", host, None))
+
+    def _send(self, tx: socket.socket, emit):
+        retiring = deque()
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                break
+            plan = []
+            # when each port's SYNs went out for this batch; replies are timed against it
+            sent: Dict[int, float] = {}
+            for host in batch:
+                raw = socket.inet_aton(host.ip)
+                with self.lock:
+                    self.by_ip.setdefault(raw, []).append(host)
+                    self.seen[host] = set()
+                    self.opened[host] = set()
+                    self.clock[host] = sent
+                emit(("start", host, None))
+                # resumed hosts may skip finished chunks
+                wanted = None if host.ports is self.ports else set(host.ports)
+                plan.append((host, raw, socket.inet_aton(source_ip_for(host.ip)), wanted))
+            # port-major order spreads each host's probes across the whole pass
+            for port in self.ports:
+                sent[port] = time.monotonic()
+                for host, dst_raw, src_raw, wanted in plan:
+                    if wanted is not None and port not in wanted:
+                        continue
+                    self._fire(tx, host, dst_raw, src_raw, port)
+                self._retire(retiring, tx, emit)
+            # with adaptive timeouts the batch lingers for its slowest host's timeout, not --timeout
+            linger = max(host.rtt.peek() for host in batch) if batch[0].rtt else self.linger
+            retiring.append((time.monotonic() + linger, plan, linger, 0.0, None))
+        # stragglers: every host gets one linger period after its last SYN
+        self._retire(retiring, tx, emit, force=True)
+
+    def _receive(self, rx: socket.socket, emit):
+        rx.settimeout(0.1)
+        while not self._stop.is_set():
+            try:
+                pkt = rx.recv(65535)
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            ihl = (pkt[0] & 0x0F) * 4
+            if len(pkt) < ihl + 20:
+                continue
+            src_raw = pkt[12:16]
+            sport, dport, _, ack = struct.unpack("!HHII", pkt[ihl:ihl + 12])
+            flags = pkt[ihl + 13]
+            if dport != self.sport or not (flags & 0x04 or flags & 0x12 == 0x12):
+                continue
+            if (ack - 1) & 0xFFFFFFFF != self.cookie(src_raw, sport):
+                continue
+            credited = []
+            with self.lock:
+                for host in self.by_ip.get(src_raw, ()):
+                    seen = self.seen[host]
+                    if sport in seen:
+                        continue
+                    seen.add(sport)
+                    if flags & 0x12 == 0x12:
+                        self.opened[host].add(sport)
+                    credited.append((host, self.clock[host].get(sport)))
+            for host, sent in credited:
+                if host.rtt and sent:
+                    host.rtt.sample(time.monotonic() - sent)
+                if PROFILE and sent:
+                    PROFILE.since("probe.syn", sent)
+                if flags & 0x12 == 0x12:
+                    emit(("open", host, {"ip": host.ip, "port": sport, "proto": "tcp-syn", "banner": "",
+                                         "status": "open"}))
+                else:
+                    bump("refused")
+
+    def run(self, emit):
+        tx = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_TCP)
+        rx = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_TCP)
+        try:
+            rx.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 8 << 20)
+        except OSError:
+            pass
+        receiver = threading.Thread(target=self._receive, args=(rx, emit), daemon=True)
+        receiver.start()
+        try:
+            self._send(tx, emit)
+        finally:
+            self._stop.set()
+            receiver.join()
+            tx.close()
+            rx.close()
+
+# ---------- UDP engine ----------
+# probe payloads that make common UDP services answer; anything else gets a single zero byte
+UDP_PAYLOADS: Dict[int, Tuple[str, bytes]] = {
+    # root NS query
+    53: ("DNS", bytes.fromhex("123401000001000000000000" "00" "0002" "0001")),
+    # ONC RPC NULL call to portmapper v2
+    111: ("RPC", struct.pack("!10I", 0x48534341, 0, 2, 100000, 2, 0, 0, 0, 0, 0)),
+    # NTPv4 client request
+    123: ("NTP", b"\xe3" + b"\x00" * 47),
+    # NetBIOS node status request for "*"
+    137: ("NetBIOS", bytes.fromhex("80f00000000100000000000020") + b"CK" + b"A" * 30 + bytes.fromhex("0000210001")),
+    # SNMPv1 get sysDescr.0, community "public"
+    161: ("SNMP", bytes.fromhex("302602010004067075626c6963a019020101020100020100300e300c06082b060102010101000500")),
+    # RIPv2 whole-table request
+    520: ("RIP", struct.pack("!BBHHHIIII", 1, 2, 0, 0, 0, 0, 0, 0, 16)),
+    # RMCP/ASF presence ping (IPMI)
+    623: ("IPMI", bytes.fromhex("0600ff06000011be80000000")),
+    # SQL Server browser enumeration
+    1434: ("MSSQL", b"\x02"),
+    1900: ("SSDP", b"M-SEARCH * HTTP/1.1\r\nHOST: 239.255.255.250:1900\r\nMAN: \"ssdp:discover\"\r\nMX: 1\r\nST: ssdp:all\r\n\r\n"),
+    # STUN binding request
+    3478: ("STUN", bytes.fromhex("000100002112a442") + b"HexaScanSTUN"),
+    # mDNS PTR query for _services._dns-sd._udp.local
+    5353: ("mDNS", bytes.fromhex("000000000001000000000000") + b"\x09_services\x07_dns-sd\x04_udp\x05local\x00" + bytes.fromhex("000c0001")),
+    # CoAP GET /.well-known/core
+    5683: ("CoAP", bytes.fromhex("400101ce") + b"\xbb.well-known\x04core"),
+    # memcached "version" with the UDP frame header
+    11211: ("memcached", bytes.fromhex("0001000000010000") + b"version\r\n"),
+}
+UDP_DEFAULT_PAYLOAD = b"\x00"
+UDP_RETRIES = 2
+UDP_SOCKETS = 4
+# linux: ICMP errors for datagrams we sent, with the original destination, via MSG_ERRQUEUE
+IP_RECVERR = getattr(socket, "IP_RECVERR", 11)
+IPV6_RECVERR = getattr(socket, "IPV6_RECVERR", 25)
+MSG_ERRQUEUE = getattr(socket, "MSG_ERRQUEUE", 0x2000)
+
+def udp_payload(port: int) -> bytes:
+    entry = UDP_PAYLOADS.get(port)
+    return entry[1] if entry else UDP_DEFAULT_PAYLOAD
+
+def udp_banner(port: int, data: bytes) -> str:
+    name = UDP_PAYLOADS[port][0] if port in UDP_PAYLOADS else "UDP"
+    text = data.decode(errors="ignore").strip()
+    line = text.splitlines()[0] if text else ""
+    # text protocols (SSDP, memcached, ...) get their first line; binary ones just a size
+    if line and sum(c.isprintable() for c in line) >= 0.9 * len(line):
+        return f"{name}: {line[:120]}"
+    return f"{name} response ({len(data)} bytes)"
+
+class UdpProbe:
+    __slots__ = ("host", "port", "attempt", "sent_at", "deadline", "waited")
+
+    def __init__(self, host: "HostState", port: int):
+        self.host = host
+        self.port = port
+        self.attempt = 0
+        self.sent_at = 0.0
+        self.deadline = 0.0
+        self.waited = 0.0
+
+def udp_engine(sched: "Scheduler", timeout: float, concurrency: int, retries: int, emit):
+    """Send UDP probes from a few shared non-blocking sockets and match replies by source address.
+
+    In-flight probes are grouped by destination (ip, port), since one address may be scanned under
+    several names: a datagram from that address means open for every probe in the group, and an ICMP
+    port unreachable read from the socket's error queue (IP_RECVERR, where the platform has it) means
+    closed. Silence is retried up to `retries` times, each wait twice
+    the last (capped at `timeout`), starting from the host's RTT timeout when it has one.
+    """
+    sel = selectors.DefaultSelector()
+    socks: Dict[int, List[socket.socket]] = {}
+    pending: Dict[Tuple[str, int], List[UdpProbe]] = {}
+    deadlines: List[Tuple[float, int, UdpProbe]] = []
+    seq = inflight = 0
+
+    def sock_for(ip: str, port: int) -> socket.socket:
+        family = socket.AF_INET6 if ":" in ip else socket.AF_INET
+        pool = socks.get(family)
+        if pool is None:
+            pool = socks[family] = []
+            for _ in range(UDP_SOCKETS):
+                s = socket.socket(family, socket.SOCK_DGRAM)
+                s.setblocking(False)
+                try:
+                    s.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 << 20)
+                    if family == socket.AF_INET:
+                        s.setsockopt(socket.IPPROTO_IP, IP_RECVERR, 1)
+                    else:
+                        s.setsockopt(socket.IPPROTO_IPV6, IPV6_RECVERR, 1)
+                except OSError:
+                    pass
+                sel.register(s, selectors.EVENT_READ)
+                pool.append(s)
+        return pool[hash((ip, port)) % len(pool)]
+
+    def send(probe: UdpProbe):
+        nonlocal seq
+        host = probe.host
+        if probe.attempt == 0:
+            base = host.rtt.take() if host.rtt else timeout
+        else:
+            base = host.rtt.peek() if host.rtt else timeout
+        wait = min(timeout, base * (2 ** probe.attempt)) if probe.attempt else base
+        s = sock_for(host.ip, probe.port)
+        for _ in range(2):
+            try:
+                s.sendto(udp_payload(probe.port), (host.ip, probe.port))
+                break
+            except (BlockingIOError, InterruptedError):
+                # send buffer full: count it as sent and let the retry path cover it
+                break
+            except OSError as e:
+                # a pending ICMP error can surface on the next send; collect it and try again
+                read_errors(s)
+                if probe not in pending.get((host.ip, probe.port), ()):
+                    return
+                if e.errno not in (errno.ECONNREFUSED, errno.EHOSTUNREACH, errno.ENETUNREACH):
+                    bump("error")
+                    finish(probe, None)
+                    return
+        probe.sent_at = time.monotonic()
+        probe.deadline = probe.sent_at + wait
+        probe.waited += wait
+        seq += 1
+        heapq.heappush(deadlines, (probe.deadline, seq, probe))
+
+    def finish(probe: UdpProbe, res: Optional[Dict]):
+        nonlocal inflight
+        key = (probe.host.ip, probe.port)
+        group = pending.get(key, [])
+        if probe not in group:
+            return
+        group.remove(probe)
+        if not group:
+            del pending[key]
+        inflight -= 1
+        if res:
+            emit(("open", probe.host, res))
+        sched.job_done(probe.host, probe.port, bool(res))
+
+    def answered(probe: UdpProbe):
+        if PROFILE:
+            PROFILE.since("probe.udp", probe.sent_at)
+        rtt = probe.host.rtt
+        if rtt:
+            if probe.attempt == 0:
+                rtt.sample(time.monotonic() - probe.sent_at)
+            else:
+                # Karn: a reply to a retransmission says nothing about which send it answers
+                rtt.late()
+
+    def read_replies(s: socket.socket):
+        while True:
+            try:
+                data, addr = s.recvfrom(65535)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                # an ICMP error was flagged on the socket; the details are in the error queue
+                read_errors(s)
+                continue
+            for probe in list(pending.get(addr[:2], ())):
+                answered(probe)
+                bump("open_udp")
+                finish(probe, {"ip": probe.host.ip, "port": probe.port, "proto": "udp",
+                               "banner": udp_banner(probe.port, data), "status": "open"})
+
+    def read_errors(s: socket.socket):
+        while True:
+            try:
+                _, anc, _, addr = s.recvmsg(1, 1024, socket.MSG_DONTWAIT | MSG_ERRQUEUE)
+            except OSError:
+                return
+            group = list(pending.get(addr[:2], ())) if addr else []
+            if not group:
+                continue
+            for level, kind, data in anc:
+                if kind not in (IP_RECVERR, IPV6_RECVERR) or len(data) < 8:
+                    continue
+                _, origin, icmp_type, icmp_code = struct.unpack_from("=IBBB", data)
+                if origin not in (2, 3):
+                    # SO_EE_ORIGIN_LOCAL and friends: not an answer from the target
+                    continue
+                # host/net unreachable or administratively prohibited: filtered, no point retrying
+                verdict = "refused" if (origin, icmp_type, icmp_code) in ((2, 3, 3), (3, 1, 4)) else "filtered"
+                for probe in group:
+                    answered(probe)
+                    bump(verdict)
+                    finish(probe, None)
+                break
+
+    try:
+        while True:
+            now = time.monotonic()
+            wait = None
+            while inflight < concurrency:
+                job, wait = sched.poll()
+                if job is None:
+                    break
+                probe = UdpProbe(*job)
+                pending.setdefault((probe.host.ip, probe.port), []).append(probe)
+                inflight += 1
+                send(probe)
+            if sched.drained and not pending:
+                break
+            # expired probes: retry with backoff, or give up
+            while deadlines and deadlines[0][0] <= now:
+                deadline, _, probe = heapq.heappop(deadlines)
+                if probe.deadline != deadline or probe not in pending.get((probe.host.ip, probe.port), ()):
+                    continue
+                if probe.attempt < retries:
+                    if sched.bucket:
+                        hold = sched.bucket.try_take(now)
+                        if hold:
+                            seq += 1
+                            heapq.heappush(deadlines, (now + hold, seq, probe))
+                            probe.deadline = now + hold
+                            continue
+                    probe.attempt += 1
+                    bump("retries")
+                    if probe.host.rtt:
+                        with probe.host.rtt.lock:
+                            probe.host.rtt.stats["retries"] += 1
+                    send(probe)
+                else:
+                    if probe.host.rtt:
+                        probe.host.rtt.expired(probe.waited)
+                    bump("timeout")
+                    finish(probe, None)
+            block = deadlines[0][0] - now if deadlines else SOURCE_POLL
+            if wait is not None:
+                block = min(block, wait)
+            elif inflight < concurrency and not sched.drained:
+                block = min(block, SOURCE_POLL)
+            for key, _ in sel.select(max(0.0, block)):
+                read_replies(key.fileobj)
+                read_errors(key.fileobj)
+    finally:
+        for pool in socks.values():
+            for s in pool:
+                s.close()
+        sel.close()
+
+# ---------- async engine ----------
+def raise_nofile_limit(want: int) -> int:
+    # every in-flight connect holds a descriptor; lift the soft limit as far as the hard one allows
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft != resource.RLIM_INFINITY and soft < want:
+            new_soft = want if hard == resource.RLIM_INFINITY else min(want, hard)
+            resource.setrlimit(resource.RLIMIT_NOFILE, (new_soft, hard))
+            return new_soft
+        return soft
+    except Exception:
+        return want
+
+async def async_grab_banner(loop, sock: socket.socket, ip: str, port: int, timeout: float) -> str:
+    # same logic as read_banner, awaiting on the non-blocking probe socket
+    try:
+        data = await asyncio.wait_for(loop.sock_recv(sock, 4096), timeout)
+        if data:
+            return data.decode(errors="ignore").strip()
+    except Exception:
+        pass
+    try:
+        if port in HTTP_PORTS:
+            await loop.sock_sendall(sock, b"HEAD / HTTP/1.0\r\nHost: %b\r\n\r\n" % ip.encode())
+            resp = await asyncio.wait_for(loop.sock_recv(sock, 4096), timeout)
+            if resp:
+                return resp.decode(errors="ignore").splitlines()[0]
+    except Exception:
+        pass
+    return ""
+
+async def async_tcp_connect_scan(loop, ip: str, port: int, timeout: float = 1.0,
+                                 banner_timeout: Optional[float] = None,
+                                 rtt: Optional[RttEstimator] = None) -> Optional[Dict]:
+    sock = None
+    started = time.monotonic() if PROFILE else 0.0
+    try:
+        family = socket.AF_INET6 if ":" in ip else socket.AF_INET
+        waited = 0.0
+        for attempt, wait in enumerate(rtt.waits() if rtt else (timeout,)):
+            if sock:
+                sock.close()
+            sock = socket.socket(family, socket.SOCK_STREAM)
+            sock.setblocking(False)
+            t0 = time.monotonic()
+            try:
+                await asyncio.wait_for(loop.sock_connect(sock, (ip, port)), wait)
+                break
+            except ConnectionRefusedError:
+                if rtt:
+                    rtt.sample(time.monotonic() - t0)
+                    if attempt:
+                        rtt.late()
+                if PROFILE:
+                    PROFILE.since("probe.tcp", started)
+                bump("refused")
+                return None
+            except asyncio.TimeoutError:
+                waited += wait
+            except OSError as e:
+                count_failure(e.errno or 0)
+                return None
+        else:
+            if rtt:
+                rtt.expired(waited)
+            if PROFILE:
+                PROFILE.since("probe.tcp", started)
+            bump("timeout")
+            return None
+        if PROFILE:
+            PROFILE.since("probe.tcp", started)
+        if rtt:
+            rtt.sample(time.monotonic() - t0)
+            if attempt:
+                rtt.late()
+        bump("handshakes")
+        bump("open_tcp")
+        if banner_timeout is None:
+            banner_timeout = rtt.banner_timeout() if rtt else timeout
+        t1 = time.monotonic() if PROFILE else 0.0
+        banner = await async_grab_banner(loop, sock, ip, port, banner_timeout)
+        if PROFILE:
+            PROFILE.since("banner", t1)
+        return {"ip": ip, "port": port, "proto": "tcp", "banner": banner or "", "status": "open"}
+    except Exception:
+        return None
+    finally:
+        if sock:
+            try:
+                sock.close()
+            except:
+                pass
+
+async def async_engine(sched: "Scheduler", timeout: float, banner_timeout: Optional[float], concurrency: int, emit):
+    loop = asyncio.get_running_loop()
+    sem = asyncio.Semaphore(concurrency)
+    wake = asyncio.Event()
+    pending = set()
+
+    async def probe(host: "HostState", p: int):
+        res = None
+        try:
+            res = await async_tcp_connect_scan(loop, host.ip, p, timeout, banner_timeout, host.rtt)
+            if res:
+                emit(("open", host, res))
+        finally:
+            sem.release()
+            sched.job_done(host, p, bool(res))
+            wake.set()
+
+    while True:
+        # the semaphore bounds live tasks, so a full sweep never holds 65k coroutines at once
+        await sem.acquire()
+        job, wait = sched.poll()
+        if job is None:
+            sem.release()
+            if sched.drained:
+                break
+            wake.clear()
+            try:
+                await asyncio.wait_for(wake.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        task = loop.create_task(probe(*job))
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+    if pending:
+        await asyncio.gather(*pending)
+
+# ---------- host discovery ----------
+class Discovery:
+    """Liveness pre-pass run over batches of hosts before the port scan.
+
+    A host is up if any DISCOVERY_PORTS connect succeeds or is refused (an RST still proves a live
+    stack), or, with scapy and raw sockets, if it answers an ICMP echo. The ICMP sweep for a batch
+    runs alongside the TCP pings, and each host's TCP pings stop at the first answer. With a bucket
+    (--rate), every ping takes a token from the same budget as the port scan.
+    """
+
+    def __init__(self, ports: List[int], timeout: float, batch: int = DEFAULT_MAX_HOSTS,
+                 concurrency: int = DEFAULT_CONCURRENCY, icmp: bool = True, record_rtt: bool = False,
+                 bucket: Optional["TokenBucket"] = None):
+        self.ports = ports
+        self.bucket = bucket
+        self.timeout = timeout
+        self.batch = max(1, batch)
+        self.concurrency = concurrency
+        self.icmp = icmp and SCAPY and raw_syn_available()
+        self.stats = Counter()
+        # ip -> fastest ping answer, handed to the port scan as an RTT seed (popped by the consumer)
+        self.rtts: Optional[Dict[str, float]] = {} if record_rtt else None
+
+    def _seed(self, ip: str, rtt: float):
+        if self.rtts is not None:
+            self.rtts[ip] = min(rtt, self.rtts.get(ip, rtt))
+
+    async def _tcp_ping(self, loop, sem: asyncio.Semaphore, ip: str) -> bool:
+        async def knock(port: int) -> bool:
+            async with sem:
+                if self.bucket:
+                    await self.bucket.acquire_async()
+                sock = socket.socket(socket.AF_INET6 if ":" in ip else socket.AF_INET, socket.SOCK_STREAM)
+                sock.setblocking(False)
+                t0 = time.monotonic()
+                try:
+                    self.stats["probes"] += 1
+                    await asyncio.wait_for(loop.sock_connect(sock, (ip, port)), self.timeout)
+                    self._seed(ip, time.monotonic() - t0)
+                    return True
+                except ConnectionRefusedError:
+                    self._seed(ip, time.monotonic() - t0)
+                    return True
+                except Exception:
+                    return False
+                finally:
+                    sock.close()
+                    if PROFILE:
+                        PROFILE.since("probe.ping", t0)
+
+        tasks = [loop.create_task(knock(p)) for p in self.ports]
+        try:
+            for fut in asyncio.as_completed(tasks):
+                if await fut:
+                    return True
+            return False
+        finally:
+            for t in tasks:
+                t.cancel()
+
+    def _icmp_sweep(self, ips: List[str]) -> set:
+        ips = [ip for ip in ips if ":" not in ip]
+        if not ips:
+            return set()
+        bucket = self.bucket
+
+        class Paced:
+            # sr()'s send thread pulls echoes one at a time, so the shared bucket is their only pacing.
+            # Re-iterable, as sr() first peeks at one packet to pick the route (that costs one token)
+            def __iter__(self):
+                for ip in ips:
+                    bucket.acquire()
+                    yield IP(dst=ip)/ICMP()
+
+        try:
+            scapy_conf.verb = 0
+            answered, _ = sr(Paced() if bucket else IP(dst=ips)/ICMP(), timeout=self.timeout, verbose=0)
+            return {reply[IP].src for _, reply in answered}
+        except Exception:
+            return set()
+
+    def _sweep(self, loop, batch: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        started = time.monotonic() if PROFILE else 0.0
+        pinger = None
+        if self.icmp:
+            pinger = ThreadPoolExecutor(max_workers=1)
+            icmp_fut = pinger.submit(self._icmp_sweep, [ip for _, ip in batch])
+
+        async def tcp_all():
+            sem = asyncio.Semaphore(self.concurrency)
+            return await asyncio.gather(*(self._tcp_ping(loop, sem, ip) for _, ip in batch))
+
+        up = loop.run_until_complete(tcp_all())
+        icmp_up = set()
+        if pinger:
+            icmp_up = icmp_fut.result()
+            pinger.shutdown()
+            self.stats["probes"] += sum(1 for _, ip in batch if ":" not in ip)
+        alive = [pair for pair, tcp in zip(batch, up) if tcp or pair[1] in icmp_up]
+        if PROFILE:
+            PROFILE.since("discovery", started)
+        self.stats["up"] += len(alive)
+        self.stats["down"] += len(batch) - len(alive)
+        return alive
+
+    def stream(self, hosts: Iterable[Optional[Tuple[str, str]]]) -> Iterator[Optional[Tuple[str, str]]]:
+        # same contract as resolve_stream: None means "nothing ready yet"
+        out = queue.Queue(maxsize=4096)
+        done = object()
+
+        def run():
+            loop = asyncio.new_event_loop()
+            batch = []
+            try:
+                for item in hosts:
+                    if item is not None:
+                        batch.append(item)
+                    if len(batch) >= self.batch or (item is None and batch):
+                        for pair in self._sweep(loop, batch):
+                            out.put(pair)
+                        batch = []
+                    elif item is None:
+                        time.sleep(SOURCE_POLL)
+                if batch:
+                    for pair in self._sweep(loop, batch):
+                        out.put(pair)
+            finally:
+                loop.close()
+                out.put(done)
+
+        threading.Thread(target=run, daemon=True).start()
+        while True:
+            try:
+                item = out.get_nowait()
+            except queue.Empty:
+                yield None
+                continue
+            if item is done:
+                return
+            yield item
+
+    def summary(self, ports_per_host: int) -> str:
+        saved = self.stats["down"] * ports_per_host - self.stats["probes"]
+        return (f"Discovery: {self.stats['up']}/{self.stats['up'] + self.stats['down']} hosts up, "
+                f"{self.stats['probes']} discovery probes, {max(0, saved)} port probes saved")
+
+# ---------- rate control ----------
+class TokenBucket:
+    """Thread-safe token bucket: refills at `rate` tokens/sec and banks up to `burst` tokens."""
+
+    def __init__(self, rate: float, burst: float = 0.0):
+        self.rate = rate
+        self.burst = burst if burst and burst > 0 else max(1.0, rate / 10.0)
+        self.tokens = self.burst
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now: float):
+        if now > self.last:
+            self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+
+    def try_take(self, now: Optional[float] = None) -> float:
+        # takes a token and returns 0, or returns how long to wait before one is available
+        with self.lock:
+            now = time.monotonic() if now is None else now
+            self._refill(now)
+            if self.tokens >= 1.0:
+                self.tokens -= 1.0
+                return 0.0
+            return (1.0 - self.tokens) / self.rate
+
+    def wait_time(self, now: float) -> float:
+        with self.lock:
+            self._refill(now)
+            return 0.0 if self.tokens >= 1.0 else (1.0 - self.tokens) / self.rate
+
+    def acquire(self):
+        while True:
+            wait = self.try_take()
+            if not wait:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        while True:
+            wait = self.try_take()
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+    def set_rate(self, rate: float):
+        with self.lock:
+            self._refill(time.monotonic())
+            self.rate = rate
+
+def process_context():
+    return multiprocessing.get_context("fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn")
+
+class SharedTokenBucket(TokenBucket):
+    """TokenBucket whose rate/tokens/last live in shared memory, so scan processes share one budget."""
+
+    def __init__(self, rate: float, burst: float = 0.0, ctx=None):
+        ctx = ctx or multiprocessing.get_context()
+        self._state = ctx.Array("d", 3, lock=False)
+        super().__init__(rate, burst)
+        self.lock = ctx.Lock()
+
+    def _slot(i):
+        return property(lambda self: self._state[i], lambda self, v: self._state.__setitem__(i, v))
+
+    rate, tokens, last = _slot(0), _slot(1), _slot(2)
+    del _slot
+
+class AdaptiveRate:
+    """AIMD controller on top of a TokenBucket.
+
+    Every `window` seconds it compares the share of probes that timed out, and the share that were
+    refused, against smoothed baselines. A spike in either (upstream dropping or rate-limiting us)
+    halves the rate; a calm window grows it back toward the configured ceiling. Steadily filtered or
+    closed hosts raise the baseline rather than triggering endless back-off. source returns the
+    running (probes, timeouts, refusals) totals; by default this process's STATS.
+    """
+
+    def __init__(self, bucket: TokenBucket, window: float = 1.0, floor_ratio: float = 0.05, source=None):
+        self.bucket = bucket
+        self.source = source or (lambda: (STATS["probes"], STATS["timeout"], STATS["refused"]))
+        self.ceiling = bucket.rate
+        self.floor = max(1.0, bucket.rate * floor_ratio)
+        self.window = window
+        self.lock = threading.Lock()
+        self.last_at = time.monotonic()
+        self.last = (0, 0, 0)
+        self.baseline: Optional[List[float]] = None
+        self.backoffs = 0
+
+    def observe(self):
+        now = time.monotonic()
+        if now - self.last_at < self.window or not self.lock.acquire(blocking=False):
+            return
+        try:
+            snap = tuple(self.source())
+            probes = snap[0] - self.last[0]
+            if probes < 20:
+                return
+            ratios = [(snap[1] - self.last[1]) / probes, (snap[2] - self.last[2]) / probes]
+            self.last, self.last_at = snap, now
+            if self.baseline is None:
+                self.baseline = ratios
+                return
+            if any(r > b * 1.5 + 0.05 for r, b in zip(ratios, self.baseline)):
+                self.bucket.set_rate(max(self.floor, self.bucket.rate * 0.5))
+                self.backoffs += 1
             else:
+                self.bucket.set_rate(min(self.ceiling, self.bucket.rate + self.ceiling * 0.05))
+            self.baseline = [0.8 * b + 0.2 * r for r, b in zip(ratios, self.baseline)]
+        finally:
+            self.lock.release()
+
+# ---------- scheduler ----------
+class HostState:
+    __slots__ = ("label", "ip", "ports", "next_idx", "inflight", "bucket", "rtt", "results", "os_guess",
+                 "probing_done", "enriching")
+
+    def __init__(self, label: str, ip: str, ports: List[int], rtt: Optional[RttEstimator] = None):
+        self.label = label
+        self.ip = ip
+        self.ports = ports
+        self.next_idx = 0
+        self.inflight = 0
+        self.bucket: Optional[TokenBucket] = None
+        # None: every probe waits the fixed --timeout
+        self.rtt = rtt
+        self.results: List[Dict] = []
+        self.os_guess = ""
+        # set once every probe has returned; enriching counts open ports still in the plugin pipeline
+        self.probing_done = False
+        self.enriching = 0
+
+    @property
+    def exhausted(self) -> bool:
+        return self.next_idx >= len(self.ports)
+
+class Scheduler:
+    """Hands out (host, port) jobs round-robin across all targets.
+
+    global_cap is the engine's concurrency (thread workers or async connects). host_concurrency caps
+    in-flight probes per host; 0 means a fair share of global_cap among hosts that still have ports,
+    so a filtered host can never soak up every slot. host_rate caps probes/sec per host and `bucket`
+    is the global budget shared by every host; a token is only spent when a probe is handed out,
+    i.e. right before it runs. `hosts` may be a lazy stream: at most max_hosts of them are pulled
+    into the active window at a time.
+    """
+
+    def __init__(self, hosts: Iterable[Tuple[str, str]], ports: List[int], global_cap: int,
+                 host_concurrency: int = 0, host_rate: float = 0.0, bucket: Optional[TokenBucket] = None,
+                 on_event=None, adaptive: Optional[AdaptiveRate] = None, max_hosts: int = DEFAULT_MAX_HOSTS,
+                 checkpoint: Optional["Checkpoint"] = None, rtt_for=None):
+        self.global_cap = max(1, global_cap)
+        self.host_concurrency = host_concurrency
+        self.host_rate = host_rate if host_rate and host_rate > 0 else 0.0
+        self.bucket = bucket
+        self.adaptive = adaptive
+        self.checkpoint = checkpoint
+        # rtt_for(ip) -> RttEstimator for adaptive per-host timeouts
+        self.rtt_for = rtt_for
+        self.on_event = on_event
+        self.cond = threading.Condition()
+        self.ports = ports
+        self.source = iter(hosts) if ports else iter(())
+        self.source_done = False
+        self.source_pending = False
+        self.max_hosts = max(1, max_hosts)
+        self.active = deque()
+        self.live = 0
+
+    @property
+    def drained(self) -> bool:
+        # nothing left to hand out; in-flight probes may still be finishing
+        return self.source_done and not self.active
+
+    @property
+    def finished(self) -> bool:
+        return self.drained and self.live == 0
+
+    def _refill(self):
+        while not self.source_done and len(self.active) < self.max_hosts:
+            try:
+                item = next(self.source)
+            except StopIteration:
+                self.source_done = True
+                return
+            # None: the stream has nothing ready yet (e.g. DNS lookups still in flight)
+            self.source_pending = item is None
+            if item is None:
+                return
+            label, ip = item
+            ports = self.checkpoint.pending_ports(ip, self.ports) if self.checkpoint else self.ports
+            if not ports:
+                continue
+            host = HostState(label, ip, ports, self.rtt_for(ip) if self.rtt_for else None)
+            if self.host_rate:
+                host.bucket = TokenBucket(self.host_rate)
+            self.active.append(host)
+            self.live += 1
+
+    def _emit(self, kind: str, host: HostState):
+        if self.on_event:
+            self.on_event((kind, host, None))
+
+    def _pick(self, now: float) -> Tuple[Optional[Tuple[HostState, int]], Optional[float]]:
+        self._refill()
+        if not self.active:
+            return None, SOURCE_POLL if self.source_pending else None
+        if self.bucket:
+            wait = self.bucket.wait_time(now)
+            if wait:
+                return None, wait
+        cap = self.host_concurrency or max(1, -(-self.global_cap // len(self.active)))
+        wait = None
+        for _ in range(len(self.active)):
+            host = self.active[0]
+            self.active.rotate(-1)
+            if host.inflight >= cap:
                 continue
-            futures[fut] = p
-            if rate and rate > 0:
-                time.sleep(1.0 / rate)
-        for fut in as_completed(futures):
+            if host.bucket:
+                host_wait = host.bucket.try_take(now)
+                if host_wait:
+                    wait = host_wait if wait is None else min(wait, host_wait)
+                    continue
+            if self.bucket:
+                self.bucket.try_take(now)
+            port = host.ports[host.next_idx]
+            host.next_idx += 1
+            host.inflight += 1
+            if host.next_idx == 1:
+                self._emit("start", host)
+            if host.exhausted:
+                # rotate() left it at the tail
+                self.active.pop()
+            return (host, port), None
+        return None, wait
+
+    def poll(self) -> Tuple[Optional[Tuple[HostState, int]], Optional[float]]:
+        with self.cond:
+            return self._pick(time.monotonic())
+
+    def next_job(self) -> Optional[Tuple[HostState, int]]:
+        with self.cond:
+            while True:
+                job, wait = self._pick(time.monotonic())
+                if job:
+                    return job
+                if self.drained:
+                    return None
+                self.cond.wait(wait)
+
+    def job_done(self, host: HostState, port: int, opened: bool = False):
+        bump("probes")
+        if self.checkpoint and not opened:
+            # open ports count as finished only once the collector has written them out
+            self.checkpoint.done(host.ip, port)
+        if self.adaptive:
+            self.adaptive.observe()
+        with self.cond:
+            host.inflight -= 1
+            if host.exhausted and host.inflight == 0:
+                self.live -= 1
+                self._emit("host_done", host)
+            self.cond.notify_all()
+
+def thread_engine(sched: Scheduler, probe, workers: int, emit):
+    def worker():
+        while True:
+            job = sched.next_job()
+            if job is None:
+                return
+            host, p = job
+            opened = False
             try:
-                res = fut.result()
+                res = probe(host, p)
                 if res and res.get("status") == "open":
-                    # run plugins on this open port
-                    res["plugins"] = []
-                    for plugin in plugins:
-                        try:
-                            out = plugin.run(res["ip"], res["port"], res.get("banner", ""))
-                            if out:
-                                res["plugins"].append(out)
-                        except Exception as e:
-                            res["plugins"].append({"plugin": getattr(plugin, "__name__", "unknown"), "error": str(e)})
-                    results.append(res)
-                    print(Fore.GREEN + f"[+] {res['ip']}:{res['port']}/{res['proto']} OPEN | banner len={len(res.get('banner',''))} | plugins={len(res['plugins'])}")
+                    opened = True
+                    emit(("open", host, res))
             except Exception:
                 pass
-    return results
+            finally:
+                sched.job_done(host, p, opened)
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(max(1, workers))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+# ---------- plugin pipeline ----------
+class PluginJob:
+    __slots__ = ("plugin", "name", "res", "host", "deadline", "settled", "abandoned", "queued")
+
+    def __init__(self, plugin: PluginInfo, res: Dict, host):
+        self.plugin = plugin
+        self.name = plugin.name
+        self.res = res
+        self.host = host
+        self.deadline = 0.0
+        self.settled = False
+        self.abandoned = False
+        self.queued = time.monotonic() if PROFILE else 0.0
+
+class PluginRunner:
+    """Runs plugins on their own bounded pool, off the result-collection path.
+
+    Each open port is matched against the registry's port index, and only matching plugins are
+    queued. Each plugin has a queue and a concurrency limit, so a slow plugin can only ever occupy
+    its own slots. timeout and concurrency, when given (the CLI flags), apply to every plugin;
+    otherwise a plugin's own TIMEOUT / CONCURRENCY is used, then the built-in default. A job still
+    running past its timeout is recorded as a timeout and its plugin slot handed to the next job; the
+    thread itself cannot be killed, so it stays counted against workers until it returns. The pool has
+    room for as many hung threads as workers; once they are all taken, queued jobs are skipped
+    rather than left waiting for a thread that may never come back. on_complete(res, host) fires once
+    every plugin for a record has produced output, failed or timed out; it is called with the
+    runner's lock held, so it must not block.
+    """
+
+    def __init__(self, registry: PluginRegistry, on_complete, workers: int = PLUGIN_WORKERS,
+                 timeout: Optional[float] = None, concurrency: Optional[int] = None):
+        self.registry = registry
+        self.on_complete = on_complete
+        self.workers = max(1, workers)
+        # live runs are capped at workers; the other half of the pool is for runs that hung past their timeout
+        self.pool = ThreadPoolExecutor(max_workers=2 * self.workers, thread_name_prefix="plugin")
+        self.live = 0
+        self.abandoned = 0
+        self.lock = threading.Lock()
+        self.idle = threading.Condition(self.lock)
+        self.queues: Dict[str, deque] = {}
+        self.inflight: Dict[str, int] = {}
+        self.limits: Dict[str, int] = {}
+        self.timeouts: Dict[str, float] = {}
+        for plugin in registry.plugins:
+            self.queues[plugin.name] = deque()
+            self.inflight[plugin.name] = 0
+            self.limits[plugin.name] = max(1, int(concurrency or plugin.concurrency or PLUGIN_CONCURRENCY))
+            self.timeouts[plugin.name] = float(timeout or plugin.timeout or PLUGIN_TIMEOUT)
+        self.remaining: Dict[int, int] = {}
+        self.running: set = set()
+        self.stats = Counter()
+        self._stop = threading.Event()
+        self._watchdog = threading.Thread(target=self._watch, daemon=True)
+        self._watchdog.start()
+
+    def submit(self, res: Dict, host=None):
+        res["plugins"] = []
+        plugins = self.registry.match(res["port"], res.get("proto", "tcp"), res.get("banner", ""))
+        with self.lock:
+            if not plugins:
+                self.on_complete(res, host)
+                return
+            self.remaining[id(res)] = len(plugins)
+            for plugin in plugins:
+                self.queues[plugin.name].append(PluginJob(plugin, res, host))
+                self._dispatch(plugin.name)
+
+    def _dispatch(self, name: str):
+        # caller holds self.lock
+        q = self.queues[name]
+        if self.abandoned >= self.workers:
+            while q:
+                self._finish(q.popleft(), {"plugin": name, "error": f"skipped, {self.abandoned} plugin runs still hung"},
+                             "skipped")
+            return
+        while q and self.inflight[name] < self.limits[name] and self.live < self.workers:
+            job = q.popleft()
+            self.inflight[name] += 1
+            self.live += 1
+            if PROFILE:
+                PROFILE.since("plugin.queue", job.queued)
+            job.deadline = time.monotonic() + self.timeouts[name]
+            self.running.add(job)
+            self.pool.submit(self._call, job)
+
+    def _dispatch_all(self):
+        # caller holds self.lock; a freed worker may unblock any plugin's queue
+        for name in self.queues:
+            self._dispatch(name)
+
+    def _call(self, job: PluginJob):
+        started = time.monotonic() if PROFILE else 0.0
+        try:
+            out = job.plugin.run(job.res["ip"], job.res["port"], job.res.get("banner", ""))
+        except Exception as e:
+            out = {"plugin": job.name, "error": str(e)}
+        if PROFILE:
+            # a timed-out run is recorded here too, once it finally returns
+            PROFILE.since("plugin." + job.name, started)
+        self._settle(job, out)
+
+    def _settle(self, job: PluginJob, out: Optional[Dict], timed_out: bool = False):
+        with self.lock:
+            if job.abandoned and not timed_out:
+                # a run that hung past its timeout finally returned; its thread is free again
+                job.abandoned = False
+                self.abandoned -= 1
+                self._dispatch_all()
+                return
+            if job.settled:
+                return
+            self._finish(job, out, "timeout" if timed_out else "run")
+            self._dispatch_all()
+
+    def _finish(self, job: PluginJob, out: Optional[Dict], outcome: str):
+        # caller holds self.lock
+        job.settled = True
+        if job in self.running:
+            self.running.discard(job)
+            self.inflight[job.name] -= 1
+            self.live -= 1
+        if outcome == "timeout":
+            job.abandoned = True
+            self.abandoned += 1
+            if self.abandoned == self.workers:
+                print(Fore.YELLOW + f"[!] {self.abandoned} plugin runs hung past their timeout and hold every spare "
+                                    f"plugin thread; further plugin runs are skipped until they return")
+        self.stats[outcome] += 1
+        if PROFILE:
+            PROFILE.count("plugin_" + outcome)
+        if out:
+            job.res["plugins"].append(out)
+        key = id(job.res)
+        self.remaining[key] -= 1
+        if self.remaining[key] == 0:
+            # hand the record on before it stops counting as pending, so drain/pending never
+            # report idle while a finished record is still in flight to the consumer
+            self.on_complete(job.res, job.host)
+            del self.remaining[key]
+            self.idle.notify_all()
+
+    def _watch(self):
+        while not self._stop.wait(0.1):
+            now = time.monotonic()
+            with self.lock:
+                late = [job for job in self.running if job.deadline <= now]
+            for job in late:
+                self._settle(job, {"plugin": job.name, "error": f"timeout after {self.timeouts[job.name]:g}s"}, timed_out=True)
+
+    @property
+    def pending(self) -> int:
+        with self.lock:
+            return len(self.remaining)
+
+    def drain(self):
+        with self.lock:
+            while self.remaining:
+                self.idle.wait()
+
+    def close(self):
+        self._stop.set()
+        # do not wait for timed-out plugin threads
+        self.pool.shutdown(wait=False)
+
+# ---------- fingerprint cache ----------
+class FingerprintCache:
+    """Banner and plugin outputs per (ip, port, proto), so a rescan can skip re-enumerating a service.
+
+    An entry is reused while it is younger than ttl and the port still answers with a banner of the
+    same hash; otherwise the plugins run again and the entry is replaced. Records with a plugin error
+    or timeout are not stored, so those plugins get another try next time. At most max_entries are
+    kept, least recently used dropped first; the file is written in that order, so recency survives
+    between runs. refresh ignores what is cached but still stores the new results.
+    """
+
+    def __init__(self, path: str, ttl: float = FINGERPRINT_TTL, max_entries: int = FINGERPRINT_MAX,
+                 refresh: bool = False):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self.refresh = refresh
+        self.entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self.stats = Counter()
+        if os.path.isfile(path):
+            try:
+                # expired entries are kept until looked up, to tell stale services from new ones
+                with open(path, "r", encoding="utf-8") as f:
+                    self.entries.update(json.load(f))
+                self._evict()
+            except Exception as e:
+                print(Fore.YELLOW + f"[!] Ignoring fingerprint cache {path}: {e}")
+
+    @staticmethod
+    def key(res: Dict) -> str:
+        return f"{res['ip']}|{res['port']}|{res.get('proto', 'tcp')}"
+
+    @staticmethod
+    def digest(banner: str) -> str:
+        return hashlib.sha1((banner or "").encode("utf-8", "replace")).hexdigest()
+
+    def lookup(self, res: Dict) -> Optional[Dict]:
+        if self.refresh:
+            self.stats["refresh"] += 1
+            return None
+        key = self.key(res)
+        entry = self.entries.get(key)
+        if entry is None:
+            self.stats["miss"] += 1
+        elif time.time() - entry["ts"] > self.ttl:
+            self.stats["stale"] += 1
+        elif entry["sha1"] != self.digest(res.get("banner", "")):
+            self.stats["changed"] += 1
+        else:
+            self.entries.move_to_end(key)
+            self.stats["hit"] += 1
+            return entry
+        return None
+
+    @staticmethod
+    def failed(out) -> bool:
+        # runner errors/timeouts carry "error"; ssl_info, mysql_check and rdp_check report "Error: ..." as output
+        return isinstance(out, dict) and ("error" in out or str(out.get("output", "")).startswith("Error:"))
+
+    def store(self, res: Dict):
+        if any(self.failed(p) for p in res.get("plugins") or []):
+            self.stats["uncached"] += 1
+            return
+        key = self.key(res)
+        self.entries[key] = {"ts": time.time(), "sha1": self.digest(res.get("banner", "")),
+                             "banner": res.get("banner", ""), "plugins": res.get("plugins") or []}
+        self.entries.move_to_end(key)
+        self._evict()
+
+    def _evict(self):
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.stats["evicted"] += 1
+
+    def save(self):
+        now = time.time()
+        live = {k: v for k, v in self.entries.items() if now - v["ts"] <= self.ttl}
+        try:
+            with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(live, f, separators=(",", ":"), default=str)
+            os.replace(self.path + ".tmp", self.path)
+        except Exception as e:
+            print(Fore.YELLOW + f"[!] Could not save fingerprint cache: {e}")
+
+    def summary(self) -> str:
+        st = self.stats
+        runs = st["miss"] + st["stale"] + st["changed"] + st["refresh"]
+        return (f"Fingerprint cache: {st['hit']} reused, {runs} enumerated ({st['miss']} new, {st['stale']} stale, "
+                f"{st['changed']} banner changed" + (f", {st['refresh']} refreshed" if st["refresh"] else "")
+                + f"), {len(self.entries)} entries" + (f", {st['evicted']} evicted" if st["evicted"] else ""))
+
+# ---------- driver ----------
+def report_open(res: Dict):
+    print(Fore.GREEN + f"[+] {res['ip']}:{res['port']}/{res['proto']} OPEN | banner len={len(res.get('banner',''))} | plugins={len(res['plugins'])}")
+
+def run_scan(hosts: Iterable[Tuple[str, str]], ports: List[int], scan_type: str, timeout: float, workers: int,
+             rate: float = 0.0, engine: str = "thread", concurrency: int = DEFAULT_CONCURRENCY,
+             banner_timeout: Optional[float] = None, host_concurrency: int = 0, host_rate: float = 0.0,
+             os_guess: bool = False, burst: float = 0.0, adaptive: bool = False,
+             max_hosts: int = DEFAULT_MAX_HOSTS, plugin_workers: int = PLUGIN_WORKERS,
+             plugin_timeout: Optional[float] = None, plugin_concurrency: Optional[int] = None,
+             sink: Optional[ResultSink] = None, keep_results: bool = True,
+             checkpoint: Optional[Checkpoint] = None, rtt_timeouts: bool = False,
+             min_timeout: float = RTT_MIN_TIMEOUT, rtt_seeds: Optional[Dict[str, float]] = None,
+             udp_retries: int = UDP_RETRIES, bucket: Optional[TokenBucket] = None,
+             bus: Optional[EventBus] = None, fingerprints: Optional[FingerprintCache] = None) -> List[Dict]:
+    # with a sink, records are handed over as they finish; keep_results=False keeps none in memory.
+    # a checkpoint is saved from this collection loop, which is also the only writer to the sink.
+    # rtt_timeouts derives each host's timeouts from measured RTT, with `timeout` as the ceiling.
+    # bus gets live events from this loop too, so publishing never touches the probe workers.
+    # with fingerprints, an unchanged service gets its cached plugin outputs instead of a new run
+    all_results = []
+    events = queue.Queue()
+    enricher = PluginRunner(get_registry(), lambda res, host: events.put(("enriched", host, res)),
+                            plugin_workers, plugin_timeout, plugin_concurrency)
+    use_async = engine == "async" and scan_type == "tcp"
+    if bucket is None and rate and rate > 0:
+        bucket = TokenBucket(rate, burst)
+    controller = AdaptiveRate(bucket) if bucket and adaptive else None
+
+    def new_rtt(ip: str) -> RttEstimator:
+        rtt = RttEstimator(timeout, min_timeout)
+        seed = rtt_seeds.pop(ip, None) if rtt_seeds else None
+        if seed:
+            rtt.sample(seed)
+        return rtt
+
+    rtt_for = new_rtt if rtt_timeouts else None
+    batch = None
+    if scan_type == "syn" and raw_syn_available():
+        batch = SynScanner(hosts, ports, timeout, bucket, max_hosts, checkpoint, rtt_for, host_rate, controller)
+        runner = lambda: batch.run(events.put)
+        cap = 1
+    elif use_async:
+        sched = Scheduler(hosts, ports, concurrency, host_concurrency, host_rate, bucket, events.put, controller,
+                          max_hosts, checkpoint, rtt_for)
+        raise_nofile_limit(concurrency + 256)
+        runner = lambda: asyncio.run(async_engine(sched, timeout, banner_timeout, concurrency, events.put))
+        cap = concurrency
+    elif scan_type == "udp":
+        sched = Scheduler(hosts, ports, concurrency, host_concurrency, host_rate, bucket, events.put, controller,
+                          max_hosts, checkpoint, rtt_for)
+        runner = lambda: udp_engine(sched, timeout, concurrency, udp_retries, events.put)
+        cap = concurrency
+    else:
+        sched = Scheduler(hosts, ports, workers, host_concurrency, host_rate, bucket, events.put, controller,
+                          max_hosts, checkpoint, rtt_for)
+        if scan_type == "tcp":
+            probe = lambda host, p: tcp_connect_scan(host.ip, p, timeout, banner_timeout, host.rtt)
+        else:
+            # no raw socket privileges for the batch engine; fall back to one scapy sr1 per port
+            probe = lambda host, p: syn_scan(host.ip, p, timeout, host.rtt)
+        cap = workers
+        runner = lambda: thread_engine(sched, probe, workers, events.put)
+
+    def drive():
+        try:
+            runner()
+        finally:
+            events.put(("done", None, None))
+
+    rtt_totals = Counter()
+    live = Counter()
+
+    def finish_host(host: HostState):
+        print(Style.BRIGHT + Fore.YELLOW + f"\nResults for {host.label} ({host.ip})")
+        print_table(host.results)
+        live["hosts_done"] += 1
+        if bus:
+            bus.publish("host_done", ip=host.ip, target=host.label, open=len(host.results))
+        if host.rtt and host.rtt.stats["probes"]:
+            print(Fore.CYAN + host.rtt.summary())
+            rtt_totals.update(host.rtt.stats)
+            rtt_totals["hosts"] += 1
+            rtt_totals["saved_ms"] += int(host.rtt.saved * 1000)
+        host.results = []
+
+    guesser = ThreadPoolExecutor(max_workers=4) if os_guess and SCAPY else None
+    probes_before, started = STATS["probes"], time.monotonic()
+    last_progress = (started, probes_before)
+
+    def progress():
+        # probes/s over the last interval; the total grows as hosts enter the scan window
+        nonlocal last_progress
+        now, probes = time.monotonic(), STATS["probes"]
+        rate_now = (probes - last_progress[1]) / max(1e-6, now - last_progress[0])
+        last_progress = (now, probes)
+        done, total = probes - probes_before, live["hosts"] * len(ports)
+        bus.publish("progress", probes=done, total=total, rate=round(rate_now, 1),
+                    eta=round((total - done) / rate_now, 1) if rate_now > 0 and total > done else None,
+                    hosts=live["hosts"], hosts_done=live["hosts_done"], open=live["open"],
+                    elapsed=round(now - started, 1))
+
+    threading.Thread(target=drive, daemon=True).start()
+    probing = True
+    while True:
+        try:
+            kind, host, res = events.get(timeout=1.0)
+        except queue.Empty:
+            kind = None
+        if kind == "start":
+            print(Style.BRIGHT + Fore.YELLOW + f"\nScanning target: {host.label} ({host.ip})")
+            live["hosts"] += 1
+            if bus:
+                bus.publish("host_start", ip=host.ip, target=host.label)
+            if guesser:
+                fut = guesser.submit(ttl_os_guess, host.ip, timeout, host.rtt)
+                fut.add_done_callback(lambda f, h=host: events.put(("os", h, f.result() if not f.exception() else "")))
+        elif kind == "os":
+            host.os_guess = res
+            if res:
+                print(Fore.MAGENTA + f"OS guess for {host.ip}: {res}")
+        elif kind == "open":
+            # plugins run on their own pool; the record comes back as "enriched"
+            res["target"] = host.label
+            host.enriching += 1
+            live["open"] += 1
+            if bus:
+                bus.publish("port_open", **event_record(res))
+            cached = fingerprints.lookup(res) if fingerprints else None
+            if cached:
+                res["plugins"] = [dict(p) for p in cached["plugins"]]
+                res["cached_at"] = cached["ts"]
+                events.put(("enriched", host, res))
+            else:
+                enricher.submit(res, host)
+        elif kind == "enriched":
+            host.enriching -= 1
+            host.results.append(res)
+            if fingerprints and "cached_at" not in res:
+                fingerprints.store(res)
+            if sink and not (checkpoint and checkpoint.already_written(res)):
+                t1 = time.monotonic() if PROFILE else 0.0
+                sink.write(res)
+                if PROFILE:
+                    PROFILE.since("output", t1)
+            if checkpoint:
+                checkpoint.done(host.ip, res["port"])
+            if keep_results:
+                all_results.append(res)
+            report_open(res)
+            if bus and res["plugins"]:
+                bus.publish("plugin_result", **plugin_event(res))
+            if host.probing_done and not host.enriching:
+                finish_host(host)
+        elif kind == "host_done":
+            host.probing_done = True
+            if not host.enriching:
+                finish_host(host)
+        elif kind == "done":
+            probing = False
+            elapsed = time.monotonic() - started
+        if checkpoint and checkpoint.due():
+            checkpoint.save(sink)
+        if bus and time.monotonic() - last_progress[0] >= EVENT_PROGRESS_INTERVAL:
+            progress()
+        if not probing and not enricher.pending and events.empty():
+            break
+    enricher.close()
+    if guesser:
+        guesser.shutdown(wait=True)
+        while not events.empty():
+            kind, host, res = events.get_nowait()
+            if kind == "os" and res:
+                print(Fore.MAGENTA + f"OS guess for {host.ip}: {res}")
+    probes = STATS["probes"] - probes_before
+    if bus:
+        progress()
+        bus.publish("scan_done", probes=probes, elapsed=round(elapsed, 2), hosts=live["hosts"], open=live["open"])
+    if probes and elapsed > 0:
+        line = f"Probes: {probes} in {elapsed:.2f}s ({probes / elapsed:.1f} probes/s achieved"
+        if bucket:
+            line += f", limit {rate:g}/s burst {bucket.burst:g}"
+        if controller:
+            line += f", adaptive rate now {bucket.rate:.1f}/s after {controller.backoffs} back-offs"
+        print(Fore.CYAN + line + ")")
+    if enricher.stats["timeout"] or enricher.stats["skipped"]:
+        print(Fore.YELLOW + f"Plugins: {enricher.stats['run']} completed, {enricher.stats['timeout']} timed out "
+                            f"({enricher.abandoned} still running), {enricher.stats['skipped']} skipped")
+    if rtt_totals["hosts"]:
+        probe_s = rtt_totals["saved_ms"] / 1000
+        # the SYN engine knows its wall-clock saving; elsewhere probe-seconds spread over the in-flight cap
+        wall = batch.saved if batch else probe_s / max(1, min(cap, probes or 1))
+        print(Fore.CYAN + f"Adaptive timeouts: {rtt_totals['hosts']} hosts, avg "
+              f"{rtt_totals['used_ms'] / max(1, rtt_totals['probes']):.0f}ms vs {timeout:g}s fixed, "
+              f"{rtt_totals['timeouts']} unanswered, {rtt_totals['retries']} retries ({rtt_totals['late']} answered late), "
+              f"~{wall:.1f}s wall-clock saved ({probe_s:.1f} probe-s)")
+    return all_results
 
 # ---------- output helpers ----------
 def print_table(rows: List[Dict]):
@@ -248,19 +2378,23 @@ def print_table(rows: List[Dict]):
         table.add_row([r["ip"], r["port"], r.get("proto",""), banner_preview, plugins_preview])
     print(table)
 
-def save_results(all_rows: List[Dict], outfmt: Optional[str], outfile: Optional[str]):
-    if not outfmt:
-        return
-    if not outfile:
-        outfile = RESULTS_FILE_DEFAULT
+def write_report(rows: Iterable[Dict], outfmt: str, outfile: str):
+    # rows may be a stream (see iter_ndjson); each report is written record by record into a
+    # temp file that replaces outfile at the end, so readers never see a half-written report
+    tmp = outfile + ".tmp"
     if outfmt == "json":
-        with open(outfile, "w", encoding="utf-8") as f:
-            json.dump(all_rows, f, indent=2)
+        with open(tmp, "w", encoding="utf-8") as f:
+            first = True
+            for r in rows:
+                f.write("[\n" if first else ",\n")
+                f.write(textwrap.indent(json.dumps(r, indent=2), "  "))
+                first = False
+            f.write("[]" if first else "\n]")
     elif outfmt == "csv":
-        with open(outfile, "w", newline="", encoding="utf-8") as f:
+        with open(tmp, "w", newline="", encoding="utf-8") as f:
             w = csv.DictWriter(f, fieldnames=["target","ip","proto","port","banner","plugins"])
             w.writeheader()
-            for r in all_rows:
+            for r in rows:
                 w.writerow({
                     "target": r.get("target",""),
                     "ip": r.get("ip",""),
@@ -271,91 +2405,625 @@ def save_results(all_rows: List[Dict], outfmt: Optional[str], outfile: Optional[
                 })
     elif outfmt == "html":
         # simple html
-        rows_html = "\n".join(f"<tr><td>{r.get('target','')}</td><td>{r.get('ip','')}</td><td>{r.get('proto','')}</td><td>{r.get('port','')}</td><td>{(r.get('banner','')[:300]).replace('<','&lt;')}</td><td>{','.join([str(p.get('plugin',p.get('name',''))) for p in r.get('plugins',[])])}</td></tr>" for r in all_rows)
-        html = f"""<!doctype html><html><head><meta charset="utf-8"><title>Skan Results</title></head><body><h1>Skan Results</h1><table border=1><thead><tr><th>Target</th><th>IP</th><th>Proto</th><th>Port</th><th>Banner</th><th>Plugins</th></tr></thead><tbody>{rows_html}</tbody></table></body></html>"""
-        with open(outfile, "w", encoding="utf-8") as f:
-            f.write(html)
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write("""<!doctype html><html><head><meta charset="utf-8"><title>Skan Results</title></head><body><h1>Skan Results</h1><table border=1><thead><tr><th>Target</th><th>IP</th><th>Proto</th><th>Port</th><th>Banner</th><th>Plugins</th></tr></thead><tbody>""")
+            for r in rows:
+                f.write(f"<tr><td>{r.get('target','')}</td><td>{r.get('ip','')}</td><td>{r.get('proto','')}</td><td>{r.get('port','')}</td><td>{(r.get('banner','')[:300]).replace('<','&lt;')}</td><td>{','.join([str(p.get('plugin',p.get('name',''))) for p in r.get('plugins',[])])}</td></tr>\n")
+            f.write("</tbody></table></body></html>")
+    else:
+        return
+    os.replace(tmp, outfile)
+
+def save_results(all_rows: Iterable[Dict], outfmt: Optional[str], outfile: Optional[str]):
+    if not outfmt:
+        return
+    if not outfile:
+        outfile = RESULTS_FILE_DEFAULT
+    write_report(all_rows, outfmt, outfile)
     print(Fore.YELLOW + f"Report saved: {outfile}")
 
+# ---------- result sinks ----------
+class ResultSink:
+    """Receives each finished open-port record as soon as the scan produces it."""
+
+    def write(self, record: Dict):
+        raise NotImplementedError
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.flush()
+
+class NDJSONSink(ResultSink):
+    """Appends one JSON object per line through a write buffer, fsyncing every fsync_interval seconds.
+
+    A crash or Ctrl-C loses at most the last interval; a torn final line is skipped by iter_ndjson.
+    """
+
+    def __init__(self, path: str, append: bool = False, fsync_interval: float = FSYNC_INTERVAL,
+                 buffer_size: int = 1 << 16):
+        self.path = path
+        self.fsync_interval = fsync_interval
+        self.f = open(path, "a" if append else "w", encoding="utf-8", buffering=buffer_size)
+        self.last_sync = time.monotonic()
+        self.count = 0
+
+    def write(self, record: Dict):
+        self.f.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self.count += 1
+        if time.monotonic() - self.last_sync >= self.fsync_interval:
+            self.flush()
+
+    def flush(self):
+        self.f.flush()
+        os.fsync(self.f.fileno())
+        self.last_sync = time.monotonic()
+
+    def close(self):
+        if not self.f.closed:
+            self.flush()
+            self.f.close()
+
+class MultiSink(ResultSink):
+    def __init__(self, sinks: List[ResultSink]):
+        self.sinks = sinks
+
+    def write(self, record: Dict):
+        for sink in self.sinks:
+            sink.write(record)
+
+    def flush(self):
+        for sink in self.sinks:
+            sink.flush()
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+def iter_ndjson(path: str) -> Iterator[Dict]:
+    if not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # torn last line from an interrupted run
+                continue
+
+# ---------- live events ----------
+def parse_endpoint(spec: str) -> Tuple[int, object]:
+    # "unix:/path" (or any path with a slash) is a Unix socket, "host:port" / ":port" is TCP
+    if spec.startswith("unix:"):
+        return socket.AF_UNIX, spec[5:]
+    if "/" in spec:
+        return socket.AF_UNIX, spec
+    host, _, port = spec.rpartition(":")
+    return socket.AF_INET, (host.strip("[]") or "127.0.0.1", int(port))
+
+class EventBus:
+    """Publishes live scan events as JSON datagrams, without ever blocking the scan.
+
+    publish() only appends to a bounded queue; when it is full the event is dropped and counted.
+    A sender thread drains the queue to a non-blocking UDP (or Unix datagram) socket, so a slow,
+    missing or restarted listener costs nothing but the events it misses.
+    """
+
+    def __init__(self, endpoint: str, maxsize: int = EVENT_QUEUE):
+        family, self.address = parse_endpoint(endpoint)
+        self.sock = socket.socket(family, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+        self.queue = queue.Queue(maxsize)
+        self.stats = Counter()
+        self.closed = threading.Event()
+        self.thread = threading.Thread(target=self._send, daemon=True)
+        self.thread.start()
+
+    def publish(self, kind: str, **data):
+        data["event"] = kind
+        data["ts"] = round(time.time(), 3)
+        try:
+            self.queue.put_nowait(data)
+        except queue.Full:
+            self.stats["dropped"] += 1
+
+    def _send(self):
+        while True:
+            try:
+                data = self.queue.get(timeout=0.1)
+            except queue.Empty:
+                if self.closed.is_set():
+                    return
+                continue
+            payload = json.dumps(data, separators=(",", ":"), default=str).encode()
+            if len(payload) > EVENT_MAX_BYTES:
+                self.stats["oversize"] += 1
+                continue
+            try:
+                self.sock.sendto(payload, self.address)
+                self.stats["sent"] += 1
+            except OSError:
+                # nobody listening, or the socket buffer is full
+                self.stats["dropped"] += 1
+
+    def close(self):
+        self.closed.set()
+        self.thread.join(timeout=1.0)
+        self.sock.close()
+
+    def summary(self) -> str:
+        return (f"Live events: {self.stats['sent']} sent to {self.address}, {self.stats['dropped']} dropped"
+                + (f", {self.stats['oversize']} too large" if self.stats["oversize"] else ""))
+
+def event_record(res: Dict) -> Dict:
+    # what a live event carries about a finding; the full record is in the stream file
+    return {"ip": res.get("ip"), "port": res.get("port"), "proto": res.get("proto"), "target": res.get("target"),
+            "banner": (res.get("banner") or "")[:200]}
+
+def plugin_event(res: Dict) -> Dict:
+    outs = [p for p in res.get("plugins") or [] if isinstance(p, dict)]
+    return {"ip": res.get("ip"), "port": res.get("port"), "proto": res.get("proto"),
+            "plugins": [p.get("plugin", "?") for p in outs], "errors": sum(1 for p in outs if "error" in p)}
+
+# ---------- checkpoint ----------
+def scan_signature(ports: List[int], scan_type: str) -> str:
+    # what a resumed scan must match: same scan type over the same port list
+    return hashlib.sha1(f"{scan_type}:{','.join(map(str, ports))}".encode()).hexdigest()
+
+class Checkpoint:
+    """Which (host, port chunk) pieces of a scan are finished, for --resume.
+
+    Ports are split into chunks of `chunk` entries of the port list. A chunk is finished once every
+    probe in it has returned and every open port in it has been handed to the sink; the active
+    window's hosts keep one outstanding-probe counter per chunk, and a finished chunk becomes a bit
+    in the host's bitmap. A fully finished host is folded straight into a sorted interval list, so
+    in memory and on disk a sweep costs a few bytes per partly scanned host plus one span per run
+    of consecutive finished addresses. An address scanned again while still in flight (another
+    name for it, or --all-records) shares the address's counters and reopens its chunks. save() snapshots under the lock, then flushes
+    the sink, then replaces the file, so a bit is only ever persisted after its records are.
+    """
+
+    VERSION = 1
+
+    def __init__(self, path: str, ports: List[int], scan_type: str, chunk: int = CHECKPOINT_CHUNK,
+                 interval: float = CHECKPOINT_INTERVAL):
+        self.path = path
+        self.chunk = max(1, chunk)
+        self.interval = interval
+        self.signature = scan_signature(ports, scan_type)
+        self.index = {p: i for i, p in enumerate(ports)}
+        self.nchunks = -(-len(ports) // self.chunk)
+        self.nports = len(ports)
+        # finished hosts per IP version: sorted, disjoint [start, end] intervals as parallel lists
+        self.spans = {4: ([], []), 6: ([], [])}
+        self.partial: Dict[str, bytearray] = {}
+        self.left: Dict[str, List[int]] = {}
+        # findings already in the stream for partly scanned hosts; their unfinished chunks are
+        # probed again and must not be written twice
+        self.written: set = set()
+        self.lock = threading.Lock()
+        self.last_save = time.monotonic()
+        self.resumed = Counter()
+
+    @classmethod
+    def load(cls, path: str, ports: List[int], scan_type: str, interval: float = CHECKPOINT_INTERVAL) -> "Checkpoint":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        ckpt = cls(path, ports, scan_type, data.get("chunk", CHECKPOINT_CHUNK), interval)
+        if data.get("version") != cls.VERSION or data.get("signature") != ckpt.signature:
+            raise ValueError("checkpoint was written for a different port list or scan type")
+        for version, spans in data.get("done", {}).items():
+            for first, last in sorted(spans):
+                ckpt._add_span(int(version), first, last)
+                ckpt.resumed["hosts"] += last - first + 1
+        for ip, bits in data.get("partial", {}).items():
+            ckpt.partial[ip] = bytearray(base64.b64decode(bits))
+        ckpt.resumed["partial"] = len(ckpt.partial)
+        return ckpt
+
+    def seed_written(self, records: Iterable[Dict]):
+        for r in records:
+            if r.get("ip") in self.partial:
+                self.written.add((r["ip"], r.get("port"), r.get("proto")))
+
+    def already_written(self, res: Dict) -> bool:
+        return bool(self.written) and (res["ip"], res["port"], res.get("proto")) in self.written
+
+    def _key(self, ip: str) -> Tuple[int, int]:
+        addr = ipaddress.ip_address(ip)
+        return addr.version, int(addr)
+
+    def is_done(self, ip: str) -> bool:
+        version, value = self._key(ip)
+        with self.lock:
+            starts, ends = self.spans[version]
+            i = bisect.bisect_right(starts, value) - 1
+            return i >= 0 and value <= ends[i]
+
+    def _add_span(self, version: int, first: int, last: int):
+        # caller holds self.lock; spans i..j-1 overlap or touch [first, last] and merge into one
+        starts, ends = self.spans[version]
+        i = bisect.bisect_left(ends, first - 1)
+        j = bisect.bisect_right(starts, last + 1)
+        if i < j:
+            first, last = min(first, starts[i]), max(last, ends[j - 1])
+        starts[i:j] = [first]
+        ends[i:j] = [last]
+
+    def _chunk_size(self, c: int) -> int:
+        return min(self.chunk, self.nports - c * self.chunk)
+
+    def pending_ports(self, ip: str, ports: List[int]) -> List[int]:
+        # ports still to probe on ip; starts counting the host's chunks
+        with self.lock:
+            bits = self.partial.get(ip)
+            if bits is None:
+                bits = self.partial[ip] = bytearray(-(-self.nchunks // 8))
+            active = self.left.get(ip)
+            if active is not None:
+                # the address is already being scanned under another name: its probes count toward the
+                # same chunks, and every chunk stays open until both scans have finished it
+                for c in range(self.nchunks):
+                    active[c] += self._chunk_size(c)
+                    bits[c >> 3] &= ~(1 << (c & 7)) & 0xff
+                return ports
+            left = [0 if bits[c >> 3] & (1 << (c & 7)) else self._chunk_size(c) for c in range(self.nchunks)]
+            if not any(left):
+                self._finish(ip)
+                return []
+            self.left[ip] = left
+            if all(left):
+                return ports
+            self.resumed["chunks"] += left.count(0)
+            return [p for i, p in enumerate(ports) if left[i // self.chunk]]
+
+    def done(self, ip: str, port: int):
+        with self.lock:
+            left = self.left.get(ip)
+            if left is None:
+                return
+            c = self.index[port] // self.chunk
+            left[c] -= 1
+            if left[c]:
+                return
+            bits = self.partial[ip]
+            bits[c >> 3] |= 1 << (c & 7)
+            if not any(left):
+                del self.left[ip]
+                self._finish(ip)
+
+    def _finish(self, ip: str):
+        # caller holds self.lock
+        self.partial.pop(ip, None)
+        version, value = self._key(ip)
+        self._add_span(version, value, value)
+
+    def due(self) -> bool:
+        return time.monotonic() - self.last_save >= self.interval
+
+    def save(self, sink: Optional[ResultSink] = None):
+        with self.lock:
+            done = {str(v): [list(span) for span in zip(*self.spans[v])] for v in (4, 6) if self.spans[v][0]}
+            # started hosts are kept even with no finished chunk, so a resume knows their findings
+            partial = {ip: base64.b64encode(bytes(bits)).decode() for ip, bits in self.partial.items()}
+        if sink:
+            sink.flush()
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": self.VERSION, "signature": self.signature, "chunk": self.chunk,
+                       "done": done, "partial": partial}, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self.last_save = time.monotonic()
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
 # ---------- CLI ----------
 def parse_args():
     p = argparse.ArgumentParser(description="Skan - scanner with plugin support")
     p.add_argument("targets", nargs="*", help="targets (names, IPs, CIDR) - or use --targets-file")
     p.add_argument("--targets-file", help="file with targets, one per line")
+    p.add_argument("--exclude", action="append", default=[], help="comma-separated IPs/CIDRs/names to skip (repeatable)")
+    p.add_argument("--exclude-file", help="file with IPs/CIDRs/names to skip, one per line")
+    p.add_argument("--randomize", action="store_true", help="scan hosts in a random permutation (no list is built)")
+    p.add_argument("--seed", type=int, help="seed for --randomize, to reproduce an order")
+    p.add_argument("--dns-workers", type=int, default=32, help="concurrent DNS lookups")
+    p.add_argument("--dns-cache", help="JSON file to keep resolved names (with their TTLs) between runs")
+    p.add_argument("--all-records", action="store_true", help="scan every address a name resolves to, not just the first")
+    p.add_argument("--ipv6", action="store_true", help="also resolve AAAA records")
+    p.add_argument("-Pn", "--no-discovery", action="store_true", help="skip the liveness pre-pass and scan every host")
+    p.add_argument("--max-hosts", type=int, default=DEFAULT_MAX_HOSTS, help="hosts scanned concurrently (active window)")
     p.add_argument("--mode", choices=["fast","normal","full","custom"], default="normal")
     p.add_argument("--start", type=int, default=1)
     p.add_argument("--end", type=int, default=1024)
     p.add_argument("--scan", choices=["tcp","syn","udp"], default="tcp")
-    p.add_argument("--timeout", type=float, default=1.0)
+    p.add_argument("--timeout", type=float, default=1.0,
+                   help="probe timeout; with adaptive timeouts, the ceiling and the wait before the first RTT sample")
+    p.add_argument("--min-timeout", type=float, default=RTT_MIN_TIMEOUT, help="floor for adaptive per-host timeouts")
+    p.add_argument("--fixed-timeout", action="store_true", help="always wait --timeout instead of deriving it from each host's RTT")
+    p.add_argument("--banner-timeout", type=float, default=None, help="banner read timeout on open ports (default: twice the host's adaptive timeout, at least "
+                   f"{BANNER_MIN_TIMEOUT}s and at most --timeout; --timeout with --fixed-timeout)")
     p.add_argument("--workers", type=int, default=200)
-    p.add_argument("--rate", type=float, default=0.0, help="requests per second (0=unlimited)")
+    p.add_argument("--engine", choices=["thread","async"], default="thread",
+                   help="thread = one blocking connect per worker; async = non-blocking connects on an event loop (tcp only)")
+    p.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                   help="max in-flight connects for --engine async, and in-flight probes for --scan udp")
+    p.add_argument("--udp-retries", type=int, default=UDP_RETRIES, help="resends of an unanswered UDP probe (each waits twice as long)")
+    p.add_argument("--rate", type=float, default=0.0, help="probes per second across all targets (0=unlimited)")
+    p.add_argument("--burst", type=float, default=0.0, help="probes the rate limiter may send back-to-back (default: rate/10)")
+    p.add_argument("--adaptive", action="store_true", help="back off --rate when timeouts/RSTs spike, recover when calm")
+    p.add_argument("--host-concurrency", type=int, default=0,
+                   help="max in-flight probes per host (0=fair share of --workers/--concurrency)")
+    p.add_argument("--host-rate", type=float, default=0.0, help="probes per second per host (0=unlimited)")
+    p.add_argument("--plugin-workers", type=int, default=PLUGIN_WORKERS, help="threads shared by all plugins")
+    p.add_argument("--plugin-timeout", type=float, default=None,
+                   help=f"seconds before a plugin run is abandoned, for every plugin (default: the plugin's TIMEOUT, "
+                        f"else {PLUGIN_TIMEOUT:g})")
+    p.add_argument("--plugin-concurrency", type=int, default=None,
+                   help=f"concurrent runs per plugin, for every plugin (default: the plugin's CONCURRENCY, "
+                        f"else {PLUGIN_CONCURRENCY})")
     p.add_argument("--output", choices=["json","csv","html"], help="save results")
     p.add_argument("--out-file", help="output filename")
+    p.add_argument("--stream-file", default=STREAM_FILE_DEFAULT,
+                   help="NDJSON file every finding is appended to as soon as it is found")
+    p.add_argument("--fsync-interval", type=float, default=FSYNC_INTERVAL, help="seconds between fsyncs of --stream-file")
+    p.add_argument("--fp-cache", metavar="FILE",
+                   help="JSON file of banners and plugin outputs per ip/port; unchanged services skip their plugins on rescans")
+    p.add_argument("--fp-ttl", type=float, default=FINGERPRINT_TTL, help="seconds a cached fingerprint is reused")
+    p.add_argument("--fp-max", type=int, default=FINGERPRINT_MAX, help="fingerprints kept (least recently used dropped first)")
+    p.add_argument("--refresh", action="store_true", help="re-run every plugin even when --fp-cache has a fresh entry")
+    p.add_argument("--db", metavar="FILE",
+                   help="also record this run in a SQLite scan history (see scandb.py to list and diff runs)")
+    p.add_argument("--events", metavar="ADDR",
+                   help="publish live events (hosts, open ports, plugin results, progress) as UDP datagrams to host:port, "
+                        "e.g. 127.0.0.1:5001 for dashboard.py; events are dropped rather than slow the scan")
+    p.add_argument("--checkpoint", nargs="?", const=CHECKPOINT_FILE_DEFAULT, metavar="FILE",
+                   help=f"record finished (host, port chunk) work for --resume (FILE defaults to {CHECKPOINT_FILE_DEFAULT}); "
+                        "removed when the scan completes")
+    p.add_argument("--checkpoint-interval", type=float, default=CHECKPOINT_INTERVAL, help="seconds between checkpoint saves")
+    p.add_argument("--resume", action="store_true",
+                   help="continue an interrupted scan from --checkpoint (default: "
+                        f"{CHECKPOINT_FILE_DEFAULT}), appending to --stream-file (same targets/ports)")
+    p.add_argument("--profile", action="store_true",
+                   help="time every phase, probe type and plugin; print a summary and write it as JSON to --profile-file")
+    p.add_argument("--profile-file", default=PROFILE_FILE_DEFAULT, help="where --profile writes its JSON report")
+    p.add_argument("--listen", metavar="ADDR",
+                   help="coordinate a distributed scan: serve chunks to workers on host:port or unix:/path")
+    p.add_argument("--processes", type=int, default=1,
+                   help="split the scan across N local processes, each with its own engine (one shared --rate)")
+    p.add_argument("--worker", metavar="ADDR", help="run as a worker for the coordinator at ADDR (no targets needed)")
+    p.add_argument("--token", default=os.environ.get("HEXASCAN_TOKEN"),
+                   help="shared secret between --listen and its workers; required for a non-loopback --listen "
+                        "(default: $HEXASCAN_TOKEN, which keeps it out of the process list)")
+    p.add_argument("--chunk-hosts", type=int,
+                   help=f"hosts per distributed work unit (default {CLUSTER_CHUNK_HOSTS}; with --processes, sized to the scan)")
+    p.add_argument("--chunk-ports", type=int,
+                   help=f"ports per distributed work unit (default {CLUSTER_CHUNK_PORTS}; with --processes, sized to the scan)")
+    p.add_argument("--lease", type=float, default=CLUSTER_LEASE,
+                   help="seconds a worker may go silent before its chunk is handed to another")
     return p.parse_args()
 
+def scan_options(args) -> Dict:
+    # run_scan keyword arguments from the CLI; also what a coordinator sends its workers
+    return {"scan_type": args.scan, "timeout": args.timeout, "workers": args.workers, "rate": args.rate,
+            "engine": args.engine, "concurrency": args.concurrency, "banner_timeout": args.banner_timeout,
+            "host_concurrency": args.host_concurrency, "host_rate": args.host_rate, "os_guess": True,
+            "burst": args.burst, "adaptive": args.adaptive, "max_hosts": args.max_hosts,
+            "plugin_workers": args.plugin_workers, "plugin_timeout": args.plugin_timeout,
+            "plugin_concurrency": args.plugin_concurrency, "rtt_timeouts": not args.fixed_timeout,
+            "min_timeout": args.min_timeout, "udp_retries": args.udp_retries}
+
 def main():
+    global PROFILE
     args = parse_args()
-    inputs = []
-    if args.targets_file:
-        try:
-            with open(args.targets_file, "r", encoding="utf-8") as f:
-                inputs.extend([line.strip() for line in f if line.strip()])
-        except Exception as e:
-            print(Fore.RED + f"Failed to read targets file: {e}")
+    if args.profile:
+        PROFILE = Profiler()
+    if args.worker:
+        from cluster import run_worker
+        sys.exit(run_worker(args.worker, token=args.token))
+    if args.listen:
+        from cluster import listen_problem
+        problem = listen_problem(args.listen, args.token)
+        if problem:
+            print(Fore.RED + f"Cannot listen on {args.listen}: {problem}")
+            sys.exit(2)
+    sources = []
+    for option, path in (("--targets-file", args.targets_file), ("--exclude-file", args.exclude_file)):
+        if path and not os.path.isfile(path):
+            print(Fore.RED + f"Failed to read {option}: {path}")
             sys.exit(1)
-    inputs.extend(args.targets)
-    if not inputs:
+    if args.targets_file:
+        sources.append(iter_lines(args.targets_file))
+    sources.append(args.targets)
+    if not args.targets_file and not args.targets:
         print("No targets provided. Example: skan.py scanme.nmap.org --mode fast")
         sys.exit(2)
-    targets = expand_targets(inputs)
-    resolved = [resolve_host(t) for t in targets]
-    if args.mode == "fast":
-        ports = TOP_100
-    elif args.mode == "normal":
-        ports = list(range(1,1025))
-    elif args.mode == "full":
-        ports = list(range(1,65536))
-    else:
-        ports = list(range(max(1,args.start), min(65535,args.end)+1))
+    excludes = [e for arg in args.exclude for e in arg.split(",")]
+    if args.exclude_file:
+        excludes.extend(iter_lines(args.exclude_file))
+    exclude = ExcludeList(excludes)
+    targets = iter_targets(chain.from_iterable(sources), exclude, args.randomize, args.seed)
+    ports = mode_ports(args.mode, args.start, args.end)
 
-    all_results = []
-    if args.scan == "syn" and not SCAPY:
-        print(Fore.YELLOW + "SYN scan requested but scapy not installed; fallback to tcp. (install scapy for SYN)")
-        args.scan = "tcp"
-
-    for label, ip in resolved:
-        print(Style.BRIGHT + Fore.YELLOW + f"\nScanning target: {label} ({ip})")
-        if ip == "<unresolved>":
-            print(Fore.RED + "Skipping unresolved target.")
-            continue
-        # TTL OS guess if scapy exists
-        os_guess = ""
+    if args.scan == "syn" and not raw_syn_available():
         if SCAPY:
-            try:
-                os_guess = ttl_os_guess(ip, timeout=args.timeout)
-            except Exception:
-                os_guess = ""
-        if os_guess:
-            print(Fore.MAGENTA + f"OS guess: {os_guess}")
-        results = scan_ports(ip, ports, args.scan, args.timeout, args.workers, args.rate)
-        for r in results:
-            r["target"] = label
-        print_table(results)
-        all_results.extend(results)
-
-    # save if requested
+            print(Fore.YELLOW + "No raw socket access for the batch SYN engine; using per-port scapy probes.")
+        else:
+            print(Fore.YELLOW + "SYN scan needs root (raw sockets) or scapy; fallback to tcp.")
+            args.scan = "tcp"
+    elif args.scan == "syn" and args.host_concurrency:
+        # the batch engine keeps no per-probe state, so there is no in-flight count to cap
+        print(Fore.RED + "--host-concurrency does not apply to the raw SYN engine; use --host-rate to pace each host.")
+        sys.exit(2)
+    if args.adaptive and not args.rate:
+        print(Fore.YELLOW + "--adaptive needs a --rate ceiling; ignoring it.")
+        args.adaptive = False
+    if args.engine == "async" and args.scan == "syn":
+        print(Fore.YELLOW + "Async engine only drives tcp connect scans; using thread engine for syn.")
+        args.engine = "thread"
+
+    checkpoint = None
+    if args.listen or args.processes > 1:
+        if args.resume:
+            print(Fore.YELLOW + "--resume is not supported with --listen/--processes; starting over.")
+            args.resume = False
+    elif args.resume:
+        args.checkpoint = args.checkpoint or CHECKPOINT_FILE_DEFAULT
+        try:
+            checkpoint = Checkpoint.load(args.checkpoint, ports, args.scan, args.checkpoint_interval)
+        except FileNotFoundError:
+            print(Fore.RED + f"No checkpoint to resume from: {args.checkpoint}")
+            sys.exit(1)
+        except (ValueError, KeyError, TypeError) as e:
+            print(Fore.RED + f"Cannot resume from {args.checkpoint}: {e}")
+            sys.exit(1)
+        checkpoint.seed_written(iter_ndjson(args.stream_file))
+        print(Fore.CYAN + f"Resuming: {checkpoint.resumed['hosts']} hosts finished, "
+              f"{checkpoint.resumed['partial']} partly scanned")
+    elif args.checkpoint:
+        checkpoint = Checkpoint(args.checkpoint, ports, args.scan, interval=args.checkpoint_interval)
+    if args.listen and args.rate:
+        print(Fore.YELLOW + f"--rate {args.rate:g} applies to each worker separately.")
+    fingerprints = None
+    if args.fp_cache:
+        if args.listen or args.processes > 1:
+            print(Fore.YELLOW + "--fp-cache is not supported with --listen/--processes; plugins run on every port.")
+        else:
+            fingerprints = FingerprintCache(args.fp_cache, args.fp_ttl, args.fp_max, args.refresh)
+
+    resolver = Resolver(ipv6=args.ipv6, cache_file=args.dns_cache)
+    hosts = resolve_stream(targets, resolver, args.dns_workers, args.all_records, exclude)
+    if args.resume:
+        # finished hosts are dropped before discovery, so they cost no probes at all
+        hosts = (h for h in hosts if h is None or not checkpoint.is_done(h[1]))
+    # one --rate budget for discovery and the port scan; with --listen each worker has its own, and this
+    # one only paces the coordinator's discovery
+    bucket = None
+    if args.rate and args.rate > 0:
+        if args.processes > 1 and not args.listen:
+            bucket = SharedTokenBucket(args.rate, args.burst, process_context())
+        else:
+            bucket = TokenBucket(args.rate, args.burst)
+    discovery = None
+    if not args.no_discovery:
+        raise_nofile_limit(DEFAULT_CONCURRENCY + 256)
+        # only a local run_scan takes the RTT seeds; otherwise nothing would ever pop them
+        local = not args.listen and args.processes <= 1
+        discovery = Discovery(DISCOVERY_PORTS, args.timeout, args.max_hosts,
+                              record_rtt=local and not args.fixed_timeout, bucket=bucket)
+        hosts = discovery.stream(hosts)
+    stream = sink = NDJSONSink(args.stream_file, append=args.resume, fsync_interval=args.fsync_interval)
+    db = writer = None
+    if args.db:
+        from scandb import ScanDB
+        db = ScanDB(args.db)
+        run_id = db.begin_run(args.scan, scan_signature(ports, args.scan), " ".join(args.targets) or args.targets_file,
+                              len(ports), resume=args.resume)
+        writer = db.writer(run_id)
+        sink = MultiSink([stream, writer])
+    bus = EventBus(args.events) if args.events else None
+    interrupted = False
+    outcome = "failed"  # anything but a clean finish or Ctrl-C leaves the run marked failed
+    coordinator = None
+    started = time.monotonic()
+    try:
+        if args.listen:
+            from cluster import Coordinator
+            coordinator = Coordinator(hosts, ports, scan_options(args), sink, args.chunk_hosts or CLUSTER_CHUNK_HOSTS,
+                                      args.chunk_ports or CLUSTER_CHUNK_PORTS, args.lease,
+                                      bus=bus, token=args.token)
+            coordinator.serve(args.listen)
+        elif args.processes > 1:
+            from cluster import run_processes
+            coordinator = run_processes(hosts, ports, scan_options(args), args.processes, sink,
+                                        args.chunk_hosts, args.chunk_ports, bus, bucket)
+        else:
+            run_scan(hosts, ports, **scan_options(args), bucket=bucket, sink=sink, keep_results=False, checkpoint=checkpoint,
+                     rtt_seeds=discovery.rtts if discovery else None, bus=bus, fingerprints=fingerprints)
+        if coordinator and coordinator.error:
+            print(Fore.RED + f"\nDistributed scan incomplete: {coordinator.error}")
+        else:
+            outcome = "complete"
+    except KeyboardInterrupt:
+        interrupted = True
+        outcome = "interrupted"
+        print(Fore.RED + f"\nInterrupted; {stream.count} findings so far are in {args.stream_file}")
+    finally:
+        sink.close()
+        if bus:
+            bus.close()
+        if db:
+            db.finish_run(run_id, outcome)
+            db.close()
+        if PROFILE:
+            PROFILE.since("phase.scan", started)
+    if checkpoint and interrupted:
+        checkpoint.save()
+        print(Fore.YELLOW + f"Checkpoint saved: {args.checkpoint} (rerun with --resume to continue)")
+    elif checkpoint:
+        checkpoint.remove()
+
+    # reports are rebuilt from the stream, one record at a time
+    started = time.monotonic()
     if args.output:
         outname = args.out_file if args.out_file else ( "results." + args.output)
-        save_results(all_results, args.output, outname)
+        save_results(iter_ndjson(args.stream_file), args.output, outname)
     else:
         # also write JSON to default results.json for dashboard
         try:
-            with open(RESULTS_FILE_DEFAULT, "w", encoding="utf-8") as f:
-                json.dump(all_results, f, indent=2)
-        except:
+            write_report(iter_ndjson(args.stream_file), "json", RESULTS_FILE_DEFAULT)
+        except Exception:
             pass
+    if PROFILE:
+        PROFILE.since("phase.report", started)
 
-    print(Style.BRIGHT + Fore.GREEN + "\nScan complete.")
+    resolver.save()
+    if fingerprints:
+        fingerprints.save()
+        print(Fore.CYAN + fingerprints.summary())
+    if coordinator:
+        print(Fore.CYAN + coordinator.summary())
+    if bus:
+        print(Fore.CYAN + bus.summary())
+    if writer:
+        print(Fore.CYAN + f"Scan history: run {run_id} in {args.db}, {writer.count} findings recorded"
+              + (f" (database error: {writer.error})" if writer.error else ""))
+    if discovery:
+        print(Fore.CYAN + discovery.summary(len(ports)))
+    if resolver.stats["miss"] or resolver.stats["hit"]:
+        rs = resolver.stats
+        print(Fore.CYAN + f"DNS: {rs['miss']} lookups, {rs['hit']} cache hits, {rs['negative']} negative, {rs['error']} errors")
+    if STATS["open_tcp"]:
+        print(Fore.CYAN + f"TCP handshakes: {STATS['handshakes']} for {STATS['open_tcp']} open ports "
+              f"({STATS['handshakes'] / STATS['open_tcp']:.2f} per open port)")
+    if PROFILE:
+        counters = {f"dns_{k}": v for k, v in resolver.stats.items()}
+        for prefix, source in (("discovery", discovery), ("cluster", coordinator), ("fingerprint", fingerprints)):
+            if source:
+                counters.update({f"{prefix}_{k}": v for k, v in source.stats.items()})
+        report = PROFILE.report(counters)
+        PROFILE.print_summary(report)
+        try:
+            with open(args.profile_file, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+            print(Fore.CYAN + f"Profile saved: {args.profile_file}")
+        except OSError as e:
+            print(Fore.YELLOW + f"[!] Could not save profile: {e}")
+    if coordinator and coordinator.error:
+        print(Style.BRIGHT + Fore.RED + "\nScan incomplete.")
+        sys.exit(1)
+    print(Style.BRIGHT + Fore.GREEN + ("\nScan interrupted." if interrupted else "\nScan complete."))
 
 if __name__ == "__main__":
+    # cluster.py imports this module by name; let it share this run's globals (PROFILE, STATS)
+    sys.modules.setdefault("hexascan", sys.modules[__name__])
     main()
@@ -0,0 +1,324 @@
+# plugins/_web.py
+# Shared HTTP/TLS enumeration for the web plugins (http_title, ssl_info).
+# Not a plugin itself: the registry skips modules starting with "_".
+import html
+import http.client
+import re
+import socket
+import ssl
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urljoin, urlsplit
+
+TLS_PORTS = (443, 8443)
+TIMEOUT = 4.0
+TITLE_MAX_BYTES = 65536   # stop reading a body here if no </title> turned up
+READ_CHUNK = 4096
+DRAIN_MAX = 16384         # finish reading at most this much so the connection can be reused
+MAX_REDIRECTS = 3
+POOL_PER_HOST = 2
+POOL_HOSTS = 256
+IDLE_TIMEOUT = 30.0
+RESULT_TTL = 300.0
+RESULT_MAX = 4096
+
+TITLE_RE = re.compile(rb"<title[^>]*>(.*?)</title", re.I | re.S)
+CHARSET_RE = re.compile(r"charset=[\"']?([\w.-]+)", re.I)
+
+def tls_context() -> ssl.SSLContext:
+    # enumeration wants the certificate whoever signed it, so nothing is verified
+    ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    ctx.check_hostname = False
+    ctx.verify_mode = ssl.CERT_NONE
+    return ctx
+
+# ---------- certificate decoding ----------
+# getpeercert() is empty without verification, so the DER is read here: just the fields
+# getpeercert() would report, in the same shapes, without needing cryptography installed.
+OID_NAMES = {"2.5.4.3": "commonName", "2.5.4.6": "countryName", "2.5.4.7": "localityName",
+             "2.5.4.8": "stateOrProvinceName", "2.5.4.10": "organizationName",
+             "2.5.4.11": "organizationalUnitName", "1.2.840.113549.1.9.1": "emailAddress"}
+MONTHS = ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+
+def _tlv(data: bytes, i: int):
+    tag, length = data[i], data[i + 1]
+    i += 2
+    if length & 0x80:
+        n = length & 0x7f
+        length = int.from_bytes(data[i:i + n], "big")
+        i += n
+    return tag, i, i + length
+
+def _children(data: bytes, start: int, end: int):
+    while start < end:
+        tag, s, e = _tlv(data, start)
+        yield tag, s, e
+        start = e
+
+def _oid(raw: bytes) -> str:
+    parts, value = [raw[0] // 40, raw[0] % 40], 0
+    for b in raw[1:]:
+        value = (value << 7) | (b & 0x7f)
+        if not b & 0x80:
+            parts.append(value)
+            value = 0
+    return ".".join(map(str, parts))
+
+def _name(data: bytes, start: int, end: int):
+    rdns = []
+    for _, s, e in _children(data, start, end):
+        attrs = []
+        for _, s2, e2 in _children(data, s, e):
+            (_, os_, oe), (vtag, vs, ve) = list(_children(data, s2, e2))[:2]
+            oid = _oid(data[os_:oe])
+            value = data[vs:ve].decode("utf-16-be" if vtag == 0x1e else "utf-8", errors="replace")
+            attrs.append((OID_NAMES.get(oid, oid), value))
+        rdns.append(tuple(attrs))
+    return tuple(rdns)
+
+def _time(tag: int, raw: bytes) -> str:
+    s = raw.decode("ascii")
+    if tag == 0x17:  # UTCTime, two-digit year
+        s = ("19" if int(s[:2]) >= 50 else "20") + s
+    y, mo, d, hh, mm, ss = s[:4], int(s[4:6]), int(s[6:8]), s[8:10], s[10:12], s[12:14] or "00"
+    return f"{MONTHS[mo - 1]} {d:2d} {hh}:{mm}:{ss} {y} GMT"
+
+def decode_cert(der: bytes) -> dict:
+    """subject, issuer, notBefore, notAfter and subjectAltName, as getpeercert() reports them."""
+    if not der:
+        return {}
+    try:
+        _, s, e = _tlv(der, 0)
+        _, s, e = _tlv(der, s)  # tbsCertificate
+        fields = list(_children(der, s, e))
+        if fields[0][0] == 0xa0:  # explicit version
+            fields = fields[1:]
+        cert = {"issuer": _name(der, fields[2][1], fields[2][2]), "subject": _name(der, fields[4][1], fields[4][2])}
+        (t1, s1, e1), (t2, s2, e2) = list(_children(der, fields[3][1], fields[3][2]))
+        cert["notBefore"], cert["notAfter"] = _time(t1, der[s1:e1]), _time(t2, der[s2:e2])
+        for tag, s, e in fields[6:]:
+            if tag != 0xa3:
+                continue
+            _, s, e = _tlv(der, s)
+            for _, xs, xe in _children(der, s, e):
+                parts = list(_children(der, xs, xe))
+                if _oid(der[parts[0][1]:parts[0][2]]) != "2.5.29.17":
+                    continue
+                _, vs, ve = _tlv(der, parts[-1][1])
+                san = []
+                for gtag, gs, ge in _children(der, vs, ve):
+                    if gtag == 0x82:
+                        san.append(("DNS", der[gs:ge].decode("ascii", errors="replace")))
+                    elif gtag == 0x87:
+                        san.append(("IP Address", socket.inet_ntop(socket.AF_INET if ge - gs == 4 else socket.AF_INET6, der[gs:ge])))
+                cert["subjectAltName"] = tuple(san)
+        return cert
+    except (IndexError, ValueError, OSError):
+        return {}
+
+# ---------- client ----------
+class WebClient:
+    """Keep-alive HTTP(S) connections pooled per (scheme, ip, port), with bounded title reads.
+
+    A body is read only until </title> or TITLE_MAX_BYTES; a short remainder is drained so the
+    connection goes back to the pool (redirects and later requests to the port reuse it), a long
+    one closes it. The certificate is taken from the handshake of the connection the request
+    went over, so a TLS port costs one handshake for both the title and the certificate.
+    """
+
+    def __init__(self, timeout: float = TIMEOUT):
+        self.timeout = timeout
+        self.context = tls_context()
+        self.idle: "OrderedDict[tuple, list]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _checkout(self, key):
+        with self.lock:
+            conns = self.idle.get(key) or []
+            while conns:
+                conn, at = conns.pop()
+                if time.monotonic() - at < IDLE_TIMEOUT:
+                    return conn, True
+                conn.close()
+        scheme, ip, port = key
+        if scheme == "https":
+            return http.client.HTTPSConnection(ip, port, timeout=self.timeout, context=self.context), False
+        return http.client.HTTPConnection(ip, port, timeout=self.timeout), False
+
+    def _checkin(self, key, conn):
+        with self.lock:
+            conns = self.idle.setdefault(key, [])
+            self.idle.move_to_end(key)
+            if len(conns) < POOL_PER_HOST:
+                conns.append((conn, time.monotonic()))
+                conn = None
+            while len(self.idle) > POOL_HOSTS:
+                for old, _ in self.idle.popitem(last=False)[1]:
+                    old.close()
+        if conn:
+            conn.close()
+
+    def request(self, scheme: str, ip: str, port: int, path: str = "/") -> dict:
+        """One GET. Connect and handshake failures raise; an HTTP failure after a completed
+        handshake returns status None with the error, so the certificate is not lost with it."""
+        key = (scheme, ip, port)
+        for attempt in range(2):
+            conn, reused = self._checkout(key)
+            if conn.sock is None:
+                try:
+                    conn.connect()
+                except Exception:
+                    conn.close()
+                    raise
+            cert = decode_cert(conn.sock.getpeercert(True)) if scheme == "https" else None
+            try:
+                conn.request("GET", path, headers={"User-Agent": "HexaScan", "Accept": "text/html,*/*"})
+                resp = conn.getresponse()
+            except (OSError, http.client.HTTPException) as e:
+                conn.close()
+                if reused and attempt == 0:
+                    continue  # the server dropped an idle keep-alive connection; try a fresh one
+                if scheme == "http":
+                    raise
+                return {"status": None, "server": None, "location": None, "content_type": "", "body": b"",
+                        "cert": cert, "error": str(e) or type(e).__name__}
+            return self._read(key, conn, resp, cert)
+
+    def _read(self, key, conn, resp, cert) -> dict:
+        body = b""
+        try:
+            while len(body) < TITLE_MAX_BYTES:
+                chunk = resp.read1(READ_CHUNK)
+                if not chunk:
+                    break
+                body += chunk
+                if b"</title" in body[-len(chunk) - 7:].lower():
+                    break
+            drained = 0
+            while not resp.isclosed() and drained <= DRAIN_MAX:
+                chunk = resp.read1(READ_CHUNK)
+                if not chunk:
+                    break
+                drained += len(chunk)
+            if resp.length == 0:
+                resp.close()  # read1() never marks an empty or exactly-consumed body as done
+        except (OSError, http.client.HTTPException):
+            resp.close()
+        result = {"status": resp.status, "server": resp.getheader("Server"), "location": resp.getheader("Location"),
+                  "content_type": resp.getheader("Content-Type") or "", "body": body, "cert": cert, "error": None}
+        if resp.isclosed() and not resp.will_close:
+            self._checkin(key, conn)
+        else:
+            conn.close()
+        return result
+
+    def close(self):
+        with self.lock:
+            for conns in self.idle.values():
+                for conn, _ in conns:
+                    conn.close()
+            self.idle.clear()
+
+def title_of(body: bytes, content_type: str):
+    m = TITLE_RE.search(body)
+    if not m:
+        return None
+    charset = CHARSET_RE.search(content_type) or CHARSET_RE.search(body[:m.start()].decode("ascii", errors="ignore"))
+    try:
+        text = m.group(1).decode(charset.group(1) if charset else "utf-8", errors="replace")
+    except LookupError:
+        text = m.group(1).decode("utf-8", errors="replace")
+    return html.unescape(" ".join(text.split()))
+
+def looks_like_tls_port(resp: dict) -> bool:
+    # nginx/Apache answer plain HTTP on a TLS port with a 400 that says so
+    return resp["status"] == 400 and b"HTTPS" in resp["body"][:2048].upper()
+
+def enumerate_port(client: WebClient, ip: str, port: int) -> dict:
+    """Title, server header and certificate of ip:port, following same-host redirects."""
+    first = "https" if port in TLS_PORTS else "http"
+    out = {"scheme": first, "status": None, "server": None, "title": None, "cert": None, "tls_error": None, "error": None}
+    schemes = [first] if first == "https" else ["http", "https"]
+    for scheme in schemes:
+        try:
+            resp = client.request(scheme, ip, port)
+        except (http.client.BadStatusLine, ConnectionResetError) as e:
+            # garbage or a reset in reply to plain HTTP: likely TLS, so try that next
+            out["error"] = str(e) or type(e).__name__
+            continue
+        except ssl.SSLError as e:
+            out["tls_error"] = out["error"] = str(e)
+            return out
+        except (OSError, http.client.HTTPException) as e:
+            out["error"] = str(e) or type(e).__name__
+            if scheme == "https":
+                out["tls_error"] = out["error"]
+            return out
+        if scheme == "http" and looks_like_tls_port(resp):
+            continue
+        out.update(scheme=scheme, error=resp["error"], cert=resp["cert"])
+        if resp["status"] is None:
+            return out
+        break
+    else:
+        if port not in TLS_PORTS:
+            out["tls_error"] = out["error"]
+        return out
+    url = f"{scheme}://{ip}:{port}/"
+    for _ in range(MAX_REDIRECTS + 1):
+        out.update(status=resp["status"], server=resp["server"])
+        out["title"] = title_of(resp["body"], resp["content_type"])
+        if out["title"] is not None or not (300 <= resp["status"] < 400 and resp["location"]):
+            break
+        url = urljoin(url, resp["location"])
+        target = urlsplit(url)
+        # only the scanned host; a scanner should not wander off to whatever a redirect names
+        if target.hostname != ip or target.scheme not in ("http", "https"):
+            break
+        try:
+            resp = client.request(target.scheme, ip, target.port or (443 if target.scheme == "https" else 80),
+                                  (target.path or "/") + (f"?{target.query}" if target.query else ""))
+        except (OSError, http.client.HTTPException):
+            break
+        if resp["status"] is None:
+            break
+    return out
+
+# ---------- single flight ----------
+class _Flight:
+    __slots__ = ("done", "result", "at")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.at = 0.0
+
+_client = WebClient()
+_flights: "OrderedDict[tuple, _Flight]" = OrderedDict()
+_flights_lock = threading.Lock()
+
+def fetch(ip: str, port: int) -> dict:
+    """enumerate_port() once per ip:port; concurrent and later callers (within RESULT_TTL) share it."""
+    key = (ip, port)
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None or (flight.done.is_set() and time.monotonic() - flight.at > RESULT_TTL)
+        if leader:
+            flight = _flights[key] = _Flight()
+            while len(_flights) > RESULT_MAX:
+                _flights.popitem(last=False)
+        _flights.move_to_end(key)
+    if leader:
+        try:
+            flight.result = enumerate_port(_client, ip, port)
+        except Exception as e:
+            flight.result = {"scheme": None, "status": None, "server": None, "title": None, "cert": None,
+                             "tls_error": None, "error": str(e)}
+        finally:
+            flight.at = time.monotonic()
+            flight.done.set()
+    elif not flight.done.wait(TIMEOUT * (MAX_REDIRECTS + 3)):
+        return {"scheme": None, "status": None, "server": None, "title": None, "cert": None,
+                "tls_error": None, "error": "timed out waiting for a shared request"}
+    return flight.result
@@ -1,6 +1,10 @@
 import dns.query
 import dns.zone
 
+PORTS = (53,)
+PROTOCOLS = ("tcp", "udp")
+TIMEOUT = 8
+
 def run(ip, port, banner):
     if port != 53:
         return None
@@ -1,6 +1,10 @@
 # plugins/ftp_anon.py
 from ftplib import FTP, error_perm
 
+PORTS = (21,)
+PROTOCOLS = ("tcp",)
+TIMEOUT = 10
+
 def run(ip, port, banner):
     if port != 21:
         return None
@@ -1,24 +1,16 @@
 # plugins/http_title.py
-import requests
-import re
-from urllib.parse import urljoin
+from plugins import _web
+
+PORTS = (80, 8080, 8000, 8888, 443, 8443)
+PROTOCOLS = ("tcp",)
+BANNER_PATTERNS = (r"^HTTP/\d",)
 
 def run(ip, port, banner):
-    # only run for HTTP-like ports
-    if port not in (80, 8080, 8000, 8888, 443, 8443):
-        return None
-    scheme = "https" if port in (443, 8443) else "http"
-    url = f"{scheme}://{ip}"
-    # if non-standard port, add it
-    if (scheme == "http" and port != 80) or (scheme == "https" and port != 443):
-        url = f"{scheme}://{ip}:{port}"
-    try:
-        resp = requests.get(url, timeout=4, verify=False)
-        text = resp.text
-        m = re.search(r"<title[^>]*>(.*?)</title>", text, re.I|re.S)
-        if m:
-            title = m.group(1).strip()
-            return {"plugin": "http-title", "title": title}
-    except Exception:
+    # HTTP-like ports, or any port that answered the HEAD nudge like a web server
+    if port not in PORTS and not (banner or "").startswith("HTTP/"):
         return None
+    # shared with ssl_info: one pooled connection (and handshake) per port, body read up to </title>
+    title = _web.fetch(ip, port)["title"]
+    if title:
+        return {"plugin": "http-title", "title": title}
     return None
@@ -1,5 +1,8 @@
 import socket
 
+PORTS = (27017,)
+PROTOCOLS = ("tcp",)
+
 def run(ip, port, banner):
     if port != 27017:
         return None
@@ -1,5 +1,8 @@
 import socket
 
+PORTS = (3306,)
+PROTOCOLS = ("tcp",)
+
 def run(ip, port, banner):
     if port != 3306:
         return None
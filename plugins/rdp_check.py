@@ -1,5 +1,8 @@
 import socket
 
+PORTS = (3389,)
+PROTOCOLS = ("tcp",)
+
 def run(ip, port, banner):
     if port != 3389:
         return None
@@ -1,6 +1,9 @@
 # plugins/smb_enum.py
 import socket
 
+PORTS = (445,)
+PROTOCOLS = ("tcp",)
+
 def run(ip, port, banner):
     # simple SMB presence check (does not perform intrusive enumeration)
     if port != 445:
@@ -1,18 +1,20 @@
-import ssl, socket
+from plugins import _web
+
+# 8000/8888 are often TLS too; the shared fetch in _web finds out while getting the title
+PORTS = (443, 8443, 8000, 8888)
+PROTOCOLS = ("tcp",)
 
 def run(ip, port, banner):
-    if port != 443:
+    if port not in PORTS:
         return None
-    try:
-        context = ssl.create_default_context()
-        conn = context.wrap_socket(socket.socket(socket.AF_INET), server_hostname=ip)
-        conn.settimeout(3)
-        conn.connect((ip, port))
-        cert = conn.getpeercert()
-        conn.close()
+    # the certificate comes from the same handshake http_title's request went over
+    info = _web.fetch(ip, port)
+    cert = info["cert"]
+    if cert:
         return {
             "plugin": "ssl-info",
             "output": f"Issuer: {cert.get('issuer')}, Expiry: {cert.get('notAfter')}"
         }
-    except Exception as e:
-        return {"plugin": "ssl-info", "output": f"Error: {str(e)}"}
+    if port in _web.TLS_PORTS:
+        return {"plugin": "ssl-info", "output": f"Error: {info['tls_error'] or info['error']}"}
+    return None
@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+HexaScan scan history - every run's findings in a local SQLite database.
+Record a scan, then compare runs:
+  python3 hexascan.py 10.0.0.0/24 --mode fast --db scans.db
+  python3 scandb.py --db scans.db runs
+  python3 scandb.py --db scans.db diff prev last
+  python3 scandb.py --db scans.db history 10.0.0.5 --port 22
+"""
+from __future__ import annotations
+import argparse
+import hashlib
+import json
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+DB_FILE_DEFAULT = "scans.db"
+# records per transaction, and the longest a record waits in the writer queue
+WRITE_BATCH = 2000
+WRITE_INTERVAL = 0.5
+BANNER_CACHE = 100000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    started REAL NOT NULL,
+    finished REAL,
+    status TEXT NOT NULL DEFAULT 'running',
+    scan_type TEXT,
+    signature TEXT,
+    targets TEXT,
+    ports INTEGER,
+    findings INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS hosts (
+    id INTEGER PRIMARY KEY,
+    ip TEXT NOT NULL UNIQUE,
+    name TEXT
+);
+CREATE TABLE IF NOT EXISTS banners (
+    id INTEGER PRIMARY KEY,
+    sha1 TEXT NOT NULL UNIQUE,
+    text TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS ports (
+    id INTEGER PRIMARY KEY,
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    host_id INTEGER NOT NULL REFERENCES hosts(id),
+    port INTEGER NOT NULL,
+    proto TEXT NOT NULL,
+    status TEXT,
+    banner_id INTEGER REFERENCES banners(id),
+    seen REAL NOT NULL,
+    UNIQUE (run_id, host_id, port, proto)
+);
+CREATE INDEX IF NOT EXISTS ports_host ON ports (host_id, port, proto);
+CREATE INDEX IF NOT EXISTS ports_port ON ports (port, proto);
+CREATE TABLE IF NOT EXISTS plugin_outputs (
+    id INTEGER PRIMARY KEY,
+    port_id INTEGER NOT NULL REFERENCES ports(id) ON DELETE CASCADE,
+    plugin TEXT NOT NULL,
+    error INTEGER NOT NULL DEFAULT 0,
+    output TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS plugin_outputs_port ON plugin_outputs (port_id);
+CREATE INDEX IF NOT EXISTS plugin_outputs_plugin ON plugin_outputs (plugin);
+"""
+
+# open in run b but not in run a (and the reverse with a/b swapped); the ports unique index serves the NOT EXISTS
+DIFF_NEW = """
+SELECT h.ip, p.port, p.proto, b.text FROM ports p
+JOIN hosts h ON h.id = p.host_id LEFT JOIN banners b ON b.id = p.banner_id
+WHERE p.run_id = :b AND NOT EXISTS (
+    SELECT 1 FROM ports q WHERE q.run_id = :a AND q.host_id = p.host_id AND q.port = p.port AND q.proto = p.proto)
+ORDER BY h.ip, p.port
+"""
+DIFF_CHANGED = """
+SELECT h.ip, p.port, p.proto, ba.text, bb.text FROM ports p
+JOIN ports q ON q.run_id = :b AND q.host_id = p.host_id AND q.port = p.port AND q.proto = p.proto
+JOIN hosts h ON h.id = p.host_id
+LEFT JOIN banners ba ON ba.id = p.banner_id LEFT JOIN banners bb ON bb.id = q.banner_id
+WHERE p.run_id = :a AND p.banner_id IS NOT q.banner_id
+ORDER BY h.ip, p.port
+"""
+
+def connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, timeout=30.0, check_same_thread=False)
+    # WAL lets the dashboard read while a scan writes; NORMAL only risks the last commits on power loss
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA foreign_keys=ON")
+    return conn
+
+class ScanDB:
+    """Scan runs and their findings: hosts and banners are stored once, ports and plugin outputs per run."""
+
+    def __init__(self, path: str = DB_FILE_DEFAULT):
+        self.path = path
+        self.conn = connect(path)
+        self.lock = threading.Lock()
+        with self.conn:
+            self.conn.executescript(SCHEMA)
+
+    def begin_run(self, scan_type: str, signature: str, targets: str, ports: int, resume: bool = False) -> int:
+        # resume continues the latest interrupted (or failed) run with the same scan signature; findings it already
+        # has are ignored
+        with self.lock, self.conn:
+            if resume:
+                row = self.conn.execute("SELECT id FROM runs WHERE status IN ('interrupted', 'failed') AND signature = ? "
+                                        "ORDER BY id DESC LIMIT 1", (signature,)).fetchone()
+                if row:
+                    self.conn.execute("UPDATE runs SET status = 'running', finished = NULL WHERE id = ?", row)
+                    return row[0]
+            return self.conn.execute("INSERT INTO runs (started, scan_type, signature, targets, ports) VALUES (?,?,?,?,?)",
+                                     (time.time(), scan_type, signature, targets, ports)).lastrowid
+
+    def finish_run(self, run_id: int, status: str = "complete"):
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE runs SET finished = ?, status = ?, "
+                              "findings = (SELECT COUNT(*) FROM ports WHERE run_id = ?) WHERE id = ?",
+                              (time.time(), status, run_id, run_id))
+
+    def writer(self, run_id: int) -> "ScanWriter":
+        return ScanWriter(self.path, run_id)
+
+    def run_id(self, ref: str) -> int:
+        # a run id, or "last" / "prev" for the newest two runs
+        if ref in ("last", "prev"):
+            rows = self.conn.execute("SELECT id FROM runs ORDER BY id DESC LIMIT 2").fetchall()
+            i = 0 if ref == "last" else 1
+            if len(rows) <= i:
+                raise ValueError(f"no {ref} run")
+            return rows[i][0]
+        row = self.conn.execute("SELECT id FROM runs WHERE id = ?", (int(ref),)).fetchone()
+        if not row:
+            raise ValueError(f"no run {ref}")
+        return row[0]
+
+    def runs(self, limit: int = 50) -> List[Dict]:
+        cur = self.conn.execute("SELECT id, started, finished, status, scan_type, targets, ports, findings "
+                                "FROM runs ORDER BY id DESC LIMIT ?", (limit,))
+        cols = [c[0] for c in cur.description]
+        return [dict(zip(cols, row)) for row in cur]
+
+    def diff(self, a: int, b: int) -> Dict[str, List[Tuple]]:
+        return {"opened": self.conn.execute(DIFF_NEW, {"a": a, "b": b}).fetchall(),
+                "closed": self.conn.execute(DIFF_NEW, {"a": b, "b": a}).fetchall(),
+                "changed": self.conn.execute(DIFF_CHANGED, {"a": a, "b": b}).fetchall()}
+
+    def results(self, run_id: int, filters: Optional[Dict] = None, offset: int = 0, limit: int = 500) -> Dict:
+        # one run's findings in the stream-file record shape, filtered on ip/port/proto/plugin
+        where, args = ["p.run_id = ?"], [run_id]
+        for field, column in (("ip", "h.ip"), ("port", "p.port"), ("proto", "p.proto")):
+            if filters and filters.get(field):
+                where.append(f"{column} = ?")
+                args.append(filters[field])
+        if filters and filters.get("plugin"):
+            where.append("EXISTS (SELECT 1 FROM plugin_outputs o WHERE o.port_id = p.id AND o.plugin = ?)")
+            args.append(filters["plugin"])
+        cond = " AND ".join(where)
+        total = self.conn.execute(f"SELECT COUNT(*) FROM ports p JOIN hosts h ON h.id = p.host_id WHERE {cond}",
+                                  args).fetchone()[0]
+        rows = self.conn.execute(f"SELECT p.id, h.ip, h.name, p.port, p.proto, p.status, b.text FROM ports p "
+                                 f"JOIN hosts h ON h.id = p.host_id LEFT JOIN banners b ON b.id = p.banner_id "
+                                 f"WHERE {cond} ORDER BY p.id LIMIT ? OFFSET ?", args + [limit, offset]).fetchall()
+        outputs: Dict[int, List] = {}
+        if rows:
+            ids = [r[0] for r in rows]
+            for port_id, output in self.conn.execute(
+                    f"SELECT port_id, output FROM plugin_outputs WHERE port_id IN ({','.join('?' * len(ids))}) "
+                    f"ORDER BY id", ids):
+                outputs.setdefault(port_id, []).append(json.loads(output))
+        items = [{"id": pid, "target": name, "ip": ip, "port": port, "proto": proto, "status": status,
+                  "banner": banner or "", "plugins": outputs.get(pid, [])}
+                 for pid, ip, name, port, proto, status, banner in rows]
+        return {"run": run_id, "total": total, "items": items}
+
+    def history(self, ip: str, port: Optional[int] = None) -> List[Tuple]:
+        sql = ("SELECT r.id, r.started, p.port, p.proto, b.text FROM ports p JOIN hosts h ON h.id = p.host_id "
+               "JOIN runs r ON r.id = p.run_id LEFT JOIN banners b ON b.id = p.banner_id WHERE h.ip = ?")
+        args: List = [ip]
+        if port is not None:
+            sql += " AND p.port = ?"
+            args.append(port)
+        return self.conn.execute(sql + " ORDER BY r.id, p.port", args).fetchall()
+
+    def close(self):
+        self.conn.close()
+
+class ScanWriter:
+    """Inserts a run's findings from a background thread, in batched transactions.
+
+    write() only queues the record, so the scan's collection loop never waits on the disk. The
+    writer thread commits up to WRITE_BATCH records at a time, or whatever arrived within
+    WRITE_INTERVAL. Host and banner ids are cached; records without plugin output go in with a
+    single executemany. flush() returns once everything written so far is committed. Same interface
+    as hexascan's ResultSink.
+    """
+
+    def __init__(self, path: str, run_id: int, batch: int = WRITE_BATCH, interval: float = WRITE_INTERVAL):
+        self.run_id = run_id
+        self.batch = batch
+        self.interval = interval
+        self.conn = connect(path)
+        self.queue = queue.Queue()
+        self.hosts: Dict[str, int] = {}
+        self.banners: Dict[str, int] = {}
+        self.count = 0
+        self.error: Optional[Exception] = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def write(self, record: Dict):
+        self.queue.put(record)
+
+    def _run(self):
+        while True:
+            records = [self.queue.get()]
+            deadline = time.monotonic() + self.interval
+            while len(records) < self.batch:
+                try:
+                    records.append(self.queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            stop = None in records
+            try:
+                with self.conn:
+                    added = self._insert([rec for rec in records if rec is not None])
+                self.count += added
+            except sqlite3.Error as e:
+                # keep draining so flush()/close() never hang; the stream file still has every record
+                self.error = e
+                # the batch was rolled back, so ids cached during it may not exist
+                self.hosts.clear()
+                self.banners.clear()
+            for _ in records:
+                self.queue.task_done()
+            if stop:
+                return
+
+    def _add_hosts(self, records: List[Dict]):
+        # one upsert and one lookup per batch for the hosts not seen before
+        new = {rec["ip"]: rec.get("target") for rec in records if rec["ip"] not in self.hosts}
+        if not new:
+            return
+        self.conn.executemany("INSERT INTO hosts (ip, name) VALUES (?, ?) ON CONFLICT (ip) DO UPDATE SET name = excluded.name",
+                              new.items())
+        ips = list(new)
+        for i in range(0, len(ips), 500):
+            part = ips[i:i + 500]
+            self.hosts.update(self.conn.execute(f"SELECT ip, id FROM hosts WHERE ip IN ({','.join('?' * len(part))})",
+                                                part))
+
+    def _banner(self, text: str) -> Optional[int]:
+        if not text:
+            return None
+        key = hashlib.sha1(text.encode("utf-8", "replace")).hexdigest()
+        bid = self.banners.get(key)
+        if bid is None:
+            self.conn.execute("INSERT OR IGNORE INTO banners (sha1, text) VALUES (?, ?)", (key, text))
+            bid = self.conn.execute("SELECT id FROM banners WHERE sha1 = ?", (key,)).fetchone()[0]
+            if len(self.banners) >= BANNER_CACHE:
+                self.banners.clear()
+            self.banners[key] = bid
+        return bid
+
+    def _insert(self, records: List[Dict]) -> int:
+        # OR IGNORE: the interrupted run this one resumes may have recorded some already
+        sql = ("INSERT OR IGNORE INTO ports (run_id, host_id, port, proto, status, banner_id, seen) "
+               "VALUES (?,?,?,?,?,?,?)")
+        now = time.time()
+        plain, outputs, added = [], [], 0
+        self._add_hosts(records)
+        for rec in records:
+            row = (self.run_id, self.hosts[rec["ip"]], rec["port"], rec.get("proto", "tcp"),
+                   rec.get("status"), self._banner(rec.get("banner") or ""), now)
+            outs = [p for p in rec.get("plugins") or [] if isinstance(p, dict)]
+            if not outs:
+                plain.append(row)
+                continue
+            # plugin outputs need the port id, and only if this insert is the one that created the row
+            inserted = self.conn.execute(sql + " RETURNING id", row).fetchone()
+            if inserted:
+                added += 1
+                outputs.extend((inserted[0], p.get("plugin", "?"), int("error" in p), json.dumps(p, default=str))
+                               for p in outs)
+        if plain:
+            before = self.conn.total_changes
+            self.conn.executemany(sql, plain)
+            added += self.conn.total_changes - before
+        if outputs:
+            self.conn.executemany("INSERT INTO plugin_outputs (port_id, plugin, error, output) VALUES (?,?,?,?)", outputs)
+        return added
+
+    def flush(self):
+        self.queue.join()
+
+    def close(self):
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+        self.conn.close()
+
+# ---------- CLI ----------
+def fmt_time(ts: Optional[float]) -> str:
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ts)) if ts else "-"
+
+def print_diff(db: ScanDB, a: int, b: int):
+    d = db.diff(a, b)
+    print(f"run {a} -> run {b}: {len(d['opened'])} opened, {len(d['closed'])} closed, {len(d['changed'])} changed")
+    for ip, port, proto, banner in d["opened"]:
+        print(f"+ {ip}:{port}/{proto}  {(banner or '')[:60]!r}")
+    for ip, port, proto, banner in d["closed"]:
+        print(f"- {ip}:{port}/{proto}  {(banner or '')[:60]!r}")
+    for ip, port, proto, before, after in d["changed"]:
+        print(f"~ {ip}:{port}/{proto}  {(before or '')[:40]!r} -> {(after or '')[:40]!r}")
+
+def main():
+    p = argparse.ArgumentParser(description="HexaScan scan history")
+    p.add_argument("--db", default=DB_FILE_DEFAULT, help="database written by hexascan.py --db")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    runs = sub.add_parser("runs", help="list recorded runs")
+    runs.add_argument("--limit", type=int, default=20)
+    diff = sub.add_parser("diff", help="ports opened, closed or with a changed banner between two runs")
+    diff.add_argument("a", help="older run id, or prev/last")
+    diff.add_argument("b", help="newer run id, or prev/last")
+    diff.add_argument("--json", action="store_true", help="print the diff as JSON")
+    hist = sub.add_parser("history", help="every run that saw a host (or one of its ports) open")
+    hist.add_argument("ip")
+    hist.add_argument("--port", type=int)
+    args = p.parse_args()
+
+    db = ScanDB(args.db)
+    try:
+        if args.cmd == "runs":
+            for r in db.runs(args.limit):
+                print(f"{r['id']:>5}  {fmt_time(r['started'])}  {r['status']:<11} {r['scan_type'] or '-':<4} "
+                      f"{r['findings']:>7} open  {r['ports'] or 0:>5} ports  {r['targets'] or ''}")
+        elif args.cmd == "diff":
+            a, b = db.run_id(args.a), db.run_id(args.b)
+            if args.json:
+                print(json.dumps({"a": a, "b": b, **db.diff(a, b)}, indent=2))
+            else:
+                print_diff(db, a, b)
+        else:
+            for run_id, started, port, proto, banner in db.history(args.ip, args.port):
+                print(f"run {run_id:>5}  {fmt_time(started)}  {port}/{proto}  {(banner or '')[:60]!r}")
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()